@@ -1,13 +1,22 @@
-from flask import Flask, render_template, Response, jsonify, request, redirect, url_for
+from flask import Flask, render_template, Response, jsonify, request, redirect, url_for, abort, send_from_directory
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from camera import VideoCamera
+from cameras import CameraRegistry
 from detector import ObjectDetector
-from database import init_db, get_recent_incidents, get_user_by_username, get_user_by_id, create_user
+from motion import MotionGate
+from pipeline import DetectionPipeline
+from scheduler import AdaptiveScheduler
+from process_pipeline import ProcessPipeline
+from events import EventBus
+from incident_writer import IncidentWriter
+from clips import ClipRecorder
+from detection_log import DetectionLog
+from storage import CaptureStore, THUMBS, ensure_thumbnail
+from metrics import REGISTRY
+from database import init_db, clear_incident_clip, clear_incident_media, get_recent_incidents, get_user_by_username, get_cached_user_by_id, user_cache, create_user, query_incidents, summarize_incidents
 from werkzeug.security import check_password_hash
-import cv2
 import threading
-import time
 import os
+from datetime import datetime
 
 # Inicialización de la aplicación Flask
 # Flask es el framework web que utilizamos para servir la página y la API.
@@ -23,73 +32,110 @@ login_manager.login_view = 'login'
 
 # Cargador de usuario para Flask-Login
 # Esta función es llamada por Flask-Login para obtener el objeto usuario a partir del ID almacenado en la sesión.
+# Usa la caché en memoria para no consultar SQLite en cada petición autenticada.
 @login_manager.user_loader
 def load_user(user_id):
-    return get_user_by_id(user_id)
+    return get_cached_user_by_id(user_id)
 
 # Inicializar Base de Datos y Usuario Administrador
 # Crea las tablas si no existen y asegura que haya un usuario admin.
 init_db()
 
-# Inicializar Cámara y Detector
-# Intentamos acceder a la cámara (índice 0).
-camera_source = 0 
-try:
-    camera = VideoCamera(camera_source)
-except Exception as e:
-    print(f"Error al inicializar la cámara: {e}")
-    camera = None
-
-# Inicializamos el detector de objetos (YOLO) con optimizaciones para Jetson
-# Para máxima velocidad (60 FPS), usa 'yolov8n.engine' después de ejecutar optimize_for_60fps.sh
-# Para balance velocidad/precisión, usa imgsz=416 con el modelo .pt
-detector = ObjectDetector(model_path='yolov8n.engine', imgsz=416, half=True)
-
-# Estadísticas actuales globales
-# Almacena el estado actual de la detección para compartirlo entre el hilo de la cámara y la API.
-current_stats = {
-    'total_persons': 0,
-    'violations': 0,
-    'alerts': []
+# Inicializar Cámaras y Detector
+# Las cámaras se definen en cameras.json (o SAFEGUARD_CAMERAS); sin configuración se usa
+# una sola cámara con detección automática (CSI/USB, con fallback a la Cámara Sintética).
+# Con SAFEGUARD_PROCESS_SPLIT=1 la captura y la detección corren en procesos separados
+# (memoria compartida) y este proceso solo atiende las peticiones web.
+PROCESS_SPLIT = os.environ.get('SAFEGUARD_PROCESS_SPLIT') == '1'
+camera_registry = CameraRegistry()
+if not PROCESS_SPLIT:
+    camera_registry.open()
+
+# Bus de eventos para el panel (SSE): estadísticas e incidentes se envían solo cuando cambian
+events = EventBus()
+
+# Escritor de incidentes en segundo plano; cada incidente registrado se notifica al panel
+def publish_incidents(incidents):
+    for incident in incidents:
+        events.publish('incident', incident)
+
+# Configuración del modelo; la compuerta de movimiento omite YOLO cuando la escena está
+# estática (inferencia forzada cada 1 s). El backend se elige en orden TensorRT -> CUDA -> CPU
+# (SAFEGUARD_BACKEND=onnxruntime|dnn|ultralytics lo fuerza; SAFEGUARD_THREADS fija los hilos en CPU).
+DETECTOR_OPTIONS = {'model_path': 'yolov8n.engine', 'imgsz': 416, 'half': True, 'max_interval': 1.0,
+                    'backend': os.environ.get('SAFEGUARD_BACKEND', 'auto'),
+                    'threads': int(os.environ.get('SAFEGUARD_THREADS', 0)) or None}
+
+# Clips de incidentes: segundos antes y después del evento, guardados desde un búfer en memoria
+# de JPEG ya codificados (SAFEGUARD_CLIP_MEMORY_MB por cámara; SAFEGUARD_CLIPS=0 los desactiva)
+DETECTOR_OPTIONS['clips'] = None if os.environ.get('SAFEGUARD_CLIPS') == '0' else {
+    'pre_seconds': float(os.environ.get('SAFEGUARD_CLIP_PRE', 5)),
+    'post_seconds': float(os.environ.get('SAFEGUARD_CLIP_POST', 5)),
+    'max_bytes': int(float(os.environ.get('SAFEGUARD_CLIP_MEMORY_MB', 16)) * 1024 * 1024)
 }
 
-# Variable de control para activar/desactivar el monitoreo (detección)
-monitoring_active = True
-
-# Función generadora de cuadros (frames) de video
-# Esta función captura cuadros de la cámara, ejecuta la detección (si está activa) y devuelve el cuadro codificado como MJPEG.
-def gen(camera):
-    global current_stats, monitoring_active
-    while True:
-        # Si la cámara no se inicializó correctamente, esperamos y reintentamos
-        if camera is None:
-            time.sleep(1)
-            continue
-            
-        # Obtener un cuadro de la cámara
-        frame = camera.get_frame()
-        if frame is None:
-            time.sleep(0.1)
-            continue
-        
-        # Solo ejecutar la detección si el monitoreo está activo
-        if monitoring_active:
-            # El detector devuelve el cuadro con cajas dibujadas y las estadísticas
-            annotated_frame, stats = detector.detect(frame)
-            current_stats = stats
-        else:
-            # Si el monitoreo está pausado, mostramos el video normal con un mensaje de PAUSA.
-            # Esto ahorra recursos de procesamiento del modelo YOLO.
-            annotated_frame = frame.copy()
-            cv2.putText(annotated_frame, "SISTEMA PAUSADO", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
-            
-        # Codificar el cuadro a formato JPEG para enviarlo al navegador
-        ret, jpeg = cv2.imencode('.jpg', annotated_frame)
-        frame_bytes = jpeg.tobytes()
-        
-        # 'yield' devuelve el cuadro en el formato multipart necesario para el streaming MJPEG
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n\r\n')
+# Almacenamiento de capturas y clips: cuota de disco (SAFEGUARD_STORAGE_MB) y antigüedad máxima
+# (SAFEGUARD_RETENTION_DAYS); al superarlas se borran los archivos más antiguos
+DETECTOR_OPTIONS['storage'] = {
+    'max_bytes': int(float(os.environ.get('SAFEGUARD_STORAGE_MB', 1024)) * 1024 * 1024),
+    'max_age_days': float(os.environ.get('SAFEGUARD_RETENTION_DAYS', 30)) or None
+}
+
+# Registro de detecciones por persona y cuadro (cajas, puntajes, proporciones de EPP y zonas) para
+# reevaluar umbrales con replay_detections.py; se activa con SAFEGUARD_DETECTION_LOG=<carpeta>
+DETECTOR_OPTIONS['detection_log'] = os.environ.get('SAFEGUARD_DETECTION_LOG') or None
+
+# Planificador adaptativo: con SAFEGUARD_TARGET_LATENCY_MS (y opcionalmente SAFEGUARD_TARGET_FPS) el
+# pipeline reduce la calidad (EPP menos frecuente, inferencia cada N cuadros, imgsz menor) para
+# mantener el presupuesto y la recupera cuando sobra margen
+SCHEDULER_OPTIONS = None
+if os.environ.get('SAFEGUARD_TARGET_LATENCY_MS') or os.environ.get('SAFEGUARD_TARGET_FPS'):
+    SCHEDULER_OPTIONS = {'target_latency': float(os.environ.get('SAFEGUARD_TARGET_LATENCY_MS', 200)) / 1000,
+                         'target_fps': float(os.environ.get('SAFEGUARD_TARGET_FPS', 0)) or None}
+
+# Pipeline de detección compartido
+# Un único hilo captura, detecta, anota y codifica; todos los clientes de /video_feed
+# reciben el mismo JPEG publicado, por lo que el costo de inferencia no depende del número de espectadores.
+# 'current_stats' y el estado de monitoreo viven en el pipeline.
+# Con varias cámaras, sus cuadros se agrupan en un solo lote por llamada al modelo.
+camera_names = {entry['id']: entry['name'] for entry in camera_registry.config}
+# Zonas de peligro por cámara (sin 'zones' en la configuración se usa el 30% derecho)
+DETECTOR_OPTIONS['zones'] = {entry['id']: entry['zones'] for entry in camera_registry.config
+                             if entry.get('zones') is not None}
+# Regiones de interés o mosaico de inferencia por cámara (sin 'inference', el cuadro completo)
+DETECTOR_OPTIONS['inference'] = {entry['id']: entry['inference'] for entry in camera_registry.config
+                                 if entry.get('inference') is not None}
+if PROCESS_SPLIT:
+    # El detector, el escritor de incidentes y el almacén se crean dentro del proceso de
+    # detección; las miniaturas creadas aquí se cuentan en su próximo recorrido del disco
+    store = None
+    pipeline = ProcessPipeline(camera_registry.config, detector_options=DETECTOR_OPTIONS, events=events,
+                               scheduler_options=SCHEDULER_OPTIONS)
+else:
+    store = CaptureStore(on_evicted=clear_incident_media, **DETECTOR_OPTIONS['storage'])
+    incident_writer = IncidentWriter(on_written=publish_incidents, store=store)
+    clip_recorder = (ClipRecorder(store=store, on_failed=clear_incident_clip, **DETECTOR_OPTIONS['clips'])
+                     if DETECTOR_OPTIONS['clips'] is not None else None)
+    # Inicializamos el detector de objetos (YOLO) con optimizaciones para Jetson
+    # Para máxima velocidad (60 FPS), usa 'yolov8n.engine' después de ejecutar optimize_for_60fps.sh
+    # Para balance velocidad/precisión, usa imgsz=416 con el modelo .pt
+    detector = ObjectDetector(model_path=DETECTOR_OPTIONS['model_path'], imgsz=DETECTOR_OPTIONS['imgsz'],
+                              half=DETECTOR_OPTIONS['half'], backend=DETECTOR_OPTIONS['backend'],
+                              threads=DETECTOR_OPTIONS['threads'],
+                              motion_gate=MotionGate(max_interval=DETECTOR_OPTIONS['max_interval']),
+                              incident_writer=incident_writer, clip_recorder=clip_recorder,
+                              detection_log=(DetectionLog(DETECTOR_OPTIONS['detection_log'])
+                                             if DETECTOR_OPTIONS['detection_log'] else None))
+    for cam_id, zones in DETECTOR_OPTIONS['zones'].items():
+        detector.set_zones(cam_id, zones)
+    for cam_id, plan in DETECTOR_OPTIONS['inference'].items():
+        detector.set_inference_plan(cam_id, plan)
+    scheduler = AdaptiveScheduler(detector, **SCHEDULER_OPTIONS) if SCHEDULER_OPTIONS is not None else None
+    pipeline = (DetectionPipeline(camera_registry.cameras, detector, events=events, names=camera_names,
+                                  scheduler=scheduler)
+                if camera_registry.cameras else None)
+if pipeline is not None:
+    pipeline.start()
 
 # Ruta API para activar/desactivar el monitoreo
 # Recibe una solicitud JSON con la acción 'start' o 'stop'.
@@ -97,16 +143,17 @@ def gen(camera):
 @app.route('/api/toggle_monitor', methods=['POST'])
 @login_required
 def toggle_monitor():
-    global monitoring_active
     data = request.json
     action = data.get('action')
     
+    if pipeline is None:
+        return jsonify({'status': 'error', 'active': False}), 503
     if action == 'start':
-        monitoring_active = True
+        pipeline.monitoring_active = True
     elif action == 'stop':
-        monitoring_active = False
+        pipeline.monitoring_active = False
         
-    return jsonify({'status': 'ok', 'active': monitoring_active})
+    return jsonify({'status': 'ok', 'active': pipeline.monitoring_active})
 
 # Rutas de la Aplicación Web
 
@@ -142,21 +189,69 @@ def index():
 
 # Ruta de la Transmisión de Video
 # Esta ruta es la fuente (src) de la etiqueta <img> en el panel.
+# Sin identificador se transmite la primera cámara configurada.
+# ?profile=low|medium|high elige resolución/calidad y ?fps= limita los cuadros por segundo
+# de este cliente; los clientes lentos pierden cuadros en lugar de acumularlos.
+# ?raw=1 transmite el video sin anotar (las detecciones llegan por /api/detections/stream).
 @app.route('/video_feed')
+@app.route('/video_feed/<cam_id>')
 @login_required
-def video_feed():
-    if camera is None:
-        return "Cámara no disponible", 503
-    return Response(gen(camera),
+def video_feed(cam_id=None):
+    channel = pipeline.get_channel(cam_id) if pipeline is not None else None
+    if channel is None:
+        return "Cámara no disponible", 503 if cam_id is None else 404
+    profile = channel.get_profile(request.args.get('profile'), raw=request.args.get('raw') == '1')
+    if profile is None:
+        return f"Perfil no válido (opciones: {', '.join(channel.profiles)})", 400
+    max_fps = request.args.get('fps', type=float)
+    if max_fps is not None and max_fps <= 0:
+        return "fps debe ser mayor que 0", 400
+    return Response(profile.hub.stream(max_fps=max_fps),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+# Ruta de Detecciones por Cuadro (Server-Sent Events)
+# Cajas, identificadores, EPP, veredicto de zona y número de cuadro en JSON; el panel las
+# dibuja sobre el video sin anotar. Solo se generan mientras haya clientes conectados.
+@app.route('/api/detections/stream')
+@app.route('/api/detections/stream/<cam_id>')
+@login_required
+def detections_stream(cam_id=None):
+    channel = pipeline.get_channel(cam_id) if pipeline is not None else None
+    if channel is None:
+        return "Cámara no disponible", 503 if cam_id is None else 404
+    response = Response(channel.detections.stream(heartbeat=5.0), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Estadísticas actuales de una cámara (la primera si no se indica ?camera=)
+EMPTY_STATS = {'total_persons': 0, 'violations': 0, 'alerts': []}
+
+def camera_stats(cam_id=None):
+    channel = pipeline.get_channel(cam_id) if pipeline is not None else None
+    return channel.current_stats if channel is not None else EMPTY_STATS
+
+# Ruta API con la lista de cámaras configuradas y sus estadísticas actuales
+@app.route('/api/cameras')
+@login_required
+def list_cameras():
+    cameras = camera_registry.describe()
+    for camera in cameras:
+        # En modo de procesos separados las cámaras se abren en sus propios procesos
+        camera['available'] = pipeline is not None and camera['id'] in pipeline.channels
+        stats = camera_stats(camera['id']) if camera['available'] else EMPTY_STATS
+        camera['total_persons'] = stats['total_persons']
+        camera['violations'] = stats['violations']
+    return jsonify({'cameras': cameras})
+
 # Ruta API para obtener estadísticas en tiempo real
-# El frontend llama a esta ruta periódicamente para actualizar los contadores e incidentes.
+# Consulta puntual (compatibilidad); el panel usa /api/stats/stream.
 @app.route('/api/stats')
 @login_required
 def get_stats():
     # Obtenemos los incidentes más recientes de la base de datos
     db_incidents = get_recent_incidents(5)
+    current_stats = camera_stats(request.args.get('camera'))
     return jsonify({
         'total_persons': current_stats['total_persons'],
         'violations': current_stats['violations'],
@@ -164,6 +259,106 @@ def get_stats():
         'recent_incidents': db_incidents
     })
 
+# Ruta de Estadísticas en Vivo (Server-Sent Events)
+# Al conectarse se envía el estado completo (estadísticas de cada cámara + últimos incidentes);
+# después solo llegan los cambios publicados por el pipeline ('stats', con la clave 'camera')
+# y por el escritor ('incident'). El panel filtra por la cámara seleccionada.
+@app.route('/api/stats/stream')
+@login_required
+def stats_stream():
+    initial = []
+    if pipeline is not None:
+        for cam_id, channel in pipeline.channels.items():
+            initial.append(('stats', dict(channel.current_stats, camera=cam_id)))
+    initial.append(('incidents', get_recent_incidents(5)))
+    response = Response(events.stream(initial=initial), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Validar una marca de tiempo ISO opcional recibida como parámetro
+def parse_iso_param(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.fromisoformat(value).isoformat()
+
+# Ruta API de consulta de incidentes
+# Paginación por cursor (?cursor=...&limit=50) y filtros opcionales ?since=&until=&type=
+@app.route('/api/incidents')
+@login_required
+def list_incidents():
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        since = parse_iso_param('since')
+        until = parse_iso_param('until')
+        incidents, next_cursor = query_incidents(limit=limit, cursor=request.args.get('cursor'),
+                                                 since=since, until=until,
+                                                 incident_type=request.args.get('type'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'incidents': incidents, 'next_cursor': next_cursor})
+
+# Ruta API de resumen de incidentes
+# Conteos por hora o día (?bucket=hour|day) y por tipo, con filtros ?since=&until=&type=
+@app.route('/api/incidents/summary')
+@login_required
+def incidents_summary():
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in ('hour', 'day'):
+        return jsonify({'error': "bucket debe ser 'hour' o 'day'"}), 400
+    try:
+        since = parse_iso_param('since')
+        until = parse_iso_param('until')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(summarize_incidents(bucket=bucket, since=since, until=until,
+                                       incident_type=request.args.get('type')))
+
+# Ruta API con el estado interno del sistema (espectadores, cuadros procesados, inferencias omitidas)
+@app.route('/api/system')
+@login_required
+def get_system_status():
+    if pipeline is None:
+        return jsonify({'camera_available': False, 'user_cache': user_cache.get_stats()})
+    status = pipeline.get_status()
+    status['camera_available'] = True
+    status['user_cache'] = user_cache.get_stats()
+    status['stages'] = REGISTRY.summary('safeguard_stage_seconds')
+    return jsonify(status)
+
+# Capturas, miniaturas y clips de incidentes
+# Los nombres son únicos y nunca se reescriben, así que el navegador puede guardarlos en
+# caché sin volver a preguntar; send_from_directory responde 304 a las revalidaciones.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+MEDIA_MAX_AGE = 7 * 24 * 3600
+
+@app.route('/media/<path:relpath>')
+@login_required
+def media(relpath):
+    kind = relpath.split('/', 1)[0]
+    if kind not in ('captures', 'clips', THUMBS):
+        abort(404)
+    if kind == THUMBS and ensure_thumbnail(STATIC_DIR, relpath[len(THUMBS) + 1:], store=store) is None:
+        abort(404)
+    response = send_from_directory(STATIC_DIR, relpath, max_age=MEDIA_MAX_AGE)
+    # Privado: requieren sesión, no deben guardarse en cachés compartidas (proxy, túnel)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+# Métricas en formato Prometheus (histogramas por etapa, cuadros descartados, clientes, alertas)
+# Sin sesión para que el recolector pueda leerlas; con SAFEGUARD_METRICS_TOKEN se exige
+# la cabecera 'Authorization: Bearer <token>'.
+METRICS_TOKEN = os.environ.get('SAFEGUARD_METRICS_TOKEN')
+
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return Response("No autorizado\n", status=401, mimetype='text/plain')
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 # Punto de entrada principal
 if __name__ == '__main__':
     # Crear directorio para capturas si no existe (ruta absoluta basada en el script)
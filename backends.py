@@ -0,0 +1,360 @@
+import os
+import time
+import cv2
+import numpy as np
+
+# Backends de Inferencia
+# ObjectDetector delega la ejecución del modelo en un backend con una interfaz mínima:
+#   infer(frames) -> para cada cuadro, lista de cajas [x1, y1, x2, y2] de las personas
+#   warmup()      -> ejecuciones en vacío al iniciar (memoria, kernels, optimización del grafo)
+#   last_scores   -> confianza de cada caja de la última llamada a infer() (None si no se conoce)
+# - UltralyticsBackend: YOLO de ultralytics (.pt, o .engine de TensorRT) en GPU o CPU.
+# - OnnxRuntimeBackend: modelo .onnx con ONNX Runtime (proveedores TensorRT -> CUDA -> CPU).
+# - OpenCVDnnBackend: modelo .onnx con cv2.dnn (sin dependencias extra; CUDA si OpenCV lo trae).
+# Los dos últimos hacen su propio letterbox y NMS vectorizado (NumPy), por lo que funcionan
+# en servidores sin GPU ni PyTorch. El .onnx se exporta una vez con:
+#   yolo export model=yolov8n.pt format=onnx imgsz=416
+#
+# create_backend() elige el backend siguiendo el orden TensorRT -> CUDA -> CPU.
+BACKENDS = ('auto', 'ultralytics', 'onnxruntime', 'dnn')
+ONNX_PROVIDERS = ['TensorrtExecutionProvider', 'CUDAExecutionProvider', 'CPUExecutionProvider']
+
+PERSON_CLASS = 0        # COCO: 0 = Persona
+CONF_THRESHOLD = 0.25   # Mismos umbrales por defecto que ultralytics
+IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+MAX_CANDIDATES = 1000   # Cajas consideradas por la NMS (la matriz de solapamiento es N x N)
+LETTERBOX_COLOR = 114
+
+# Preprocesamiento y postprocesamiento (backends ONNX)
+
+def letterbox(frame, size, out=None):
+    """
+    Redimensiona conservando la proporción y rellena hasta size x size (gris, centrado), como
+    ultralytics. Devuelve (imagen, escala, (pad_x, pad_y)); 'out' es un búfer reutilizable.
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    if out is None:
+        out = np.empty((size, size, 3), dtype=np.uint8)
+    out[:pad_y] = LETTERBOX_COLOR
+    out[pad_y + new_h:] = LETTERBOX_COLOR
+    out[:, :pad_x] = LETTERBOX_COLOR
+    out[:, pad_x + new_w:] = LETTERBOX_COLOR
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return out, scale, (pad_x, pad_y)
+
+
+def nms(boxes, scores, iou_threshold=IOU_THRESHOLD, max_detections=MAX_DETECTIONS):
+    """
+    Supresión de no máximos: índices de las cajas conservadas, de mayor a menor puntaje.
+    La matriz de solapamiento se calcula de una vez para todas las parejas; el recorrido
+    voraz solo combina filas de booleanos. Se consideran las MAX_CANDIDATES de mayor puntaje.
+    """
+    order = np.argsort(-scores, kind='stable')[:MAX_CANDIDATES]
+    x1, y1, x2, y2 = boxes[order].T
+    areas = (x2 - x1) * (y2 - y1)
+    inter = (np.clip(np.minimum(x2[:, None], x2) - np.maximum(x1[:, None], x1), 0, None) *
+             np.clip(np.minimum(y2[:, None], y2) - np.maximum(y1[:, None], y1), 0, None))
+    overlaps = inter > iou_threshold * (areas[:, None] + areas - inter)
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        if len(keep) >= max_detections:
+            break
+        suppressed |= overlaps[i]
+    return order[keep]
+
+
+def decode_predictions(output, scale, pad, width, height, conf_threshold=CONF_THRESHOLD, iou_threshold=IOU_THRESHOLD,
+                       with_scores=False):
+    """
+    Convierte la salida de YOLOv8 de un cuadro, (4 + clases, N) con cx, cy, w, h y puntajes,
+    en la lista de cajas de personas en coordenadas del cuadro original.
+    with_scores: devolver (cajas, puntajes).
+    """
+    preds = output.T
+    scores = preds[:, 4:]
+    person = scores[:, PERSON_CLASS]
+    # Solo las cajas cuya clase más probable es persona (NMS por clase, como ultralytics)
+    keep = (person > conf_threshold) & (scores.argmax(axis=1) == PERSON_CLASS)
+    if not keep.any():
+        return ([], []) if with_scores else []
+    preds, person = preds[keep], person[keep]
+    half_w, half_h = preds[:, 2] / 2, preds[:, 3] / 2
+    boxes = np.stack([preds[:, 0] - half_w, preds[:, 1] - half_h, preds[:, 0] + half_w, preds[:, 1] + half_h], axis=1)
+    boxes -= (pad[0], pad[1], pad[0], pad[1])
+    boxes /= scale
+    np.clip(boxes[:, 0::2], 0, width, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, height, out=boxes[:, 1::2])
+    kept = nms(boxes, person, iou_threshold)
+    if with_scores:
+        return boxes[kept].astype(int).tolist(), person[kept].tolist()
+    return boxes[kept].astype(int).tolist()
+
+
+# Backends
+
+class InferenceBackend:
+    name = 'base'
+    device = 'cpu'
+    half = False
+    imgsz = 416
+    last_scores = None
+
+    def infer(self, frames):
+        raise NotImplementedError
+
+    def set_imgsz(self, imgsz):
+        """
+        Cambia el tamaño de entrada; devuelve False si el modelo tiene una entrada fija.
+        """
+        return False
+
+    def warmup(self, shape=(480, 640, 3), runs=2):
+        """
+        Ejecuta el modelo sobre cuadros vacíos para pagar la inicialización antes del primer
+        cuadro real. Devuelve la duración total en ms.
+        """
+        frame = np.zeros(shape, dtype=np.uint8)
+        start = time.perf_counter()
+        for _ in range(runs):
+            self.infer([frame])
+        return (time.perf_counter() - start) * 1000
+
+    def describe(self):
+        return {'backend': self.name, 'device': str(self.device), 'imgsz': self.imgsz, 'half': self.half}
+
+
+class UltralyticsBackend(InferenceBackend):
+    def __init__(self, model_path, imgsz=416, half=True, device=0, threads=None, batch_size=None):
+        """
+        device: 0 (primera GPU) o 'cpu'; en CPU no se usa FP16.
+        threads: hilos de PyTorch en CPU (None = valor por defecto).
+        batch_size: lote fijo del modelo; por defecto 1 para un .engine (optimize_for_60fps.sh
+        lo exporta con lote 1) y sin límite para un .pt.
+        """
+        from ultralytics import YOLO
+        if device == 'cpu' and threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+        self.name = 'tensorrt' if model_path.endswith('.engine') else 'ultralytics'
+        self.batch_size = batch_size or (1 if self.name == 'tensorrt' else None)
+        self.device = device
+        self.imgsz = imgsz
+        self.half = half and device != 'cpu'
+
+    def set_imgsz(self, imgsz):
+        # Un .engine de TensorRT se compila para un tamaño fijo
+        if self.name == 'tensorrt':
+            return False
+        self.imgsz = imgsz
+        return True
+
+    def infer(self, frames):
+        # Un .engine de TensorRT tiene lote fijo: varias cámaras (o recortes de tiling.py) se
+        # ejecutan en trozos de ese tamaño
+        step = self.batch_size or len(frames)
+        results = []
+        for start in range(0, len(frames), step):
+            results.extend(self.model(frames[start:start + step], verbose=False, imgsz=self.imgsz, half=self.half,
+                                      device=self.device, classes=[PERSON_CLASS]))
+        batch_boxes = []
+        batch_scores = []
+        for r in results:
+            person_boxes = []
+            person_scores = []
+            for box in r.boxes:
+                if int(box.cls[0]) == PERSON_CLASS:
+                    person_boxes.append(list(map(int, box.xyxy[0])))
+                    person_scores.append(float(box.conf[0]))
+            batch_boxes.append(person_boxes)
+            batch_scores.append(person_scores)
+        self.last_scores = batch_scores
+        return batch_boxes
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    name = 'onnxruntime'
+
+    def __init__(self, model_path, imgsz=416, threads=None, providers=None):
+        """
+        providers: proveedores de ONNX Runtime en orden de preferencia (se ignoran los no
+        disponibles); por defecto TensorRT -> CUDA -> CPU.
+        threads: hilos intra-operación en CPU (None = uno por núcleo).
+        """
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        available = ort.get_available_providers()
+        providers = [p for p in (providers or ONNX_PROVIDERS) if p in available] or ['CPUExecutionProvider']
+        self.session = ort.InferenceSession(model_path, options, providers=providers)
+        self.device = self.session.get_providers()[0].replace('ExecutionProvider', '')
+
+        # Forma de entrada [lote, 3, alto, ancho]; las dimensiones dinámicas vienen como texto
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.half = model_input.type == 'tensor(float16)'
+        batch, _, height, _ = model_input.shape
+        self.imgsz = height if isinstance(height, int) else imgsz
+        self.dynamic_size = not isinstance(height, int)
+        self.batch_size = batch if isinstance(batch, int) else None
+        self._canvas = []
+
+    def set_imgsz(self, imgsz):
+        if not self.dynamic_size:
+            return False
+        self.imgsz = imgsz
+        self._canvas = []
+        return True
+
+    def _blob(self, frames):
+        # Letterbox sobre búferes reutilizados y blob NCHW RGB normalizado en una sola llamada
+        while len(self._canvas) < len(frames):
+            self._canvas.append(np.empty((self.imgsz, self.imgsz, 3), dtype=np.uint8))
+        meta = [letterbox(frame, self.imgsz, out=canvas)[1:] for frame, canvas in zip(frames, self._canvas)]
+        blob = cv2.dnn.blobFromImages(self._canvas[:len(frames)], 1 / 255.0, swapRB=True)
+        return (blob.astype(np.float16) if self.half else blob), meta
+
+    def infer(self, frames):
+        # Un modelo exportado con lote fijo se ejecuta en trozos de ese tamaño
+        step = self.batch_size or len(frames)
+        batch_boxes = []
+        batch_scores = []
+        for start in range(0, len(frames), step):
+            chunk = frames[start:start + step]
+            padded = chunk + [chunk[-1]] * (step - len(chunk))
+            blob, meta = self._blob(padded)
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+            for frame, output, (scale, pad) in zip(chunk, outputs, meta):
+                h, w = frame.shape[:2]
+                boxes, scores = decode_predictions(output.astype(np.float32), scale, pad, w, h, with_scores=True)
+                batch_boxes.append(boxes)
+                batch_scores.append(scores)
+        self.last_scores = batch_scores
+        return batch_boxes
+
+
+class OpenCVDnnBackend(InferenceBackend):
+    name = 'dnn'
+
+    def __init__(self, model_path, imgsz=416, half=False, threads=None, cuda=True):
+        """
+        cuda: usar el backend CUDA de OpenCV si está compilado con soporte y hay una GPU.
+        threads: hilos de OpenCV (ajuste global del proceso; None = valor por defecto).
+        """
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        if cuda and hasattr(cv2, 'cuda') and cv2.cuda.getCudaEnabledDeviceCount() > 0:
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA_FP16 if half else cv2.dnn.DNN_TARGET_CUDA)
+            self.device = 'CUDA'
+            self.half = half
+        else:
+            self.device = 'CPU'
+        if threads:
+            cv2.setNumThreads(threads)
+        self.imgsz = imgsz
+        self._canvas = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+
+    def infer(self, frames):
+        # Los .onnx de YOLOv8 suelen exportarse con lote fijo de 1: un cuadro por llamada
+        batch_boxes = []
+        batch_scores = []
+        for frame in frames:
+            _, scale, pad = letterbox(frame, self.imgsz, out=self._canvas)
+            self.net.setInput(cv2.dnn.blobFromImage(self._canvas, 1 / 255.0, swapRB=True))
+            output = self.net.forward()
+            h, w = frame.shape[:2]
+            boxes, scores = decode_predictions(output[0], scale, pad, w, h, with_scores=True)
+            batch_boxes.append(boxes)
+            batch_scores.append(scores)
+        self.last_scores = batch_scores
+        return batch_boxes
+
+
+# Selección del backend
+
+def _cuda_available():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def _onnx_providers():
+    try:
+        import onnxruntime as ort
+        return ort.get_available_providers()
+    except ImportError:
+        return []
+
+
+def _dnn_cuda_available():
+    return hasattr(cv2, 'cuda') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+
+
+def create_backend(model_path='yolov8n.engine', imgsz=416, half=True, backend='auto', threads=None):
+    """
+    Construye el backend de inferencia.
+    backend: 'ultralytics', 'onnxruntime', 'dnn' o 'auto'. Con 'auto' se prueban, en orden:
+      1. TensorRT: el .engine con ultralytics o el .onnx con el proveedor TensorRT de ONNX Runtime.
+      2. CUDA: el .onnx con el proveedor CUDA, el .pt en la GPU o el .onnx con cv2.dnn en CUDA.
+      3. CPU: el .onnx con ONNX Runtime o cv2.dnn; si no hay .onnx, el .pt con ultralytics.
+    Las variantes del modelo se buscan junto a 'model_path' con el mismo nombre base
+    (yolov8n.engine, yolov8n.onnx, yolov8n.pt); un candidato que falla da paso al siguiente.
+    threads: hilos de inferencia en CPU (None = valor por defecto de cada biblioteca).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de inferencia no válido: {backend} (opciones: {', '.join(BACKENDS)})")
+    base = os.path.splitext(model_path)[0]
+    engine_path, onnx_path, pt_path = base + '.engine', base + '.onnx', base + '.pt'
+    onnx_path = model_path if model_path.endswith('.onnx') else onnx_path
+    cuda = _cuda_available()
+
+    if backend == 'ultralytics':
+        path = model_path if model_path.endswith(('.pt', '.engine')) else pt_path
+        return UltralyticsBackend(path, imgsz, half, device=0 if cuda else 'cpu', threads=threads)
+    if backend == 'onnxruntime':
+        return OnnxRuntimeBackend(onnx_path, imgsz, threads)
+    if backend == 'dnn':
+        return OpenCVDnnBackend(onnx_path, imgsz, half, threads)
+
+    providers = _onnx_providers()
+    has_onnx = os.path.exists(onnx_path)
+    candidates = []
+    # 1. TensorRT
+    if cuda and os.path.exists(engine_path):
+        candidates.append(("TensorRT", lambda: UltralyticsBackend(engine_path, imgsz, half, device=0)))
+    if has_onnx and 'TensorrtExecutionProvider' in providers:
+        candidates.append(("TensorRT (ONNX Runtime)", lambda: OnnxRuntimeBackend(onnx_path, imgsz, threads, ONNX_PROVIDERS)))
+    # 2. CUDA
+    if has_onnx and 'CUDAExecutionProvider' in providers:
+        candidates.append(("CUDA (ONNX Runtime)", lambda: OnnxRuntimeBackend(onnx_path, imgsz, threads, ONNX_PROVIDERS[1:])))
+    if cuda:
+        candidates.append(("CUDA", lambda: UltralyticsBackend(pt_path, imgsz, half, device=0)))
+    if has_onnx and _dnn_cuda_available():
+        candidates.append(("CUDA (OpenCV DNN)", lambda: OpenCVDnnBackend(onnx_path, imgsz, half, threads)))
+    # 3. CPU
+    if has_onnx and providers:
+        candidates.append(("CPU (ONNX Runtime)", lambda: OnnxRuntimeBackend(onnx_path, imgsz, threads, ONNX_PROVIDERS[2:])))
+    if has_onnx:
+        candidates.append(("CPU (OpenCV DNN)", lambda: OpenCVDnnBackend(onnx_path, imgsz, False, threads, cuda=False)))
+    candidates.append(("CPU", lambda: UltralyticsBackend(pt_path, imgsz, False, device='cpu', threads=threads)))
+
+    for i, (label, factory) in enumerate(candidates):
+        try:
+            return factory()
+        except Exception as e:
+            if i == len(candidates) - 1:
+                raise
+            print(f"⚠️ Backend {label} no disponible ({e}); probando el siguiente")
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Análisis por lotes de grabaciones (sin panel ni cámara en vivo).
+
+Divide cada video en segmentos y los analiza en un grupo de procesos a máxima velocidad
+(un detector por proceso, un hilo de inferencia cada uno para usar todos los núcleos), con el
+mismo rastreo, EPP, zonas y alertas que el sistema en vivo, pero con el reloj del video.
+
+Salida en la carpeta --out:
+  detections/<video>/<cuadro inicial>.jsonl.gz  registro por cuadro (personas, cajas, estado)
+  captures/<video>/...                          capturas de los incidentes
+  incidents.jsonl                               incidentes (con --incidents file)
+  manifest.jsonl                                segmentos terminados (para reanudar)
+Con --incidents db (por defecto) los incidentes se registran en la base de datos del panel,
+con su captura en el almacén de capturas.
+
+Uso:
+    python batch_analyze.py grabaciones/ --out analisis/ [--workers 8] [--segment 60]
+                            [--stride 1] [--incidents db|file]
+    python batch_analyze.py camara1.mp4 --out analisis/ --start 2026-10-18T06:00:00
+
+Hora de cada grabación: --start (solo con un único archivo), la fecha y hora del nombre del
+archivo (p. ej. camara1_20261018_060000.mp4) o su fecha de modificación menos la duración.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import cv2
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.mjpeg', '.webm')
+# Fecha y hora en el nombre del archivo, como la escriben los grabadores habituales:
+# camara1_20261017_060000.mp4, 2026-10-17T06-00-00.mkv, 20261017-060000.avi
+NAME_TIME = re.compile(r'(?<!\d)((?:19|20)\d{2})-?(\d{2})-?(\d{2})[T_ -]?(\d{2})[-:_.]?(\d{2})[-:_.]?(\d{2})(?!\d)')
+
+# Descubrimiento de videos y segmentos
+
+def find_videos(paths):
+    """
+    Archivos de video de la lista (los directorios se recorren recursivamente), ordenados.
+    """
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                videos.extend(os.path.join(dirpath, f) for f in filenames if f.lower().endswith(VIDEO_EXTENSIONS))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"⚠️ No existe: {path}")
+    return sorted(set(os.path.abspath(v) for v in videos))
+
+def video_key(path):
+    """
+    Identificador estable del video: nombre + hash de la ruta (dos 'turno1.mp4' en carpetas distintas no chocan).
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}_{hashlib.sha1(path.encode()).hexdigest()[:8]}"
+
+def recording_start(path, duration):
+    """
+    Hora de inicio de la grabación: la fecha y hora del nombre del archivo (NAME_TIME) o, si
+    no la tiene, la fecha de modificación del archivo menos su duración en segundos.
+    """
+    match = NAME_TIME.search(os.path.basename(path))
+    if match:
+        try:
+            return datetime(*(int(g) for g in match.groups()))
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=max(duration, 0))
+
+def plan_segments(path, segment_seconds, start=None):
+    """
+    Lista de segmentos (diccionarios) de un video. 'start' es la hora de inicio de la
+    grabación; por defecto, la de recording_start().
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"❌ No se pudo abrir: {path}")
+        return []
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if start is None:
+        start = recording_start(path, total / fps)
+    key = video_key(path)
+    length = max(int(segment_seconds * fps), 1)
+    # Sin número de cuadros confiable: un solo segmento hasta el final del archivo
+    bounds = [(s, min(s + length, total)) for s in range(0, total, length)] if total > 0 else [(0, None)]
+    return [{
+        'key': f"{key}:{first}",
+        'video': path,
+        'video_key': key,
+        'first': first,
+        'last': last,
+        'fps': fps,
+        'start': start.isoformat()
+    } for first, last in bounds]
+
+
+# Proceso de trabajo
+
+class CollectingWriter:
+    """
+    Sustituto del IncidentWriter en los procesos de trabajo: guarda la captura en la carpeta
+    de salida y acumula los incidentes del segmento para devolverlos al proceso principal.
+    """
+    def __init__(self):
+        self.segment = None
+        self.start_time = 0.0
+        self.frame_no = 0
+        self.incidents = []
+
+    def begin(self, segment):
+        """
+        Prepara el escritor para un segmento nuevo (incidentes vacíos, reloj desde su grabación).
+        """
+        self.segment, self.incidents = segment, []
+        self.start_time = datetime.fromisoformat(segment['start']).timestamp()
+
+    def submit(self, frame, incident_type, details="", clip_path=None):
+        segment = self.segment
+        offset = self.frame_no / segment['fps']
+        timestamp = datetime.fromisoformat(segment['start']) + timedelta(seconds=offset)
+        image = None
+        if frame is not None:
+            # Ruta relativa a la carpeta de salida
+            image = f"captures/{segment['video_key']}/{self.frame_no:08d}_{len(self.incidents)}.jpg"
+            path = os.path.join(_worker['out'], image)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, 90]):
+                image = None
+        position = time.strftime('%H:%M:%S', time.gmtime(offset))
+        self.incidents.append({
+            'timestamp': timestamp.isoformat(),
+            'type': incident_type,
+            'details': f"{details or f'Violación detectada: {incident_type}'} @ {position}",
+            'video': segment['video'],
+            'frame': self.frame_no,
+            'image': image
+        })
+        return True
+
+    def clock(self):
+        """
+        Reloj del detector: hora (epoch) del cuadro actual en la grabación, es decir, el inicio
+        del video más los segundos de video (enfriamientos y FPS según el video, y las marcas
+        de tiempo de las detecciones en la misma escala que en vivo).
+        """
+        return self.start_time + self.frame_no / self.segment['fps'] if self.segment else 0.0
+
+    def get_stats(self):
+        return {'collected': len(self.incidents)}
+
+_worker = {}
+
+def _init_worker(options):
+    from detector import ObjectDetector
+    # Un hilo por proceso: el paralelismo viene del número de procesos
+    cv2.setNumThreads(1)
+    writer = CollectingWriter()
+    detector = ObjectDetector(model_path=options['model'], imgsz=options['imgsz'], half=False,
+                              backend=options['backend'], threads=options['threads'], incident_writer=writer,
+                              clock=writer.clock)
+    _worker.update(detector=detector, writer=writer, out=options['out'], stride=options['stride'],
+                   zones=options['zones'], inference=options['inference'])
+
+def analyze_segment(segment):
+    """
+    Analiza un segmento en el proceso de trabajo y escribe su registro por cuadro.
+    Devuelve el resumen del segmento con sus incidentes.
+    """
+    detector, writer, stride = _worker['detector'], _worker['writer'], _worker['stride']
+    writer.begin(segment)
+    # Estado nuevo por segmento (rastreo y enfriamientos empiezan de cero)
+    stream_id = os.path.basename(segment['video'])
+    detector.streams.pop(stream_id, None)
+    if _worker['zones'] is not None:
+        detector.set_zones(stream_id, _worker['zones'])
+    if _worker['inference'] is not None:
+        detector.set_inference_plan(stream_id, _worker['inference'])
+
+    folder = os.path.join(_worker['out'], 'detections', segment['video_key'])
+    os.makedirs(folder, exist_ok=True)
+    log_path = os.path.join(folder, f"{segment['first']:08d}.jsonl.gz")
+
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(segment['video'])
+    if segment['first']:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, segment['first'])
+    frame_no = segment['first']
+    decoded = analyzed = 0
+    with gzip.open(log_path + '.tmp', 'wt', compresslevel=3) as log:
+        while segment['last'] is None or frame_no < segment['last']:
+            # Los cuadros intermedios (stride) se saltan sin decodificarlos
+            if (frame_no - segment['first']) % stride:
+                if not cap.grab():
+                    break
+                frame_no += 1
+                continue
+            grabbed, frame = cap.read()
+            if not grabbed:
+                break
+            decoded += 1
+            writer.frame_no = frame_no
+            detections, stats = detector.analyze_batch([frame], [stream_id])[0]
+            analyzed += 1
+            log.write(json.dumps({
+                'frame': frame_no,
+                't': round(frame_no / segment['fps'], 3),
+                'persons': [{k: p[k] for k in ('id', 'box', 'status', 'helmet', 'vest', 'in_zone', 'zones')}
+                            for p in detections['persons']]
+            }, separators=(',', ':')) + '\n')
+            frame_no += 1
+    cap.release()
+    os.replace(log_path + '.tmp', log_path)
+    return dict(segment, worker=os.getpid(), frames=frame_no - segment['first'], analyzed=analyzed,
+                seconds=time.perf_counter() - start, log=log_path, incidents=writer.incidents)
+
+
+# Proceso principal
+
+class IncidentSink:
+    """
+    Destino de los incidentes: base de datos del panel (con la captura en el CaptureStore) o incidents.jsonl.
+    """
+    def __init__(self, mode, out):
+        self.mode = mode
+        self.out = out
+        if mode == 'db':
+            import database
+            from storage import CaptureStore
+            database.migrate(database.get_connection())
+            self._database = database
+            self._store = CaptureStore(on_evicted=database.clear_incident_media)
+
+    def write(self, incidents):
+        if not incidents:
+            return
+        if self.mode == 'file':
+            with open(os.path.join(self.out, 'incidents.jsonl'), 'a') as f:
+                for incident in incidents:
+                    f.write(json.dumps(incident) + '\n')
+            return
+        rows = []
+        for incident in incidents:
+            image_path = None
+            frame = cv2.imread(os.path.join(self.out, incident['image'])) if incident['image'] else None
+            if frame is not None:
+                image_path = self._store.save_image(datetime.fromisoformat(incident['timestamp']), frame)
+            rows.append((incident['timestamp'], incident['type'], image_path, incident['details'], None))
+        if self._database.log_incidents(rows) is None:
+            raise RuntimeError("No se pudieron registrar los incidentes en la base de datos")
+
+def _load_manifest(path):
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['key'])
+                except (ValueError, KeyError):
+                    continue   # línea incompleta de una ejecución interrumpida
+        # Cerrar esa línea para que la próxima entrada no quede pegada a ella
+        with open(path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+    return done
+
+def _context():
+    methods = mp.get_all_start_methods()
+    return mp.get_context('fork' if 'fork' in methods else 'spawn')
+
+def analyze_videos(paths, out, workers=None, segment_seconds=60, stride=1, incidents='db', start=None,
+                   model='yolov8n.pt', imgsz=416, backend='auto', threads=1, zones=None, inference=None,
+                   resume=True):
+    """
+    Analiza los videos de 'paths' (archivos o carpetas) y devuelve un resumen con los
+    cuadros por segundo de cada proceso. Con resume=True se saltan los segmentos que ya
+    figuran en el manifiesto de 'out'. 'start' (hora de inicio) solo se admite con un único
+    video: con varios, cada uno toma la suya de recording_start().
+    """
+    videos = find_videos(paths)
+    if start is not None and len(videos) > 1:
+        raise ValueError(f"La hora de inicio solo se admite con un único video ({len(videos)} encontrados)")
+    os.makedirs(out, exist_ok=True)
+    manifest_path = os.path.join(out, 'manifest.jsonl')
+    if not resume and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    done = _load_manifest(manifest_path)
+
+    segments = []
+    for video in videos:
+        segments.extend(plan_segments(video, segment_seconds, start))
+    pending = [s for s in segments if s['key'] not in done]
+    workers = workers or os.cpu_count() or 1
+    print(f"🎞️ {len(segments)} segmentos, {len(segments) - len(pending)} ya analizados, "
+          f"{len(pending)} pendientes con {workers} procesos")
+
+    sink = IncidentSink(incidents, out)
+    options = {'model': model, 'imgsz': imgsz, 'backend': backend, 'threads': threads, 'out': out,
+               'stride': max(int(stride), 1), 'zones': zones,
+               'inference': inference}
+    per_worker = {}
+    total_incidents = 0
+    wall_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_context(), initializer=_init_worker,
+                             initargs=(options,)) as pool:
+        futures = [pool.submit(analyze_segment, segment) for segment in pending]
+        for n, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            # Incidentes primero, manifiesto después: un segmento figura como hecho solo
+            # cuando sus incidentes ya están guardados
+            sink.write(result['incidents'])
+            total_incidents += len(result['incidents'])
+            entry = {k: v for k, v in result.items() if k != 'incidents'}
+            entry['incidents'] = len(result['incidents'])
+            with open(manifest_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+            stats = per_worker.setdefault(result['worker'], {'segments': 0, 'frames': 0, 'seconds': 0.0})
+            stats['segments'] += 1
+            stats['frames'] += result['analyzed']
+            stats['seconds'] += result['seconds']
+            position = time.strftime('%H:%M:%S', time.gmtime(result['first'] / result['fps']))
+            print(f"[{n}/{len(pending)}] {os.path.basename(result['video'])} {position} · proceso {result['worker']} · "
+                  f"{result['analyzed'] / max(result['seconds'], 1e-9):.1f} cuadros/s · "
+                  f"{len(result['incidents'])} incidentes")
+
+    wall = time.perf_counter() - wall_start
+    frames = sum(s['frames'] for s in per_worker.values())
+    summary = {
+        'segments': len(segments),
+        'analyzed_segments': len(pending),
+        'frames': frames,
+        'incidents': total_incidents,
+        'seconds': round(wall, 2),
+        'fps': round(frames / wall, 1) if wall > 0 else 0.0,
+        'workers': {pid: dict(s, fps=round(s['frames'] / s['seconds'], 1) if s['seconds'] else 0.0)
+                    for pid, s in per_worker.items()}
+    }
+    if per_worker:
+        print(f"{'proceso':>8} | {'segm.':>5} | {'cuadros':>8} | {'cuadros/s':>9}")
+        for pid, s in summary['workers'].items():
+            print(f"{pid:>8} | {s['segments']:>5} | {s['frames']:>8} | {s['fps']:>9.1f}")
+    print(f"✅ {frames} cuadros en {wall:.1f} s ({summary['fps']} cuadros/s en total), {total_incidents} incidentes")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help="archivos de video o carpetas")
+    parser.add_argument('--out', required=True, help="carpeta de salida (registro por cuadro, capturas, manifiesto)")
+    parser.add_argument('--workers', type=int, default=None, help="procesos (por defecto, uno por núcleo)")
+    parser.add_argument('--segment', type=float, default=60.0, help="segundos de video por segmento")
+    parser.add_argument('--stride', type=int, default=1, help="analizar uno de cada N cuadros")
+    parser.add_argument('--incidents', choices=['db', 'file'], default='db')
+    parser.add_argument('--start', default=None,
+                        help="hora de inicio de la grabación (ISO), solo con un único archivo; por defecto, la "
+                             "fecha y hora del nombre del archivo o su fecha de modificación menos la duración")
+    parser.add_argument('--zones', default=None, help="archivo JSON con la lista de zonas (ver zones.py)")
+    parser.add_argument('--inference', default=None,
+                        help="archivo JSON con el plan de inferencia: regiones o mosaico (ver tiling.py)")
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--imgsz', type=int, default=416)
+    parser.add_argument('--backend', default='auto')
+    parser.add_argument('--threads', type=int, default=1, help="hilos de inferencia por proceso")
+    parser.add_argument('--restart', action='store_true', help="ignorar el manifiesto y analizar todo de nuevo")
+    args = parser.parse_args()
+    if args.start and (len(args.paths) != 1 or not os.path.isfile(args.paths[0])):
+        parser.error("--start solo se admite con un único archivo de video")
+
+    zones = None
+    if args.zones:
+        with open(args.zones) as f:
+            zones = json.load(f)
+    inference = None
+    if args.inference:
+        with open(args.inference) as f:
+            inference = json.load(f)
+    analyze_videos(args.paths, args.out, workers=args.workers, segment_seconds=args.segment, stride=args.stride,
+                   incidents=args.incidents, start=datetime.fromisoformat(args.start) if args.start else None,
+                   model=args.model, imgsz=args.imgsz, backend=args.backend, threads=args.threads, zones=zones,
+                   inference=inference, resume=not args.restart)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los backends de inferencia (backends.py) sobre la cámara sintética.
+
+Para cada backend reporta el costo del primer cuadro sin calentamiento (carga del grafo,
+reserva de memoria), y con el modelo ya caliente la latencia por cuadro (p50/p95) y los FPS.
+Con --threads se fija el número de hilos en CPU para tener una línea base reproducible.
+
+Uso:
+    python benchmarks/bench_backends.py [--model yolov8n.onnx] [--backends onnxruntime dnn]
+                                        [--frames 100] [--threads 4] [--imgsz 416]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import create_backend
+from camera import SyntheticCamera
+
+
+def run(backend_name, args, frames):
+    start = time.perf_counter()
+    backend = create_backend(args.model, args.imgsz, half=False, backend=backend_name, threads=args.threads)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    backend.infer([frames[0]])
+    first_ms = (time.perf_counter() - start) * 1000
+
+    backend.warmup()
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        backend.infer([frame])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return backend.describe(), load_ms, first_ms, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='yolov8n.onnx')
+    parser.add_argument('--backends', nargs='+', default=['onnxruntime', 'dnn'])
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--imgsz', type=int, default=416)
+    args = parser.parse_args()
+
+    camera = SyntheticCamera()
+    frames = [camera.read()[1] for _ in range(args.frames)]
+
+    print(f"Modelo {args.model}, {args.frames} cuadros, imgsz {args.imgsz}, "
+          f"hilos {args.threads or 'por defecto'}, {os.cpu_count()} CPU")
+    print(f"{'backend':>12} | {'disp.':>6} | {'carga ms':>8} | {'1er cuadro ms':>13} | {'p50 ms':>7} | {'p95 ms':>7} | {'FPS':>6}")
+    for name in args.backends:
+        try:
+            info, load_ms, first_ms, latencies = run(name, args, frames)
+        except Exception as e:
+            print(f"{name:>12} | no disponible: {e}")
+            continue
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{info['backend']:>12} | {info['device']:>6} | {load_ms:>8.1f} | {first_ms:>13.1f} | "
+              f"{p50:>7.2f} | {p95:>7.2f} | {1000 / np.mean(latencies):>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark de búferes preasignados en el camino de detección (captura -> análisis -> dibujo ->
+JPEG), con la cámara sintética real (VideoCamera con hilo) y el DetectionPipeline.
+
+Compara dos modos, cada uno en un proceso nuevo para que la memoria no se mezcle:
+
+  asignando   un arreglo nuevo por lectura de cámara (buffers=0), una copia por cuadro
+              anotado y por pausa, y un arreglo nuevo por reescalado de cada perfil
+  búferes     captura en búferes rotativos, dibujo en el búfer de la cámara y reescalado
+              en el destino reutilizable del perfil
+
+Cada proceso corre una fase con detección y otra en pausa y reporta: CPU del hilo del
+pipeline por cuadro (µs), fallos de página menores por cuadro (cada página nueva que el
+sistema entrega al proceso), pico de memoria transitoria por cuadro medido con tracemalloc
+(KB asignados por encima de lo que ya estaba vivo al empezar el cuadro), memoria residente
+al final y su máximo. El modelo se reemplaza por uno simulado sin latencia.
+
+Uso:
+    python benchmarks/bench_buffers.py [--frames 300] [--warmup 30]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from camera import VideoCamera
+from detector import ObjectDetector
+from pipeline import DetectionPipeline
+
+MODES = {'asignando': 0, 'búferes': 3}
+PHASES = (('detección', True), ('pausa', False))
+PROFILES = ('medium', 'high')
+
+
+class StubDetector(ObjectDetector):
+    """
+    ObjectDetector con un modelo simulado: una persona fija en la escena, sin latencia.
+    """
+    def _load_model(self, model_path):
+        return None
+
+    def _infer_batch(self, frames):
+        return [[[280, 160, 360, 400]] for _ in frames]
+
+    def save_alert(self, frame, incident_type, details=None, clip_path=None):
+        pass
+
+
+def rss_mb():
+    """
+    Memoria residente actual del proceso (MB); en sistemas sin /proc, el pico.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def allocate_per_frame(pipeline):
+    """
+    Comportamiento anterior: copia por cuadro anotado y reescalado a un arreglo nuevo.
+    """
+    for channel in pipeline.channels.values():
+        channel.render_buffer = lambda frame: None
+        for profile in channel.profiles.values():
+            def encode(frame, now=None, overlay=None, profile=profile, encode=profile.encode):
+                height, width = frame.shape[:2]
+                if profile.width and profile.width < width:
+                    frame = cv2.resize(frame, (profile.width, height * profile.width // width),
+                                       interpolation=cv2.INTER_AREA)
+                encode(frame, now, overlay)
+            profile.encode = encode
+
+
+def process(pipeline, frames, traced=False):
+    """
+    Procesa 'frames' cuadros; devuelve (CPU del hilo en s, fallos de página, picos transitorios en bytes).
+    """
+    done, cpu, peaks = 0, 0.0, []
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    while done < frames:
+        if traced:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.thread_time()
+        processed = pipeline.process_once(timeout=1.0)
+        cpu += time.thread_time() - start
+        if processed and traced:
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        done += processed
+    return cpu, resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults, peaks
+
+
+def run_mode(mode, frames, warmup):
+    camera = VideoCamera(sources=['synthetic'], buffers=MODES[mode])
+    pipeline = DetectionPipeline(camera, StubDetector())
+    for channel in pipeline.channels.values():
+        for name in PROFILES:
+            # Un espectador sin límite de FPS: se dibuja y codifica cada cuadro
+            channel.profiles[name].hub.subscribers = 1
+            channel.profiles[name].max_fps = None
+    if mode == 'asignando':
+        allocate_per_frame(pipeline)
+    results = {}
+    try:
+        for phase, active in PHASES:
+            pipeline.monitoring_active = active
+            process(pipeline, warmup)
+            cpu, faults, _ = process(pipeline, frames)
+            tracemalloc.start()
+            _, _, peaks = process(pipeline, frames, traced=True)
+            tracemalloc.stop()
+            peaks.sort()
+            results[phase] = {
+                'cpu_us': cpu / frames * 1e6,
+                'faults': faults / frames,
+                'peak_kb': peaks[len(peaks) // 2] / 1024,
+                'peak_max_kb': peaks[-1] / 1024
+            }
+    finally:
+        camera.stop()
+    results['rss_mb'] = rss_mb()
+    results['hwm_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--mode', choices=list(MODES), default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Proceso hijo: un solo modo, resultado en JSON por la salida estándar
+        print(json.dumps(run_mode(args.mode, args.frames, args.warmup)))
+        return
+
+    print(f"{'modo':>10} | {'fase':>9} | {'CPU µs/c':>9} | {'fallos/c':>8} | {'pico KB/c':>9} | "
+          f"{'máx KB':>7} | {'RSS MB':>6} | {'máx RSS':>7}")
+    for mode in MODES:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode,
+                                 '--frames', str(args.frames), '--warmup', str(args.warmup)],
+                                check=True, capture_output=True, text=True).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        for phase, _ in PHASES:
+            r = results[phase]
+            print(f"{mode:>10} | {phase:>9} | {r['cpu_us']:>9.0f} | {r['faults']:>8.1f} | {r['peak_kb']:>9.1f} | "
+                  f"{r['peak_max_kb']:>7.1f} | {results['rss_mb']:>6.1f} | {results['hwm_mb']:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
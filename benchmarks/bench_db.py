@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark de acceso a SQLite: una conexión nueva por consulta (implementación anterior,
+modo de diario por defecto) frente al pool de conexiones por hilo en modo WAL de database.py.
+
+Simula varios paneles consultando /api/stats (get_recent_incidents(5) + get_user_by_id)
+mientras un escritor registra incidentes, y reporta lecturas/s y escrituras/s.
+Usa bases de datos temporales.
+
+Uso:
+    python benchmarks/bench_db.py [--pollers 8] [--seconds 3] [--seed-rows 50000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+# --- Implementación anterior: conexión nueva por llamada ---
+def legacy_log_incident(path, incident_type, image_path, details=""):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute('INSERT INTO incidents (timestamp, type, image_path, details) VALUES (?, ?, ?, ?)',
+              (datetime.now().isoformat(), incident_type, image_path, details))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_recent_incidents(path, limit):
+    conn = sqlite3.connect(path)
+    rows = conn.execute('SELECT * FROM incidents ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_get_user_by_id(path, user_id):
+    conn = sqlite3.connect(path)
+    row = conn.execute('SELECT id, username, password FROM users WHERE id = ?', (user_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def seed(path, rows):
+    conn = sqlite3.connect(path)
+    start = datetime(2026, 1, 1)
+    conn.executemany('INSERT INTO incidents (timestamp, type, image_path, details) VALUES (?, ?, ?, ?)',
+                     (((start + timedelta(seconds=30 * i)).isoformat(), "SIN CASCO", None, "seed") for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def run(read_fn, write_fn, pollers, seconds):
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def poller():
+        n = 0
+        while not stop.is_set():
+            try:
+                read_fn()
+                n += 1
+            except sqlite3.Error:
+                with lock:
+                    counts['errors'] += 1
+        with lock:
+            counts['reads'] += n
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            try:
+                write_fn()
+                n += 1
+            except sqlite3.Error:
+                with lock:
+                    counts['errors'] += 1
+        with lock:
+            counts['writes'] += n
+
+    threads = [threading.Thread(target=poller) for _ in range(pollers)] + [threading.Thread(target=writer)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {k: v / seconds if k != 'errors' else v for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pollers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--seed-rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='safeguard_bench_')
+
+    # Base de datos con el esquema y modo anteriores
+    legacy_path = os.path.join(tmp, 'legacy.db')
+    conn = sqlite3.connect(legacy_path)
+    for statement in database.MIGRATIONS[0]:
+        conn.execute(statement)
+    conn.execute("INSERT INTO users (username, password) VALUES ('admin', 'x')")
+    conn.commit()
+    conn.close()
+    seed(legacy_path, args.seed_rows)
+
+    # Base de datos con el pool WAL y los índices
+    database.DB_PATH = os.path.join(tmp, 'pooled.db')
+    database.init_db()
+    seed(database.DB_PATH, args.seed_rows)
+
+    legacy = run(lambda: (legacy_get_recent_incidents(legacy_path, 5), legacy_get_user_by_id(legacy_path, 1)),
+                 lambda: legacy_log_incident(legacy_path, "SIN CASCO", None, "bench"),
+                 args.pollers, args.seconds)
+    pooled = run(lambda: (database.get_recent_incidents(5), database.get_user_by_id(1)),
+                 lambda: database.log_incident("SIN CASCO", None, "bench"),
+                 args.pollers, args.seconds)
+
+    print(f"\n{args.pollers} lectores + 1 escritor, {args.seconds:.0f} s, {args.seed_rows} filas iniciales")
+    print(f"{'modo':>22} | {'lecturas/s':>10} | {'escrituras/s':>12} | {'errores':>7}")
+    for name, r in (('conexión por consulta', legacy), ('pool por hilo + WAL', pooled)):
+        print(f"{name:>22} | {r['reads']:>10.0f} | {r['writes']:>12.0f} | {r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
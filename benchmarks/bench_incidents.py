@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark de persistencia de incidentes: guardado en línea (cv2.imwrite + log_incident,
+como hacía antes save_alert) frente al IncidentWriter asíncrono.
+
+Simula ráfagas de alertas y mide cuánto bloquea cada alerta al bucle de detección,
+además de las métricas del escritor (profundidad de cola, latencia de escritura).
+Usa una base de datos y un directorio temporales.
+
+Uso:
+    python benchmarks/bench_incidents.py [--alerts 200] [--burst 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from camera import SyntheticCamera
+from incident_writer import IncidentWriter
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=200)
+    parser.add_argument('--burst', type=int, default=20, help='alertas consecutivas por ráfaga')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='safeguard_bench_')
+    database.DB_PATH = os.path.join(tmp, 'bench.db')
+    database.init_db()
+    _, frame = SyntheticCamera().read()
+
+    # Guardado en línea (comportamiento anterior)
+    inline = []
+    for i in range(args.alerts):
+        start = time.perf_counter()
+        path = os.path.join(tmp, f'inline_{i}.jpg')
+        if cv2.imwrite(path, frame):
+            database.log_incident("SIN CASCO", path, "bench")
+        inline.append((time.perf_counter() - start) * 1000)
+
+    # Escritor asíncrono, con ráfagas
+    writer = IncidentWriter(save_dir=os.path.join(tmp, 'captures'))
+    submit = []
+    max_depth = 0
+    for i in range(args.alerts):
+        start = time.perf_counter()
+        writer.submit(frame, "SIN CASCO", "bench")
+        submit.append((time.perf_counter() - start) * 1000)
+        max_depth = max(max_depth, writer.get_stats()['queue_depth'])
+        if (i + 1) % args.burst == 0:
+            time.sleep(0.05)
+    writer.flush(timeout=30)
+    stats = writer.get_stats()
+
+    print(f"\n{'modo':>10} | {'p50 ms':>8} | {'p95 ms':>8} | {'máx ms':>8}   (tiempo bloqueado en el bucle por alerta)")
+    for name, values in (('en línea', inline), ('asíncrono', submit)):
+        print(f"{name:>10} | {percentile(values, 50):>8.3f} | {percentile(values, 95):>8.3f} | {max(values):>8.3f}")
+    print(f"\nEscritor: {stats['written']} registrados, {stats['images_written']} imágenes, "
+          f"{stats['images_dropped']} sin imagen, {stats['dropped']} descartados")
+    print(f"Profundidad máxima de cola: {max_depth}, lote promedio ~{stats['last_batch_size']}, "
+          f"latencia de escritura por lote: prom {stats['avg_write_ms']} ms / máx {stats['max_write_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
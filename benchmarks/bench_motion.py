@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la compuerta de movimiento (motion.MotionGate) con SyntheticCamera.
+
+Alterna segmentos de escena estática (el mismo cuadro repetido) y de escena en movimiento,
+y compara un detector sin compuerta con uno con compuerta. El modelo YOLO se reemplaza por
+un detector simulado con latencia fija para que el benchmark funcione en cualquier CPU.
+
+Reporta: llamadas de inferencia ahorradas, costo de la compuerta por cuadro y la latencia de
+detección añadida (cuadros entre el inicio de un movimiento y la siguiente inferencia).
+
+Uso:
+    python benchmarks/bench_motion.py [--frames 1200] [--static 90] [--moving 30] [--latency 0.01]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera import SyntheticCamera
+from detector import ObjectDetector
+from motion import MotionGate
+
+
+class StubDetector(ObjectDetector):
+    """
+    ObjectDetector con un modelo simulado: latencia fija y una persona fija en la escena.
+    """
+    def __init__(self, latency, **kwargs):
+        self.latency = latency
+        super().__init__(**kwargs)
+
+    def _load_model(self, model_path):
+        return None
+
+    def _infer_batch(self, frames):
+        time.sleep(self.latency)
+        return [[[280, 160, 360, 400]] for _ in frames]
+
+    def save_alert(self, frame, incident_type, details=None, clip_path=None):
+        pass
+
+
+class SimClock:
+    def __init__(self, fps):
+        self.t = 0.0
+        self.dt = 1.0 / fps
+
+    def __call__(self):
+        return self.t
+
+
+def run(detector, frames, clock):
+    """
+    Procesa la secuencia de cuadros y devuelve (segundos totales, cuadros de retraso por inicio de movimiento).
+    """
+    delays = []
+    waiting_since = None
+    start = time.perf_counter()
+    for i, (frame, motion_onset) in enumerate(frames):
+        calls_before = detector.inference_calls
+        detector.detect(frame)
+        if motion_onset:
+            waiting_since = i
+        if waiting_since is not None and detector.inference_calls > calls_before:
+            delays.append(i - waiting_since)
+            waiting_since = None
+        clock.t += clock.dt
+    return time.perf_counter() - start, delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=1200)
+    parser.add_argument('--static', type=int, default=90, help='cuadros por segmento estático')
+    parser.add_argument('--moving', type=int, default=30, help='cuadros por segmento en movimiento')
+    parser.add_argument('--latency', type=float, default=0.01, help='latencia simulada del modelo (s)')
+    parser.add_argument('--fps', type=float, default=30.0)
+    args = parser.parse_args()
+
+    cam = SyntheticCamera()
+    frames = []
+    held = None
+    for i in range(args.frames):
+        in_static = (i % (args.static + args.moving)) < args.static
+        if in_static and held is not None:
+            frames.append((held, False))
+            continue
+        _, frame = cam.read()
+        frames.append((frame, not in_static and (i % (args.static + args.moving)) == args.static))
+        held = frame if in_static else None
+
+    results = {}
+    for name, use_gate in (('sin compuerta', False), ('con compuerta', True)):
+        clock = SimClock(args.fps)
+        gate = MotionGate(clock=clock) if use_gate else None
+        detector = StubDetector(args.latency, motion_gate=gate)
+        elapsed, delays = run(detector, frames, clock)
+        stats = detector.get_stats()
+        results[name] = (elapsed, stats, delays)
+
+    base_calls = results['sin compuerta'][1]['inference_calls']
+    print(f"\nCuadros: {args.frames}  (estático {args.static} / movimiento {args.moving}, latencia modelo {args.latency * 1000:.0f} ms)")
+    print(f"{'modo':>14} | {'inferencias':>11} | {'omitidas':>8} | {'ms/cuadro':>9} | {'retraso máx (cuadros)':>21}")
+    for name, (elapsed, stats, delays) in results.items():
+        print(f"{name:>14} | {stats['inference_calls']:>11} | {stats['skip_ratio'] * 100:>7.1f}% | "
+              f"{elapsed / args.frames * 1000:>9.2f} | {max(delays) if delays else 0:>21}")
+
+    gate_calls = results['con compuerta'][1]['inference_calls']
+    print(f"\nInferencias ahorradas: {base_calls - gate_calls} ({(1 - gate_calls / base_calls) * 100:.1f}%)")
+
+    # Costo aislado de la compuerta
+    gate = MotionGate()
+    start = time.perf_counter()
+    for frame, _ in frames:
+        gate.should_infer(frame)
+    print(f"Costo de la compuerta: {(time.perf_counter() - start) / len(frames) * 1000:.3f} ms/cuadro")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark del clasificador de EPP: heurística original por persona (cv2.inRange)
+frente al clasificador vectorizado con tabla HSV precalculada (ppe.PPEClassifier).
+
+Verifica además que ambas implementaciones producen exactamente las mismas proporciones.
+
+Uso:
+    python benchmarks/bench_ppe.py [--persons 1 5 10 20] [--frames 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera import SyntheticCamera
+from ppe import PPEClassifier, reference_ratios
+
+
+def make_boxes(rng, n, width, height):
+    boxes = []
+    for _ in range(n):
+        w = int(rng.integers(40, 160))
+        h = int(rng.integers(120, 360))
+        x1 = int(rng.integers(0, width - w))
+        y1 = int(rng.integers(0, height - h))
+        boxes.append([x1, y1, x1 + w, y1 + h])
+    return np.array(boxes, dtype=np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--persons', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cam = SyntheticCamera()
+    # Cuadros sintéticos con ruido para que los rangos de color se ejerciten
+    frames = []
+    for _ in range(16):
+        _, frame = cam.read()
+        noise = rng.integers(0, 256, frame.shape, dtype=np.uint8)
+        frames.append(np.where(rng.random(frame.shape[:2])[..., None] < 0.5, frame, noise).astype(np.uint8))
+
+    start = time.perf_counter()
+    classifier = PPEClassifier()
+    print(f"Construcción de la tabla HSV: {(time.perf_counter() - start) * 1000:.1f} ms (una vez por proceso)")
+    print(f"{'personas':>8} | {'original µs/persona':>20} | {'vectorizado µs/persona':>22} | {'aceleración':>11}")
+
+    for n in args.persons:
+        batches = [(frames[i % len(frames)], make_boxes(rng, n, 640, 480)) for i in range(args.frames)]
+
+        # Verificación de resultados idénticos
+        for frame, boxes in batches[:20]:
+            helmet, vest = classifier.ratios(frame, boxes)
+            for i, (x1, y1, x2, y2) in enumerate(boxes):
+                ref = reference_ratios(frame, x1, y1, x2, y2)
+                if ref != (helmet[i], vest[i]):
+                    print(f"❌ Diferencia en caja {boxes[i]}: original={ref}, vectorizado={(helmet[i], vest[i])}")
+                    sys.exit(1)
+
+        start = time.perf_counter()
+        for frame, boxes in batches:
+            for x1, y1, x2, y2 in boxes:
+                reference_ratios(frame, x1, y1, x2, y2)
+        t_ref = (time.perf_counter() - start) / (args.frames * n) * 1e6
+
+        start = time.perf_counter()
+        for frame, boxes in batches:
+            classifier.classify(frame, boxes)
+        t_vec = (time.perf_counter() - start) / (args.frames * n) * 1e6
+
+        print(f"{n:>8} | {t_ref:>20.1f} | {t_vec:>22.1f} | {t_ref / t_vec:>10.2f}x")
+
+    print("✅ Resultados idénticos a la heurística original.")
+
+
+if __name__ == '__main__':
+    main()
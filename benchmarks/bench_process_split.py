@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Benchmark del modo en procesos separados (process_pipeline.ProcessPipeline) frente al
+pipeline en un hilo del mismo proceso que el servidor web (pipeline.DetectionPipeline).
+
+Cada escenario usa una cámara sintética y un detector simulado (latencia fija del modelo;
+EPP, dibujo y JPEG son los reales). Un espectador consume el MJPEG en el proceso principal
+mientras, opcionalmente, otro proceso genera carga HTTP contra un servidor Flask con hilos
+que corre en el mismo proceso que el espectador (como app.py).
+
+Reporta: FPS entregados al espectador, latencia captura -> JPEG disponible (p50/p95/máx)
+y peticiones HTTP atendidas por segundo.
+
+Uso:
+    python benchmarks/bench_process_split.py [--seconds 5] [--latency 0.015] [--clients 8]
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from camera import VideoCamera
+from detector import ObjectDetector
+from pipeline import DetectionPipeline
+from process_pipeline import ProcessPipeline
+
+
+class StubDetector(ObjectDetector):
+    """
+    ObjectDetector con un modelo simulado: latencia fija (libera el GIL, como la GPU) y una persona fija.
+    """
+    def __init__(self, latency, **kwargs):
+        self.latency = latency
+        super().__init__(**kwargs)
+
+    def _load_model(self, model_path):
+        return None
+
+    def _infer_batch(self, frames):
+        time.sleep(self.latency)
+        return [[[280, 160, 360, 400]] for _ in frames]
+
+    def save_alert(self, frame, incident_type, details=None, clip_path=None):
+        pass
+
+
+def stub_detector(event_queue, latency=0.015):
+    return StubDetector(latency)
+
+
+# Servidor web de carga: una respuesta JSON armada en Python puro, como /api/incidents
+def build_load_app():
+    app = Flask(__name__)
+
+    @app.route('/load')
+    def load():
+        rows = [{'id': i, 'timestamp': f"2026-01-01T00:00:{i % 60:02d}", 'type': 'SIN CASCO',
+                 'image_path': None, 'details': f"Violación detectada (persona #{i})"} for i in range(500)]
+        return json.dumps({'incidents': rows})
+
+    return app
+
+
+def http_load(url, clients, stop_event, counter):
+    """
+    Proceso generador de carga: 'clients' hilos pidiendo la URL sin pausa.
+    """
+    def worker():
+        while not stop_event.is_set():
+            try:
+                with urllib.request.urlopen(url, timeout=5) as r:
+                    r.read()
+                with counter.get_lock():
+                    counter.value += 1
+            except Exception:
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    stop_event.wait()
+
+
+def measure(pipeline, seconds, warmup=1.0):
+    """
+    Consume el MJPEG de la cámara principal y devuelve (fps, latencias ms).
+    """
+    channel = pipeline.get_channel()
+    latencies = []
+    original = channel.record_latency
+
+    def record_latency(frame_time):
+        original(frame_time)
+        if frame_time is not None and measuring.is_set():
+            latencies.append(channel.last_latency_ms)
+
+    channel.record_latency = record_latency
+    measuring = threading.Event()
+    frames = [0]
+    done = threading.Event()
+
+    def viewer():
+        stream = channel.hub.stream()
+        for _ in stream:
+            if measuring.is_set():
+                frames[0] += 1
+            if done.is_set():
+                break
+        stream.close()
+
+    t = threading.Thread(target=viewer, daemon=True)
+    t.start()
+    time.sleep(warmup)
+    measuring.set()
+    start = time.perf_counter()
+    time.sleep(seconds)
+    measuring.clear()
+    elapsed = time.perf_counter() - start
+    done.set()
+    t.join(timeout=2.0)
+    return frames[0] / elapsed, latencies
+
+
+def run_scenario(mode, loaded, args, url):
+    if mode == 'hilo':
+        camera = VideoCamera(sources=['synthetic'])
+        pipeline = DetectionPipeline(camera, StubDetector(args.latency)).start()
+    else:
+        camera = None
+        pipeline = ProcessPipeline([{'id': 'cam0', 'name': 'bench', 'source': 'synthetic'}],
+                                   detector_factory=stub_detector,
+                                   detector_options={'latency': args.latency}).start()
+
+    stop_load = mp.Event()
+    counter = mp.Value('i', 0)
+    load_proc = None
+    if loaded:
+        load_proc = mp.Process(target=http_load, args=(url, args.clients, stop_load, counter), daemon=True)
+        load_proc.start()
+
+    try:
+        fps, latencies = measure(pipeline, args.seconds)
+    finally:
+        stop_load.set()
+        if load_proc is not None:
+            load_proc.join(timeout=5)
+        pipeline.stop()
+        if camera is not None:
+            camera.stop()
+    return fps, latencies, counter.value / args.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--latency', type=float, default=0.015, help='latencia simulada del modelo (s)')
+    parser.add_argument('--clients', type=int, default=8, help='clientes HTTP concurrentes')
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, build_load_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/load"
+
+    print(f"Duración {args.seconds:.0f} s por escenario, modelo {args.latency * 1000:.0f} ms, "
+          f"{args.clients} clientes HTTP, {os.cpu_count()} CPU")
+    print(f"{'modo':>9} | {'carga HTTP':>10} | {'FPS':>6} | {'p50 ms':>7} | {'p95 ms':>7} | {'máx ms':>7} | {'HTTP req/s':>10}")
+    for mode in ('hilo', 'procesos'):
+        for loaded in (False, True):
+            fps, latencies, rps = run_scenario(mode, loaded, args, url)
+            p50, p95 = (np.percentile(latencies, [50, 95]) if latencies else (0.0, 0.0))
+            worst = max(latencies) if latencies else 0.0
+            print(f"{mode:>9} | {'sí' if loaded else 'no':>10} | {fps:>6.1f} | {p50:>7.1f} | {p95:>7.1f} | "
+                  f"{worst:>7.1f} | {rps:>10.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks reproducible: corre en una CPU común, sin GPU ni modelo real.
+
+Usa una cámara sintética determinista (SyntheticCamera con semilla y número/tamaño de
+personas configurables) y un modelo simulado que devuelve las cajas reales de la escena
+(o un .onnx con --model) para medir cada etapa por separado:
+
+  capture     SyntheticCamera.read()
+  inference   backend.infer() (modelo simulado, con --model-ms de latencia, o --model)
+  check_ppe   PPEClassifier.classify() sobre las personas del cuadro
+  analyze     ObjectDetector.analyze_batch() (rastreo, EPP, zonas, alertas)
+  draw        ObjectDetector.render()
+  jpeg        StreamProfile.encode() (perfil 'high')
+  fanout      FrameHub: publicación -> cuadro entregado a todos los espectadores (--viewers)
+  incident    IncidentWriter: submit -> imagen y fila en SQLite escritas
+  api_stats   GET /api/stats (cliente de prueba de Flask sobre app.py)
+
+Reporta p50/p95/p99 (ms), operaciones por segundo y memoria residente por etapa. Con
+--output guarda el resultado en JSON; con --baseline lo compara con una ejecución guardada
+(--save-baseline) y termina con código 1 si el p50 o el p95 de alguna etapa empeoró más que
+--tolerance. Base de datos, capturas y configuración de cámaras son temporales.
+
+Uso:
+    python benchmarks/bench_suite.py [--frames 200] [--persons 4] [--person-size 1.0] [--seed 0]
+        [--stages capture jpeg ...] [--output resultado.json]
+        [--save-baseline benchmarks/baseline.json | --baseline benchmarks/baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import detector as detector_module
+from backends import InferenceBackend, create_backend
+from camera import SyntheticCamera
+from detector import ObjectDetector
+from incident_writer import IncidentWriter
+from pipeline import STREAM_PROFILES, FrameHub, StreamProfile
+
+STAGES = ('capture', 'inference', 'check_ppe', 'analyze', 'draw', 'jpeg', 'fanout', 'incident', 'api_stats')
+
+
+class SceneBackend(InferenceBackend):
+    """
+    Modelo simulado: devuelve las cajas reales de los cuadros de la cámara sintética
+    (registradas por cuadro) tras una latencia fija opcional.
+    """
+    name = 'stub'
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.scene = {}
+
+    def infer(self, frames):
+        if self.latency:
+            time.sleep(self.latency)
+        return [list(self.scene.get(id(frame), [])) for frame in frames]
+
+
+class SuiteDetector(ObjectDetector):
+    """
+    ObjectDetector con un backend ya construido (modelo simulado o .onnx).
+    """
+    def __init__(self, backend, **kwargs):
+        self._suite_backend = backend
+        super().__init__(**kwargs)
+
+    def _load_model(self, model_path):
+        return self._suite_backend
+
+
+def rss_mb():
+    """
+    Memoria residente actual del proceso (MB); en sistemas sin /proc, el pico.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fn, items, warmup):
+    """
+    Ejecuta fn(item) sobre los primeros 'warmup' elementos sin medir y luego sobre todos;
+    devuelve las duraciones en ms y los resultados.
+    """
+    for item in items[:warmup]:
+        fn(item)
+    samples, outputs = [], []
+    for item in items:
+        start = time.perf_counter()
+        outputs.append(fn(item))
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, outputs
+
+
+def summarize(samples):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    mean = float(np.mean(samples))
+    return {
+        'samples': len(samples),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(mean, 4),
+        'per_second': round(1000 / mean, 1) if mean else 0.0,
+        'rss_mb': round(rss_mb(), 1)
+    }
+
+
+# Etapas que necesitan hilos o el servidor web
+
+def bench_fanout(jpegs, viewers, timeout=2.0):
+    """
+    Publica cada JPEG en un FrameHub con 'viewers' clientes MJPEG y mide hasta que todos lo recibieron.
+    """
+    hub = FrameHub()
+    cond = threading.Condition()
+    received = [0]
+    stop = threading.Event()
+
+    def viewer():
+        stream = hub.stream()
+        for _ in stream:
+            if stop.is_set():
+                break
+            with cond:
+                received[0] += 1
+                cond.notify_all()
+        stream.close()
+
+    threads = [threading.Thread(target=viewer, daemon=True) for _ in range(viewers)]
+    for t in threads:
+        t.start()
+    while hub.subscribers < viewers:
+        time.sleep(0.001)
+
+    def publish(jpeg):
+        with cond:
+            received[0] = 0
+        hub.publish(jpeg)
+        with cond:
+            cond.wait_for(lambda: received[0] >= viewers, timeout)
+
+    samples, _ = measure(publish, jpegs, warmup=5)
+    stop.set()
+    hub.publish(jpegs[0])
+    for t in threads:
+        t.join(timeout=timeout)
+    return samples
+
+
+def bench_incidents(frames, tmp, count):
+    """
+    Registra 'count' incidentes de a uno y mide desde submit() hasta que el escritor los confirmó.
+    """
+    written = threading.Event()
+    writer = IncidentWriter(save_dir=os.path.join(tmp, 'incidents'), on_written=lambda incidents: written.set())
+
+    def submit(frame):
+        written.clear()
+        writer.submit(frame, "SIN CASCO", "Violación simulada (benchmark)")
+        written.wait(5.0)
+
+    samples, _ = measure(submit, frames[:count], warmup=2)
+    writer.stop()
+    return samples
+
+
+def bench_api_stats(backend, tmp, requests):
+    """
+    Importa app.py con una cámara sintética y el modelo simulado, deja correr el pipeline un
+    momento para tener estadísticas y mide GET /api/stats con el pipeline detenido.
+    """
+    config = os.path.join(tmp, 'cameras.json')
+    with open(config, 'w', encoding='utf-8') as f:
+        json.dump({'cameras': [{'id': 'cam0', 'name': 'BENCH', 'source': 'synthetic'}]}, f)
+    os.environ['SAFEGUARD_CAMERAS'] = config
+    os.environ.pop('SAFEGUARD_PROCESS_SPLIT', None)
+    detector_module.create_backend = lambda *args, **kwargs: backend
+
+    import app as app_module
+    app_module.app.config['LOGIN_DISABLED'] = True
+    client = app_module.app.test_client()
+    time.sleep(0.5)
+    if app_module.pipeline is not None:
+        app_module.pipeline.stop()
+    app_module.camera_registry.stop_all()
+
+    response = client.get('/api/stats')
+    if response.status_code != 200:
+        raise RuntimeError(f"/api/stats respondió {response.status_code}")
+    samples, _ = measure(lambda _: client.get('/api/stats').get_data(), list(range(requests)), warmup=10)
+    return samples
+
+
+# Comparación con la línea base
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    Imprime la comparación por etapa y devuelve la lista de etapas que empeoraron.
+    """
+    regressions = []
+    print(f"\nComparación con la línea base del {baseline['meta'].get('timestamp', '?')} "
+          f"(tolerancia {tolerance * 100:.0f}%)")
+    # La escena (y por lo tanto el trabajo de cada etapa) depende de estos parámetros
+    for key in ('frames', 'persons', 'person_size', 'seed', 'model', 'model_ms', 'viewers', 'threads'):
+        ours, theirs = results['meta']['args'].get(key), baseline['meta'].get('args', {}).get(key)
+        if ours != theirs:
+            print(f"⚠️ Parámetro distinto de la línea base: {key} = {ours} (línea base: {theirs})")
+    print(f"{'etapa':>10} | {'p50 base':>9} | {'p50':>9} | {'Δ p50':>7} | {'p95 base':>9} | {'p95':>9} | {'Δ p95':>7}")
+    for name, stage in results['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            print(f"{name:>10} | (sin línea base)")
+            continue
+        deltas = {}
+        worse = False
+        for key in ('p50_ms', 'p95_ms'):
+            deltas[key] = (stage[key] / base[key] - 1) * 100 if base[key] else 0.0
+            if stage[key] > base[key] * (1 + tolerance) and stage[key] - base[key] > min_delta_ms:
+                worse = True
+        if worse:
+            regressions.append(name)
+        print(f"{name:>10} | {base['p50_ms']:>9.3f} | {stage['p50_ms']:>9.3f} | {deltas['p50_ms']:>+6.1f}% | "
+              f"{base['p95_ms']:>9.3f} | {stage['p95_ms']:>9.3f} | {deltas['p95_ms']:>+6.1f}%"
+              f"{'  ⚠️ REGRESIÓN' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--persons', type=int, default=4)
+    parser.add_argument('--person-size', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', default=None, help='modelo .onnx real (por defecto, modelo simulado)')
+    parser.add_argument('--backend', default='auto', help='backend para --model (ver backends.py)')
+    parser.add_argument('--model-ms', type=float, default=0.0, help='latencia del modelo simulado (ms)')
+    parser.add_argument('--threads', type=int, default=None, help='hilos de inferencia en CPU')
+    parser.add_argument('--viewers', type=int, default=8, help='espectadores MJPEG para fanout')
+    parser.add_argument('--incidents', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help='peticiones a /api/stats')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--output', default=None, help='guardar el resultado en JSON')
+    parser.add_argument('--save-baseline', default=None, help='guardar el resultado como línea base')
+    parser.add_argument('--baseline', default=None, help='comparar con esta línea base')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='empeoramiento admitido (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='diferencia mínima para contar como regresión')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='safeguard_suite_')
+    database.DB_PATH = os.path.join(tmp, 'bench.db')
+    database.init_db()
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+
+    scene_backend = SceneBackend(args.model_ms)
+    backend = (create_backend(args.model, backend=args.backend, threads=args.threads)
+               if args.model else scene_backend)
+    camera = SyntheticCamera(persons=args.persons, person_size=args.person_size, seed=args.seed)
+    detector = SuiteDetector(backend, incident_writer=IncidentWriter(save_dir=os.path.join(tmp, 'captures')))
+
+    stages = {}
+
+    def record(name, samples):
+        # Resumen al terminar la etapa (la memoria residente es la de ese momento)
+        if name in args.stages:
+            stages[name] = summarize(samples)
+
+    # Las etapas forman una cadena (cuadro -> detecciones -> cuadro anotado -> JPEG); todas
+    # se ejecutan para tener sus entradas, pero solo se reportan las pedidas
+    def capture(_):
+        _, frame = camera.read()
+        scene_backend.scene[id(frame)] = list(camera.boxes)
+        return frame, list(camera.boxes)
+
+    samples, captured = measure(capture, list(range(args.frames)), warmup=0)
+    record('capture', samples)
+    frames = [frame for frame, _ in captured]
+
+    samples, _ = measure(lambda frame: backend.infer([frame]), frames, args.warmup)
+    record('inference', samples)
+    samples, _ = measure(lambda item: detector.ppe.classify(item[0], item[1]) if item[1] else None,
+                         captured, args.warmup)
+    record('check_ppe', samples)
+    samples, analyzed = measure(lambda frame: detector.analyze_batch([frame], ['default'])[0][0], frames, args.warmup)
+    record('analyze', samples)
+    samples, annotated = measure(lambda item: detector.render(item[0], item[1]), list(zip(frames, analyzed)), args.warmup)
+    record('draw', samples)
+    profile = StreamProfile('high', **STREAM_PROFILES['high'])
+    samples, _ = measure(profile.encode, annotated, args.warmup)
+    record('jpeg', samples)
+    jpegs = [cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, profile.quality])[1].tobytes()
+             for frame in annotated]
+    detector.incident_writer.stop()
+
+    if 'fanout' in args.stages:
+        record('fanout', bench_fanout(jpegs, args.viewers))
+    if 'incident' in args.stages:
+        record('incident', bench_incidents(annotated, tmp, min(args.incidents, len(annotated))))
+    if 'api_stats' in args.stages:
+        record('api_stats', bench_api_stats(scene_backend, tmp, args.requests))
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'backend': backend.describe(),
+            'args': vars(args)
+        },
+        'stages': stages,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+    print(f"\nCuadros: {args.frames}, personas: {args.persons} (escala {args.person_size}), semilla {args.seed}, "
+          f"backend {results['meta']['backend']['backend']}, {os.cpu_count()} CPU")
+    print(f"{'etapa':>10} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'por s':>8} | {'RSS MB':>7}")
+    for name, stage in results['stages'].items():
+        print(f"{name:>10} | {stage['p50_ms']:>8.3f} | {stage['p95_ms']:>8.3f} | {stage['p99_ms']:>8.3f} | "
+              f"{stage['per_second']:>8.1f} | {stage['rss_mb']:>7.1f}")
+    print(f"Pico de memoria residente: {results['peak_rss_mb']} MB")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            print(f"✅ Resultado guardado en {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"❌ Regresiones: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ Sin regresiones respecto de la línea base")
+
+
+if __name__ == '__main__':
+    main()
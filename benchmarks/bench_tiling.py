@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inferencia por regiones y mosaicos (tiling.InferencePlan) contra el cuadro completo.
+
+Escena: un patio en perspectiva (por defecto 1920x1080) con personas que caminan; las del
+fondo miden unas decenas de píxeles y las del frente varios cientos. El modelo se simula:
+detecta a una persona si, después de reducir la imagen que recibe a imgsz, mide al menos
+--min-pixels de alto y se ve al menos la mitad de su caja (cortada por el borde del recorte
+devuelve solo la parte visible), con la misma NMS que los backends ONNX; su costo es --model-ms por imagen a imgsz=416 y crece con
+imgsz al cuadrado (como en CPU, donde el lote no abarata cada imagen).
+
+Compara el cuadro completo con varios imgsz, un mosaico con el cuadro completo y regiones
+sobre la franja lejana del patio, y reporta la exhaustividad (personas encontradas con
+IoU >= 0.5) de las personas lejanas y cercanas, las cajas sobrantes (duplicados que la
+fusión no unió), las imágenes por cuadro, el tiempo de detección por cuadro y lo que
+agregan los recortes y la fusión fuera del modelo.
+
+Uso:
+    python benchmarks/bench_tiling.py [--frames 60] [--persons 24] [--width 1920 --height 1080]
+        [--model-ms 30] [--min-pixels 16]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import InferenceBackend, nms
+from detector import ObjectDetector
+
+FAR_HEIGHT = 0.12   # Personas más bajas que esta fracción del cuadro cuentan como lejanas
+HORIZON = 0.25      # Fracción del alto donde empieza el patio (más arriba no hay personas)
+
+# (nombre, imgsz, plan de inferencia)
+SCENARIOS = [
+    ('completo 416', 416, None),
+    ('completo 640', 640, None),
+    ('completo 832', 832, None),
+    ('mosaico 2x2', 416, {'tiles': [2, 2], 'overlap': 0.2, 'full_frame': True}),
+    ('3x2 sin completo', 416, {'tiles': [3, 2], 'overlap': 0.2, 'full_frame': False}),
+    ('franja lejana', 416, {'regions': [[0, HORIZON - 0.05, 0.37, 0.6], [0.315, HORIZON - 0.05, 0.685, 0.6],
+                                        [0.63, HORIZON - 0.05, 1, 0.6]], 'full_frame': True}),
+]
+
+
+class YardScene:
+    """
+    Patio en perspectiva: la altura de cada persona crece linealmente desde el horizonte
+    hasta el borde inferior. Deterministico según la semilla.
+    """
+    def __init__(self, persons, width, height, seed=0):
+        self.width, self.height = width, height
+        rng = np.random.default_rng(seed)
+        self.feet = rng.uniform(HORIZON + 0.02, 1.0, persons) * height
+        self.x = rng.uniform(0, width, persons)
+        self.vx = rng.uniform(-6, 6, persons)
+        self.frame_count = 0
+        self.boxes = []
+
+    def read(self):
+        frame = np.full((self.height, self.width, 3), 60, dtype=np.uint8)
+        frame[:int(HORIZON * self.height)] = (140, 110, 90)
+        self.boxes = []
+        for foot, x, vx in zip(self.feet, self.x, self.vx):
+            person_h = self.height * (0.02 + 0.45 * (foot / self.height - HORIZON) / (1 - HORIZON))
+            person_w = person_h * 0.35
+            cx = (x + vx * self.frame_count) % (self.width - person_w) + person_w / 2
+            box = [int(cx - person_w / 2), int(foot - person_h), int(cx + person_w / 2), int(min(foot, self.height))]
+            cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), (0, 165, 255), -1)
+            self.boxes.append(box)
+        self.frame_count += 1
+        return frame
+
+
+class ResolutionBackend(InferenceBackend):
+    """
+    Modelo simulado limitado por resolución (ver la descripción del módulo). Recibe vistas del
+    cuadro; la posición de cada recorte se obtiene de su dirección dentro del cuadro original.
+    """
+    name = 'stub'
+
+    def __init__(self, imgsz, model_ms, min_pixels):
+        self.imgsz = imgsz
+        self.model_seconds = model_ms / 1000
+        self.min_pixels = min_pixels
+        self.scene = {}
+        self.model_time = 0.0
+
+    def infer(self, frames):
+        start = time.perf_counter()
+        batch_boxes, batch_scores = [], []
+        for image in frames:
+            frame = image if image.base is None else image.base
+            offset = image.__array_interface__['data'][0] - frame.__array_interface__['data'][0]
+            oy, ox = offset // frame.strides[0], offset % frame.strides[0] // frame.strides[1]
+            h, w = image.shape[:2]
+            scale = min(self.imgsz / h, self.imgsz / w)
+            boxes, scores = [], []
+            for x1, y1, x2, y2 in self.scene.get(id(frame), []):
+                vx1, vy1, vx2, vy2 = max(x1, ox), max(y1, oy), min(x2, ox + w), min(y2, oy + h)
+                if vx2 <= vx1 or vy2 <= vy1:
+                    continue
+                visible = (vx2 - vx1) * (vy2 - vy1) / ((x2 - x1) * (y2 - y1))
+                if visible >= 0.5 and (vy2 - vy1) * scale >= self.min_pixels:
+                    boxes.append([vx1 - ox, vy1 - oy, vx2 - ox, vy2 - oy])
+                    scores.append(0.9 * visible)
+            # NMS del modelo, como los backends reales (personas que se tapan mucho se pierden en todos los modos)
+            kept = nms(np.array(boxes, dtype=np.float64).reshape(-1, 4), np.array(scores)) if boxes else []
+            batch_boxes.append([boxes[k] for k in kept])
+            batch_scores.append([scores[k] for k in kept])
+        # Costo del modelo: proporcional al área de entrada de cada imagen
+        cost = self.model_seconds * len(frames) * (self.imgsz / 416) ** 2
+        time.sleep(max(cost - (time.perf_counter() - start), 0.0))
+        self.model_time += time.perf_counter() - start
+        self.last_scores = batch_scores
+        return batch_boxes
+
+
+class TilingDetector(ObjectDetector):
+    def __init__(self, backend, **kwargs):
+        self._tiling_backend = backend
+        super().__init__(imgsz=backend.imgsz, warmup=False, **kwargs)
+
+    def _load_model(self, model_path):
+        return self._tiling_backend
+
+    def save_alert(self, frame, incident_type, details=None, clip_path=None):
+        pass
+
+
+def match(found, truth):
+    """
+    Empareja voraz por IoU >= 0.5; devuelve (máscara de personas reales encontradas, cajas sobrantes).
+    """
+    hit = np.zeros(len(truth), dtype=bool)
+    extra = 0
+    for box in found:
+        best, best_iou = None, 0.5
+        for k, gt in enumerate(truth):
+            if hit[k]:
+                continue
+            iw = min(box[2], gt[2]) - max(box[0], gt[0])
+            ih = min(box[3], gt[3]) - max(box[1], gt[1])
+            if iw <= 0 or ih <= 0:
+                continue
+            inter = iw * ih
+            iou = inter / ((box[2] - box[0]) * (box[3] - box[1]) + (gt[2] - gt[0]) * (gt[3] - gt[1]) - inter)
+            if iou >= best_iou:
+                best, best_iou = k, iou
+        if best is None:
+            extra += 1
+        else:
+            hit[best] = True
+    return hit, extra
+
+
+def run(args, imgsz, plan):
+    backend = ResolutionBackend(imgsz, args.model_ms, args.min_pixels)
+    detector = TilingDetector(backend)
+    detector.set_inference_plan('yard', plan)
+    scene = YardScene(args.persons, args.width, args.height, args.seed)
+    far_hits = far_total = near_hits = near_total = extra = 0
+    elapsed = 0.0
+    for _ in range(args.frames):
+        frame = scene.read()
+        backend.scene = {id(frame): scene.boxes}
+        start = time.perf_counter()
+        detector.analyze_batch([frame], ['yard'])
+        elapsed += time.perf_counter() - start
+        hit, unmatched = match(detector.get_stream('yard').last_person_boxes, scene.boxes)
+        far = np.array([(b[3] - b[1]) < FAR_HEIGHT * args.height for b in scene.boxes])
+        far_hits += int(hit[far].sum())
+        far_total += int(far.sum())
+        near_hits += int(hit[~far].sum())
+        near_total += int((~far).sum())
+        extra += unmatched
+    crops = detector.get_stats()['avg_crops_per_frame']
+    # Sobrecosto: análisis completo (recortes, fusión, rastreo, EPP) menos el modelo simulado
+    return {
+        'far': far_hits / far_total if far_total else 1.0,
+        'near': near_hits / near_total if near_total else 1.0,
+        'extra': extra / args.frames,
+        'images': crops,
+        'ms': elapsed / args.frames * 1000,
+        'model_ms': backend.model_time / args.frames * 1000,
+        'overhead_ms': (elapsed - backend.model_time) / args.frames * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--persons', type=int, default=24)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model-ms', type=float, default=30.0, help='costo simulado por imagen a imgsz=416 (ms)')
+    parser.add_argument('--min-pixels', type=float, default=16.0,
+                        help='alto mínimo (px, en la entrada del modelo) de una persona detectable')
+    args = parser.parse_args()
+
+    print(f"{'escenario':>16} | {'imgsz':>5} | {'imág/c':>6} | {'lejanas':>7} | {'cercanas':>8} | "
+          f"{'sobran/c':>8} | {'ms/c':>7} | {'modelo':>7} | {'resto':>6}")
+    for name, imgsz, plan in SCENARIOS:
+        r = run(args, imgsz, plan)
+        print(f"{name:>16} | {imgsz:>5} | {r['images']:>6.1f} | {r['far'] * 100:>6.1f}% | {r['near'] * 100:>7.1f}% | "
+              f"{r['extra']:>8.2f} | {r['ms']:>7.1f} | {r['model_ms']:>7.1f} | {r['overhead_ms']:>6.2f}")
+    print(f"\nCuadro {args.width}x{args.height}, {args.persons} personas, {args.frames} cuadros; modelo simulado: "
+          f"{args.model_ms:.0f} ms por imagen a 416, mínimo {args.min_pixels:.0f} px de alto")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,19 +2,59 @@ import cv2
 import time
 import numpy as np
 import threading
+from metrics import FRAMES_CAPTURED, FRAMES_DROPPED, STAGE_SECONDS
+
+_CAPTURE_SECONDS = STAGE_SECONDS.labels(stage='capture')
+_PIPELINE_DROPS = FRAMES_DROPPED.labels(reason='pipeline')
 
 # Clase de Cámara Sintética (Simulada)
 # Se utiliza cuando no se encuentra una cámara física disponible.
+# Sin argumentos muestra una persona fija que alterna casco y chaleco. Con 'persons' genera
+# una escena determinista (misma semilla = mismos cuadros) con ese número de personas en
+# movimiento, útil para benchmarks; 'boxes' contiene las cajas reales del último cuadro.
 class SyntheticCamera:
-    def __init__(self):
-        self.width = 640
-        self.height = 480
+    def __init__(self, persons=None, person_size=1.0, seed=0, width=640, height=480):
+        """
+        persons: número de personas simuladas (None = la escena de demostración).
+        person_size: escala de las personas (1.0 = 80x240 px).
+        seed: semilla de posiciones, velocidades y fases de casco/chaleco.
+        """
+        self.width = width
+        self.height = height
         self.frame_count = 0
+        self.boxes = []
+        if persons is None:
+            self.people = [{'x': 320.0, 'y': 200, 'vx': 0.0, 'phase': 0, 'size': 1.0}]
+        else:
+            rng = np.random.default_rng(seed)
+            half_w, head = 40 * person_size, 40 * person_size
+            self.people = [{
+                'x': float(rng.uniform(half_w, max(half_w, width - half_w))),
+                'y': int(rng.uniform(head, max(head, height - 200 * person_size))),
+                'vx': float(rng.uniform(-2.0, 2.0)),
+                'phase': int(rng.integers(0, 120)),
+                'size': person_size
+            } for _ in range(persons)]
         print("Inicializando Cámara Sintética (Modo Simulación)...")
 
-    def read(self):
-        # Crear un cuadro vacío (negro)
-        frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+    def _person_x(self, person):
+        # Movimiento horizontal con rebote en los bordes del cuadro
+        low = 40 * person['size']
+        span = max(self.width - 2 * low, 1.0)
+        offset = (person['x'] - low + person['vx'] * self.frame_count) % (2 * span)
+        return int(low + (offset if offset <= span else 2 * span - offset))
+
+    def read(self, image=None):
+        """
+        Genera el siguiente cuadro. Como cv2.VideoCapture.read, dibuja en 'image' si tiene el
+        tamaño del cuadro (sin asignar memoria) y si no crea un arreglo nuevo.
+        """
+        # Cuadro vacío (negro)
+        if image is not None and image.shape == (self.height, self.width, 3) and image.dtype == np.uint8:
+            frame = image
+            frame.fill(0)
+        else:
+            frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
         
         self.frame_count += 1
         # Lógica para animar un círculo amarillo moviéndose
@@ -24,12 +64,18 @@ class SyntheticCamera:
         cv2.circle(frame, (x, y), 20, (0, 255, 255), -1)
         cv2.putText(frame, "MODO SIMULACION", (100, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         
-        # Simular una "persona" con cambios de equipo EPP
-        head_color = (255, 255, 255) if (self.frame_count // 30) % 2 == 0 else (50, 50, 50) 
-        cv2.circle(frame, (320, 200), 40, head_color, -1)
-        
-        body_color = (0, 165, 255) if (self.frame_count // 60) % 2 == 0 else (100, 100, 100) 
-        cv2.rectangle(frame, (280, 240), (360, 400), body_color, -1)
+        # Simular "personas" con cambios de equipo EPP (cabeza = casco, cuerpo = chaleco)
+        self.boxes = []
+        for person in self.people:
+            s = person['size']
+            px, py = self._person_x(person), person['y']
+            t = self.frame_count + person['phase']
+            head_color = (255, 255, 255) if (t // 30) % 2 == 0 else (50, 50, 50) 
+            cv2.circle(frame, (px, py), int(40 * s), head_color, -1)
+            
+            body_color = (0, 165, 255) if (t // 60) % 2 == 0 else (100, 100, 100) 
+            cv2.rectangle(frame, (px - int(40 * s), py + int(40 * s)), (px + int(40 * s), py + int(200 * s)), body_color, -1)
+            self.boxes.append([px - int(40 * s), py - int(40 * s), px + int(40 * s), py + int(200 * s)])
         
         cv2.putText(frame, "¡Apunta la camara a una persona para probar!", (50, 450), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
@@ -41,12 +87,43 @@ class SyntheticCamera:
 # Clase Principal de Cámara de Video con Hilos (Threading)
 # Esta clase gestiona la captura de video en un hilo separado para no bloquear el procesamiento de la IA.
 class VideoCamera:
-    def __init__(self, source=0):
+    def __init__(self, source=0, sources=None, loop=True, buffers=3):
+        """
+        source: se conserva por compatibilidad; sin 'sources' se prueban automáticamente
+            la cámara CSI de la Jetson y las cámaras USB.
+        sources: lista explícita de fuentes a probar en orden. Cada fuente puede ser un índice
+            V4L2 (int), un pipeline de GStreamer (texto con '!'), la ruta de un archivo de
+            video o 'synthetic'. Si ninguna abre, se usa la Cámara Sintética.
+        loop: reiniciar los archivos de video al llegar al final.
+        buffers: cuadros preasignados en los que se captura por turnos (mínimo 3; 0 = un arreglo
+            nuevo por lectura). Ver wait_for_frame para la validez de cada cuadro.
+        """
         self.video = None
         self.stopped = False
         self.frame = None
         self.grabbed = False
         self.using_synthetic = False
+        self.is_file = False
+        self.loop = loop
+        self.file_fps = None
+        
+        # Secuencia de cuadros: identificador creciente, marca de tiempo de captura y
+        # variable de condición para que los consumidores esperen solo cuadros nuevos.
+        self.frame_id = 0
+        self.frame_time = None
+        self._frame_cond = threading.Condition()
+        self._consumed_id = 0
+        self.frames_captured = 0
+        self.frames_consumed = 0
+        self.frames_dropped = 0
+        # Eventos (threading.Event) que se activan con cada cuadro nuevo (planificador multicámara)
+        self._listeners = []
+        # Búferes de captura: se reutiliza uno que no sea el último publicado ni el entregado
+        # al consumidor (se crean con el primer cuadro de cada ranura y si cambia el tamaño)
+        self._pool = [None] * (max(buffers, 3) if buffers else 0)
+        self._pool_next = 0
+        self._frame_slot = None
+        self._leased_slot = None
         
         # Configuración del pipeline de GStreamer para Jetson Orin Nano (CSI)
         jetson_csi_pipeline = (
@@ -59,9 +136,11 @@ class VideoCamera:
         )
         
         # Fuentes para intentar abrir (CSI, USB Video1, USB Video2, Video0)
-        sources_to_try = [jetson_csi_pipeline, 1, 2, 0]
+        sources_to_try = sources if sources is not None else [jetson_csi_pipeline, 1, 2, 0]
         
         for idx in sources_to_try:
+            if idx == 'synthetic':
+                break
             print(f"Intentando abrir fuente: {idx}")
             try:
                 if isinstance(idx, int):
@@ -69,8 +148,14 @@ class VideoCamera:
                     if not os.path.exists(f"/dev/video{idx}"):
                          continue
                 
-                # Usar GStreamer para el pipeline de Jetson, V4L2 para cámaras USB
-                backend = cv2.CAP_GSTREAMER if isinstance(idx, str) else cv2.CAP_V4L2
+                # Usar GStreamer para pipelines, V4L2 para cámaras USB y el backend por defecto para archivos
+                is_pipeline = isinstance(idx, str) and '!' in idx
+                if isinstance(idx, int):
+                    backend = cv2.CAP_V4L2
+                elif is_pipeline:
+                    backend = cv2.CAP_GSTREAMER
+                else:
+                    backend = cv2.CAP_ANY
                 cap = cv2.VideoCapture(idx, backend)
                 
                 if cap.isOpened():
@@ -81,26 +166,41 @@ class VideoCamera:
                         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
                         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
                         cap.set(cv2.CAP_PROP_FPS, 60) 
+                        time.sleep(1) # Esperar a que la cámara se estabilice
+                    elif is_pipeline:
+                        time.sleep(1) # Esperar a que la cámara se estabilice
+                    else:
+                        # Archivo de video: reproducir a su velocidad nominal
+                        self.is_file = True
+                        self.file_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
 
-                    time.sleep(1) # Esperar a que la cámara se estabilice
                     ret, frame = cap.read()
                     if ret:
                         print(f"✅ Cámara abierta EXITOSAMENTE: {idx}")
                         self.video = cap
                         break
                     else:
+                        self.is_file = False
                         cap.release()
             except Exception as e:
                 print(f"‼️ Excepción al abrir {idx}: {e}")
 
         if self.video is None:
-            print("Error: No se encontró ninguna cámara. Cambiando a Cámara Sintética.")
+            if 'synthetic' not in sources_to_try:
+                print("Error: No se encontró ninguna cámara. Cambiando a Cámara Sintética.")
             self.video = SyntheticCamera()
             self.using_synthetic = True
         
         # Iniciar hilo de lectura continua
         threading.Thread(target=self.update, args=(), daemon=True).start()
 
+    def add_listener(self, event):
+        """
+        Registra un threading.Event que se activará con cada cuadro nuevo.
+        """
+        with self._frame_cond:
+            self._listeners.append(event)
+
     def update(self):
         """
         Bucle infinito que captura cuadros de la cámara en segundo plano.
@@ -109,20 +209,97 @@ class VideoCamera:
             if self.stopped:
                 return
             
-            self.grabbed, self.frame = self.video.read()
-            if not self.grabbed and not self.using_synthetic:
+            slot = self._free_slot()
+            buffer = self._pool[slot] if slot is not None else None
+            start = time.perf_counter()
+            grabbed, frame = self.video.read(buffer)
+            _CAPTURE_SECONDS.observe(time.perf_counter() - start)
+            if not grabbed and self.is_file and self.loop:
+                # Fin del archivo: volver al inicio
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                grabbed, frame = self.video.read(buffer)
+            if slot is not None and grabbed:
+                # Si el tamaño cambió, la lectura asignó un arreglo nuevo: queda como búfer de la ranura
+                self._pool[slot] = frame
+            if not grabbed and not self.using_synthetic:
+                self.grabbed = False
                 self.stop()
+                return
+            
+            with self._frame_cond:
+                # Si el cuadro anterior nunca fue consumido, cuenta como descartado
+                if self.frames_consumed > 0 and self._consumed_id < self.frame_id:
+                    self.frames_dropped += 1
+                    _PIPELINE_DROPS.inc()
+                self.grabbed, self.frame = grabbed, frame
+                self._frame_slot = slot
+                self.frame_id += 1
+                self.frame_time = time.time()
+                self.frames_captured += 1
+                self._frame_cond.notify_all()
+                listeners = list(self._listeners)
+            FRAMES_CAPTURED.inc()
+            for event in listeners:
+                event.set()
             
             # Pequeña pausa para no saturar la CPU en modo sintético
             if self.using_synthetic:
                 time.sleep(0.016) # Aproximadamente 60 FPS
+            elif self.is_file:
+                time.sleep(1.0 / self.file_fps)
+
+    def _free_slot(self):
+        """
+        Ranura de captura que nadie está usando (None si no hay búferes).
+        """
+        if not self._pool:
+            return None
+        with self._frame_cond:
+            busy = (self._frame_slot, self._leased_slot)
+        for k in range(len(self._pool)):
+            slot = (self._pool_next + k) % len(self._pool)
+            if slot not in busy:
+                self._pool_next = (slot + 1) % len(self._pool)
+                return slot
 
     def get_frame(self):
         """
-        Devuelve el último cuadro capturado por el hilo de actualización.
+        Devuelve el último cuadro capturado por el hilo de actualización. Con búferes
+        reutilizables el arreglo puede sobrescribirse unos cuadros después: copiarlo si se guarda.
         """
         return self.frame
 
+    def wait_for_frame(self, after_id=0, timeout=1.0):
+        """
+        Bloquea hasta que exista un cuadro con identificador mayor que 'after_id'.
+        Devuelve (frame_id, frame, frame_time) o (after_id, None, None) si se agotó el tiempo.
+        El búfer del cuadro devuelto no se reutiliza hasta la siguiente llamada que devuelva un
+        cuadro (un consumidor por cámara, como el pipeline); para conservarlo más tiempo, copiarlo.
+        """
+        with self._frame_cond:
+            if not self._frame_cond.wait_for(lambda: self.frame_id > after_id or self.stopped, timeout):
+                return after_id, None, None
+            if self.frame_id <= after_id:
+                return after_id, None, None
+            if self._consumed_id < self.frame_id:
+                self.frames_consumed += 1
+                self._consumed_id = self.frame_id
+            self._leased_slot = self._frame_slot
+            return self.frame_id, self.frame, self.frame_time
+
+    def get_stats(self):
+        """
+        Contadores de cuadros capturados, consumidos y descartados.
+        """
+        with self._frame_cond:
+            return {
+                'frame_id': self.frame_id,
+                'captured': self.frames_captured,
+                'consumed': self.frames_consumed,
+                'dropped': self.frames_dropped,
+                'synthetic': self.using_synthetic
+            }
+
     def get_jpeg_frame(self):
         """
         Devuelve el último cuadro codificado en JPEG.
@@ -138,6 +315,8 @@ class VideoCamera:
         Detiene la captura y libera la cámara.
         """
         self.stopped = True
+        with self._frame_cond:
+            self._frame_cond.notify_all()
         if hasattr(self.video, 'release'):
             self.video.release()
 
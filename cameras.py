@@ -0,0 +1,98 @@
+import json
+import os
+from camera import VideoCamera
+
+# Registro de Cámaras
+# Lista de cámaras definida por configuración (JSON). Cada entrada tiene un identificador,
+# un nombre visible y una fuente: 'auto' (detección automática CSI/USB), un índice V4L2,
+# un pipeline de GStreamer, la ruta de un archivo de video o 'synthetic'; opcionalmente,
+# sus zonas de peligro poligonales ('zones', ver zones.py) y dónde corre el modelo
+# ('inference': regiones de interés o mosaico, ver tiling.py).
+# El archivo se toma de la variable de entorno SAFEGUARD_CAMERAS o de 'cameras.json'.
+DEFAULT_CAMERAS = [
+    {'id': 'cam0', 'name': 'CÁMARA 01 - PLANTA PRINCIPAL', 'source': 'auto'}
+]
+
+def load_camera_config(path=None):
+    """
+    Lee la lista de cámaras del archivo JSON. Si no existe, devuelve la configuración por defecto.
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    path = path or os.environ.get('SAFEGUARD_CAMERAS') or os.path.join(base_dir, 'cameras.json')
+    if not os.path.exists(path):
+        return [dict(c) for c in DEFAULT_CAMERAS]
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error al leer la configuración de cámaras {path}: {e}")
+        return [dict(c) for c in DEFAULT_CAMERAS]
+    cameras = data.get('cameras', []) if isinstance(data, dict) else data
+
+    seen = set()
+    valid = []
+    for i, entry in enumerate(cameras):
+        cam_id = str(entry.get('id', f"cam{i}"))
+        if cam_id in seen:
+            print(f"⚠️ Cámara duplicada ignorada: {cam_id}")
+            continue
+        seen.add(cam_id)
+        valid.append({
+            'id': cam_id,
+            'name': entry.get('name', cam_id),
+            'source': entry.get('source', 'auto'),
+            'loop': entry.get('loop', True),
+            'zones': entry.get('zones'),
+            'inference': entry.get('inference')
+        })
+    return valid or [dict(c) for c in DEFAULT_CAMERAS]
+
+
+class CameraRegistry:
+    def __init__(self, config=None, camera_factory=VideoCamera):
+        """
+        config: lista de diccionarios {id, name, source}; por defecto se lee con load_camera_config().
+        camera_factory: clase o función que construye la cámara (reemplazable en pruebas).
+        """
+        self.config = config if config is not None else load_camera_config()
+        self.camera_factory = camera_factory
+        self.cameras = {}
+
+    def open(self):
+        """
+        Abre todas las cámaras configuradas. Una cámara que falla no impide abrir las demás.
+        """
+        for entry in self.config:
+            try:
+                self.cameras[entry['id']] = self._build(entry)
+            except Exception as e:
+                print(f"❌ Error al inicializar la cámara {entry['id']}: {e}")
+        return self
+
+    def _build(self, entry):
+        source = entry.get('source', 'auto')
+        if source == 'auto':
+            return self.camera_factory()
+        return self.camera_factory(sources=[source], loop=entry.get('loop', True))
+
+    def get(self, cam_id):
+        return self.cameras.get(cam_id)
+
+    def ids(self):
+        return list(self.cameras.keys())
+
+    def describe(self):
+        """
+        Lista de cámaras para la API (identificador, nombre, fuente y si es sintética).
+        """
+        return [{
+            'id': entry['id'],
+            'name': entry.get('name', entry['id']),
+            'source': str(entry.get('source', 'auto')),
+            'available': entry['id'] in self.cameras,
+            'synthetic': getattr(self.cameras.get(entry['id']), 'using_synthetic', None)
+        } for entry in self.config]
+
+    def stop_all(self):
+        for camera in self.cameras.values():
+            camera.stop()
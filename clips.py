@@ -0,0 +1,307 @@
+import os
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+from storage import CaptureStore
+
+# Clips de Incidentes (segundos antes y después del evento)
+# Cada cámara guarda en memoria los últimos segundos de video como JPEG ya codificados: los
+# produce un perfil de transmisión sin anotar (por defecto 'medium'), así que si alguien mira
+# ese perfil la codificación es la misma que se envía a los espectadores, y si nadie mira el
+# servidor solo codifica (no dibuja) el cuadro. Con cada JPEG se guardan las detecciones del
+# cuadro (clip_overlay). El búfer está acotado en bytes y en segundos por cámara.
+#
+# Al registrar un incidente, request() reserva el nombre del clip (se guarda en la fila del
+# incidente) y un hilo en segundo plano espera a que pasen los segundos posteriores, toma los
+# cuadros del búfer, dibuja las detecciones sobre cada uno (draw_overlay) y escribe un AVI
+# (Motion JPEG). Los cuadros sin detecciones (monitoreo en pausa) se copian sin decodificar.
+# El bucle de detección solo agrega referencias al búfer. Los clips se guardan en el
+# CaptureStore (carpetas por fecha y cuota de disco compartida).
+CLIP_PROFILE = 'medium'
+WRITE_MARGIN = 0.5   # segundos extra de espera para los últimos cuadros codificados
+CLIP_QUALITY = 75    # calidad JPEG de los cuadros redibujados al exportar
+ZONE_COLOR = (0, 0, 255)
+
+def clip_overlay(detections, colors):
+    """
+    Lo que se dibuja en el clip a partir de las detecciones de un cuadro (ObjectDetector):
+    tamaño del cuadro original, hora, zonas y personas con su color BGR ('colors' por estado).
+    Comparte las listas de 'detections', que no se modifican después de publicarse.
+    """
+    return {
+        'width': detections['width'],
+        'time': detections['time'],
+        'zones': detections['zones'],
+        'persons': [(person['box'], person['label'], colors[person['status']]) for person in detections['persons']]
+    }
+
+def draw_overlay(frame, overlay):
+    """
+    Dibuja en su lugar las zonas, las personas y la hora de 'overlay' sobre el cuadro, escalando
+    las coordenadas del cuadro original al tamaño del JPEG.
+    """
+    height, width = frame.shape[:2]
+    scale = width / overlay['width']
+    for zone in overlay['zones']:
+        points = np.round(np.asarray(zone['points'], dtype=np.float64) * scale).astype(np.int32)
+        cv2.polylines(frame, [points], True, ZONE_COLOR, 2)
+        x, y = points.min(axis=0)
+        cv2.putText(frame, zone['name'], (int(x) + 10, int(y) + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, ZONE_COLOR, 2)
+    for box, label, color in overlay['persons']:
+        x1, y1, x2, y2 = (int(round(v * scale)) for v in box)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    timestamp = datetime.fromtimestamp(overlay['time']).strftime("%Y-%m-%d %H:%M:%S")
+    cv2.putText(frame, timestamp, (10, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    return frame
+
+
+class ClipBuffer:
+    def __init__(self, max_seconds, max_bytes):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self._frames = deque()   # (marca de tiempo, JPEG, (ancho, alto), detecciones o None)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.appended = 0
+        self.evicted = 0
+
+    def append(self, timestamp, jpeg_bytes, size, overlay=None):
+        with self._lock:
+            self._frames.append((timestamp, jpeg_bytes, size, overlay))
+            self.bytes += len(jpeg_bytes)
+            self.appended += 1
+            # Descartar lo más antiguo si se supera el presupuesto de memoria o de tiempo
+            while self._frames and (self.bytes > self.max_bytes or timestamp - self._frames[0][0] > self.max_seconds):
+                self.bytes -= len(self._frames.popleft()[1])
+                self.evicted += 1
+
+    def frames(self, start, end):
+        """
+        Cuadros con marca de tiempo entre start y end (inclusive), del más antiguo al más reciente.
+        """
+        with self._lock:
+            return [frame for frame in self._frames if start <= frame[0] <= end]
+
+    def get_stats(self):
+        with self._lock:
+            seconds = self._frames[-1][0] - self._frames[0][0] if self._frames else 0.0
+            return {
+                'frames': len(self._frames),
+                'seconds': round(seconds, 1),
+                'memory_mb': round(self.bytes / 1024 / 1024, 2),
+                'evicted': self.evicted
+            }
+
+
+def write_mjpeg_avi(path, jpegs, fps, width, height):
+    """
+    Escribe un AVI (RIFF) con un flujo de video MJPG cuyos cuadros son los JPEG dados tal cual.
+    """
+    fps_scale = 1000
+    movi = bytearray(b'movi')
+    index = bytearray()
+    for jpeg in jpegs:
+        index += struct.pack('<4sIII', b'00dc', 0x10, len(movi), len(jpeg))   # AVIIF_KEYFRAME
+        movi += struct.pack('<4sI', b'00dc', len(jpeg)) + jpeg
+        if len(jpeg) % 2:
+            movi += b'\0'
+    max_size = max(len(jpeg) for jpeg in jpegs)
+
+    avih = struct.pack('<IIIIIIIIII16x', int(1e6 / fps), int(max_size * fps), 0, 0x10, len(jpegs), 0, 1,
+                       max_size, width, height)
+    strh = struct.pack('<4s4sIHHIIIIIIIIhhhh', b'vids', b'MJPG', 0, 0, 0, 0, fps_scale, int(fps * fps_scale), 0,
+                       len(jpegs), max_size, 0xFFFFFFFF, 0, 0, 0, width, height)
+    strf = struct.pack('<IiiHH4sIiiII', 40, width, height, 1, 24, b'MJPG', width * height * 3, 0, 0, 0, 0)
+    strl = _list(b'strl', _chunk(b'strh', strh) + _chunk(b'strf', strf))
+    hdrl = _list(b'hdrl', _chunk(b'avih', avih) + strl)
+    body = b'AVI ' + hdrl + _chunk(b'LIST', bytes(movi)) + _chunk(b'idx1', bytes(index))
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+
+def _chunk(fourcc, data):
+    return fourcc + struct.pack('<I', len(data)) + data + (b'\0' if len(data) % 2 else b'')
+
+def _list(fourcc, data):
+    return _chunk(b'LIST', fourcc + data)
+
+
+class ClipRecorder:
+    def __init__(self, store=None, pre_seconds=5.0, post_seconds=5.0, max_bytes=16 * 1024 * 1024,
+                 profile=CLIP_PROFILE, max_pending=16, on_failed=None):
+        """
+        store: CaptureStore donde se escriben los clips (por defecto uno nuevo en 'static/').
+        pre_seconds / post_seconds: video guardado antes y después del incidente.
+        max_bytes: memoria máxima del búfer de cada cámara (con poca memoria el clip empieza más tarde).
+        profile: perfil de transmisión (sin anotar) cuyos JPEG se guardan; se codifica aunque no tenga espectadores.
+        max_pending: clips esperando sus segundos posteriores; los siguientes se descartan.
+        on_failed: función opcional llamada con la ruta web de un clip que no pudo escribirse.
+        """
+        self.store = store or CaptureStore()
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_bytes = max_bytes
+        self.profile = profile
+        self.max_pending = max_pending
+        self.on_failed = on_failed
+        self._buffers = {}
+        self._pending = []
+        self._writing = 0   # clips ya sacados de _pending cuyo AVI se está escribiendo
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        # Métricas
+        self.requested = 0
+        self.merged = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_write_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def buffer(self, cam_id):
+        """
+        Búfer de la cámara (se crea la primera vez); el pipeline lo conecta a su perfil de clips.
+        """
+        with self._cond:
+            buffer = self._buffers.get(cam_id)
+            if buffer is None:
+                # Debe cubrir el clip completo cuando el hilo escritor lo recoge
+                max_seconds = self.pre_seconds + self.post_seconds + WRITE_MARGIN + 1.0
+                buffer = self._buffers[cam_id] = ClipBuffer(max_seconds, self.max_bytes)
+            return buffer
+
+    def request(self, cam_id, event_time=None):
+        """
+        Programa el clip de un incidente y devuelve su ruta web relativa a 'static/' (el archivo
+        aparece post_seconds después), o None si hay demasiados clips pendientes. Varios
+        incidentes de la misma cámara dentro de un clip pendiente comparten ese clip.
+        """
+        event_time = time.time() if event_time is None else event_time
+        with self._cond:
+            self.requested += 1
+            for clip in self._pending:
+                # El búfer cubre un solo clip, así que no se alarga: la alerta queda dentro
+                if clip['cam_id'] == cam_id and clip['start'] <= event_time <= clip['end']:
+                    self.merged += 1
+                    return clip['web_path']
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return None
+            safe_id = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(cam_id))
+            web_path = self.store.new_path('clips', datetime.fromtimestamp(event_time), f"clip_{safe_id}", '.avi')
+            clip = {'cam_id': cam_id, 'start': event_time - self.pre_seconds,
+                    'end': event_time + self.post_seconds, 'web_path': web_path}
+            self._pending.append(clip)
+            self._cond.notify()
+            return clip['web_path']
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.time()
+                    due = [clip for clip in self._pending if clip['end'] + WRITE_MARGIN <= now]
+                    if due:
+                        break
+                    wait = min((clip['end'] + WRITE_MARGIN - now for clip in self._pending), default=1.0)
+                    self._cond.wait(max(wait, 0.01))
+                if self._stopped:
+                    return
+                clip = min(due, key=lambda c: c['end'])
+                self._pending.remove(clip)
+                self._writing += 1
+            try:
+                self._write(clip)
+            finally:
+                with self._cond:
+                    self._writing -= 1
+
+    def _write(self, clip):
+        start = time.perf_counter()
+        frames = self.buffer(clip['cam_id']).frames(clip['start'], clip['end'])
+        if frames:
+            # Si cambió la resolución del perfil, quedarse con los cuadros del tamaño más reciente
+            size = frames[-1][2]
+            frames = [frame for frame in frames if frame[2] == size]
+        if len(frames) < 2:
+            print(f"⚠️ Clip sin cuadros suficientes ({len(frames)}): {clip['web_path']}")
+            return self._fail(clip)
+        try:
+            filepath = self.store.abspath(clip['web_path'])
+            fps = (len(frames) - 1) / max(frames[-1][0] - frames[0][0], 1e-3)
+            write_mjpeg_avi(filepath + '.tmp', [self._annotate(frame[1], frame[3]) for frame in frames], fps, *size)
+            os.replace(filepath + '.tmp', filepath)
+            self.store.add(clip['web_path'])
+        except Exception as e:
+            print(f"❌ Error al guardar clip de incidente: {e}")
+            return self._fail(clip)
+        self.written += 1
+        self.last_write_ms = (time.perf_counter() - start) * 1000
+        print(f"✅ Clip de incidente guardado: {clip['web_path']} ({len(frames)} cuadros, {fps:.1f} FPS)")
+
+    @staticmethod
+    def _annotate(jpeg_bytes, overlay):
+        """
+        JPEG del cuadro con las detecciones dibujadas (el original si no hay o no se puede decodificar).
+        """
+        if overlay is None:
+            return jpeg_bytes
+        frame = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return jpeg_bytes
+        ret, jpeg = cv2.imencode('.jpg', draw_overlay(frame, overlay), [cv2.IMWRITE_JPEG_QUALITY, CLIP_QUALITY])
+        return jpeg.tobytes() if ret else jpeg_bytes
+
+    def _fail(self, clip):
+        self.failed += 1
+        if self.on_failed is not None:
+            try:
+                self.on_failed(clip['web_path'])
+            except Exception as e:
+                print(f"❌ Error al desvincular clip: {e}")
+
+    def flush(self, timeout=None):
+        """
+        Espera a que se escriban los clips pendientes, incluido el que se está escribiendo
+        (por defecto hasta post_seconds + margen).
+        """
+        deadline = time.time() + (self.post_seconds + WRITE_MARGIN + 2.0 if timeout is None else timeout)
+        while time.time() < deadline:
+            with self._cond:
+                if not self._pending and not self._writing:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def get_stats(self):
+        with self._cond:
+            buffers = dict(self._buffers)
+            pending = len(self._pending)
+            writing = self._writing
+        return {
+            'profile': self.profile,
+            'pre_seconds': self.pre_seconds,
+            'post_seconds': self.post_seconds,
+            'pending': pending,
+            'writing': writing,
+            'requested': self.requested,
+            'merged': self.merged,
+            'written': self.written,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'last_write_ms': round(self.last_write_ms, 2),
+            'buffers': {cam_id: buffer.get_stats() for cam_id, buffer in buffers.items()}
+        }
@@ -1,7 +1,12 @@
 import sqlite3
 import os
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import base64
+import time
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
 from flask_login import UserMixin
 
 # Configuración de Rutas de Base de Datos
@@ -17,15 +22,76 @@ class User(UserMixin):
         self.username = username
         self.password_hash = password_hash
 
-# Inicialización de la Base de Datos
-# Crea las tablas necesarias (incidentes y usuarios) si no existen.
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Tabla de Incidentes
-    # Almacena el registro de violaciones de seguridad detectadas.
-    c.execute('''
+# Pool de Conexiones (una conexión por hilo)
+# Abrir una conexión SQLite por consulta es caro. Cada hilo (peticiones Flask, escritor de
+# incidentes) reutiliza su propia conexión, en modo WAL para que las lecturas del panel no
+# bloqueen a las escrituras. sqlite3 guarda en caché las sentencias preparadas por conexión.
+# El servidor de Flask usa un hilo por petición: la conexión se cierra cuando su hilo termina
+# (al liberarse los datos locales del hilo), y el registro de conexiones es débil.
+_local = threading.local()
+_connections = weakref.WeakSet()
+_connections_lock = threading.Lock()
+
+class _PooledConnection(sqlite3.Connection):
+    # Subclase solo para admitir referencias débiles (sqlite3.Connection no las admite)
+    pass
+
+class _ThreadConnection:
+    """
+    Conexión de un hilo; se cierra al terminar el hilo. La caché de sentencias forma un ciclo
+    de referencias con la conexión, así que sin este cierre explícito el descriptor quedaría
+    abierto hasta que pase el recolector de ciclos.
+    """
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.path = path
+
+    def __del__(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+def get_connection():
+    """
+    Devuelve la conexión del hilo actual (se crea la primera vez o si cambió DB_PATH).
+    """
+    current = getattr(_local, 'current', None)
+    if current is not None and current.path == DB_PATH:
+        return current.conn
+    conn = sqlite3.connect(DB_PATH, timeout=10, cached_statements=256, factory=_PooledConnection)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=10000')
+    # Reemplazar la conexión anterior del hilo (si cambió DB_PATH) la cierra
+    _local.current = _ThreadConnection(conn, DB_PATH)
+    with _connections_lock:
+        _connections.add(conn)
+    return conn
+
+def close_all_connections():
+    """
+    Cierra todas las conexiones del pool (al apagar la aplicación o en pruebas).
+    """
+    with _connections_lock:
+        for conn in list(_connections):
+            try:
+                conn.close()
+            except Exception:
+                pass
+        _connections.clear()
+    _local.__dict__.clear()
+
+# Migraciones de Esquema
+# Cada elemento es una versión del esquema; PRAGMA user_version guarda la última aplicada.
+# Las bases de datos creadas antes de existir las migraciones tienen versión 0 y sus tablas
+# ya existen, por eso la versión 1 usa IF NOT EXISTS.
+MIGRATIONS = [
+    # Versión 1: esquema base
+    [
+        # Tabla de Incidentes
+        # Almacena el registro de violaciones de seguridad detectadas.
+        '''
         CREATE TABLE IF NOT EXISTS incidents (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp TEXT NOT NULL,
@@ -33,22 +99,75 @@ def init_db():
             image_path TEXT,        -- Ruta a la captura de pantalla
             details TEXT
         )
-    ''')
-    
-    # Tabla de Usuarios
-    # Almacena credenciales de acceso para el sistema.
-    c.execute('''
+        ''',
+        # Tabla de Usuarios
+        # Almacena credenciales de acceso para el sistema.
+        '''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT NOT NULL UNIQUE,
             password TEXT NOT NULL  -- Hash de la contraseña
         )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    print("Base de datos inicializada (Incidentes y Usuarios).")
-    
+        ''',
+    ],
+    # Versión 2: índices para consultas por fecha y por tipo
+    [
+        'CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON incidents(timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_incidents_type_timestamp ON incidents(type, timestamp)',
+    ],
+    # Versión 3: resumen por hora y tipo mantenido de forma incremental por disparadores
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS incident_rollup (
+            bucket TEXT NOT NULL,   -- Hora del incidente (ej. "2026-10-18T08")
+            type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (bucket, type)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        INSERT INTO incident_rollup (bucket, type, count)
+        SELECT substr(timestamp, 1, 13), type, COUNT(*) FROM incidents GROUP BY 1, 2
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_incidents_rollup_insert AFTER INSERT ON incidents
+        BEGIN
+            INSERT INTO incident_rollup (bucket, type, count) VALUES (substr(NEW.timestamp, 1, 13), NEW.type, 1)
+            ON CONFLICT (bucket, type) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_incidents_rollup_delete AFTER DELETE ON incidents
+        BEGIN
+            UPDATE incident_rollup SET count = count - 1
+            WHERE bucket = substr(OLD.timestamp, 1, 13) AND type = OLD.type;
+        END
+        ''',
+    ],
+    # Versión 4: clip de video del incidente (segundos antes y después; ver clips.py)
+    [
+        'ALTER TABLE incidents ADD COLUMN clip_path TEXT',
+    ],
+]
+
+def migrate(conn):
+    """
+    Aplica las migraciones pendientes. Devuelve la versión final del esquema.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target in range(version, len(MIGRATIONS)):
+        with conn:
+            for statement in MIGRATIONS[target]:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {target + 1}')
+    return len(MIGRATIONS)
+
+# Inicialización de la Base de Datos
+# Crea las tablas necesarias (incidentes y usuarios) y aplica las migraciones pendientes.
+def init_db():
+    version = migrate(get_connection())
+    print(f"Base de datos inicializada (Incidentes y Usuarios, esquema v{version}).")
+
     # Crear usuario administrador por defecto si no existe
     create_user("admin", "admin123")
 
@@ -56,26 +175,61 @@ def init_db():
 # Guarda un nuevo registro en la tabla 'incidents'.
 def log_incident(incident_type, image_path, details=""):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         timestamp = datetime.now().isoformat()
-        c.execute('INSERT INTO incidents (timestamp, type, image_path, details) VALUES (?, ?, ?, ?)',
-                  (timestamp, incident_type, image_path, details))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            conn.execute('INSERT INTO incidents (timestamp, type, image_path, details) VALUES (?, ?, ?, ?)',
+                         (timestamp, incident_type, image_path, details))
     except Exception as e:
         print(f"Error al registrar incidente: {e}")
 
+# Registrar Varios Incidentes en Lote
+# Inserta todas las filas (timestamp, type, image_path, details[, clip_path]) en una sola
+# transacción. Lo usa el escritor asíncrono de incidentes para no abrir una conexión por alerta.
+# Devuelve la lista de ids asignados (consecutivos dentro de la transacción) o None si falló.
+def log_incidents(rows):
+    try:
+        rows = [tuple(row) + (None,) * (5 - len(row)) for row in rows]
+        with get_connection() as conn:
+            conn.executemany('INSERT INTO incidents (timestamp, type, image_path, details, clip_path) '
+                             'VALUES (?, ?, ?, ?, ?)', rows)
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+    except Exception as e:
+        print(f"Error al registrar incidentes: {e}")
+        return None
+
+# Desvincular un Clip
+# El clip se reserva al registrar el incidente y se escribe segundos después; si no pudo
+# escribirse, las filas que lo referencian quedan sin clip.
+def clear_incident_clip(clip_path):
+    try:
+        with get_connection() as conn:
+            conn.execute('UPDATE incidents SET clip_path = NULL WHERE clip_path = ?', (clip_path,))
+    except Exception as e:
+        print(f"Error al desvincular clip: {e}")
+
+# Desvincular Archivos Borrados por la Cuota
+# El almacén de capturas (storage.py) borra los archivos más antiguos; los incidentes se
+# conservan, sin la captura o el clip que ya no existen.
+def clear_incident_media(paths, chunk=500):
+    try:
+        with get_connection() as conn:
+            for i in range(0, len(paths), chunk):
+                part = list(paths[i:i + chunk])
+                marks = ', '.join('?' * len(part))
+                conn.execute(f'UPDATE incidents SET image_path = NULL WHERE image_path IN ({marks})', part)
+                conn.execute(f'UPDATE incidents SET clip_path = NULL WHERE clip_path IN ({marks})', part)
+    except Exception as e:
+        print(f"Error al desvincular archivos borrados: {e}")
+
 # Obtener Incidentes Recientes
 # Recupera los últimos 'limit' incidentes para mostrar en el panel.
 def get_recent_incidents(limit=10):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('SELECT * FROM incidents ORDER BY id DESC LIMIT ?', (limit,))
-        rows = c.fetchall()
-        conn.close()
-        
+        rows = get_connection().execute(
+            'SELECT id, timestamp, type, image_path, details, clip_path FROM incidents ORDER BY id DESC LIMIT ?', (limit,)
+        ).fetchall()
+
         incidents = []
         for row in rows:
             incidents.append({
@@ -83,32 +237,149 @@ def get_recent_incidents(limit=10):
                 'timestamp': row[1],
                 'type': row[2],
                 'image_path': row[3],
-                'details': row[4]
+                'details': row[4],
+                'clip_path': row[5]
             })
         return incidents
     except Exception as e:
         print(f"Error al obtener incidentes: {e}")
         return []
 
+# Consulta Paginada de Incidentes
+# Paginación por cursor (keyset): en lugar de OFFSET, cada página continúa después del último
+# (timestamp, id) devuelto, por lo que el costo no crece con el número de páginas ni de filas.
+# Los índices (timestamp) e (type, timestamp) cubren el orden y los filtros.
+def encode_cursor(timestamp, incident_id):
+    return base64.urlsafe_b64encode(f"{timestamp}|{incident_id}".encode()).decode()
+
+def decode_cursor(cursor):
+    """
+    Devuelve (timestamp, id) o lanza ValueError si el cursor no es válido.
+    """
+    try:
+        timestamp, incident_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return timestamp, int(incident_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def query_incidents(limit=50, cursor=None, since=None, until=None, incident_type=None):
+    """
+    Devuelve (incidentes, next_cursor) ordenados del más reciente al más antiguo.
+    since/until: marcas de tiempo ISO (since inclusivo, until exclusivo).
+    next_cursor es None cuando no hay más páginas.
+    """
+    clauses = []
+    params = []
+    if incident_type:
+        clauses.append('type = ?'); params.append(incident_type)
+    if since:
+        clauses.append('timestamp >= ?'); params.append(since)
+    if until:
+        clauses.append('timestamp < ?'); params.append(until)
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        clauses.append('(timestamp, id) < (?, ?)'); params.extend([cursor_ts, cursor_id])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    rows = get_connection().execute(
+        f'SELECT id, timestamp, type, image_path, details, clip_path FROM incidents {where} '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?', params + [limit + 1]
+    ).fetchall()
+
+    incidents = [{
+        'id': row[0],
+        'timestamp': row[1],
+        'type': row[2],
+        'image_path': row[3],
+        'details': row[4],
+        'clip_path': row[5]
+    } for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = incidents[-1]
+        next_cursor = encode_cursor(last['timestamp'], last['id'])
+    return incidents, next_cursor
+
+# Resumen Agregado de Incidentes
+# Conteos por hora o por día y por tipo, leídos de la tabla 'incident_rollup' que los
+# disparadores mantienen en cada inserción. since/until tienen el mismo sentido que en
+# query_incidents (since inclusivo, until exclusivo): las horas completas del rango salen del
+# resumen y las partes de hora en los extremos se cuentan en la tabla 'incidents' (por el
+# índice de timestamp, a lo sumo una hora de filas por extremo).
+def _on_the_hour(timestamp):
+    return timestamp[13:].strip(':.0') == ''
+
+def _next_hour(timestamp):
+    return (datetime.strptime(timestamp[:13], '%Y-%m-%dT%H') + timedelta(hours=1)).strftime('%Y-%m-%dT%H')
+
+def summarize_incidents(bucket='hour', since=None, until=None, incident_type=None):
+    key_len = {'hour': 13, 'day': 10}[bucket]
+    type_clause = ' AND type = ?' if incident_type else ''
+    type_params = [incident_type] if incident_type else []
+    # Rangos [inicio, fin) contados fila por fila; el resto sale del resumen por hora
+    partial = []
+    if since and until and since[:13] == until[:13]:
+        partial.append((since, until))
+    else:
+        if since and not _on_the_hour(since):
+            partial.append((since, _next_hour(since)))
+            since = _next_hour(since)
+        if until and not _on_the_hour(until):
+            partial.append((until[:13], until))
+
+    queries = []
+    if not (since and until and since[:13] == until[:13]):
+        clauses = []
+        params = []
+        if since:
+            clauses.append('bucket >= ?'); params.append(since[:13])
+        if until:
+            clauses.append('bucket < ?'); params.append(until[:13])
+        if incident_type:
+            clauses.append('type = ?'); params.append(incident_type)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        queries.append((f'SELECT substr(bucket, 1, {key_len}) AS period, type, SUM(count) FROM incident_rollup {where} '
+                        'GROUP BY period, type', params))
+    for start, end in partial:
+        queries.append((f'SELECT substr(timestamp, 1, {key_len}) AS period, type, COUNT(*) FROM incidents '
+                        f'WHERE timestamp >= ? AND timestamp < ?{type_clause} GROUP BY period, type',
+                        [start, end] + type_params))
+
+    conn = get_connection()
+    counts = {}
+    for sql, params in queries:
+        for period, incident_type_, count in conn.execute(sql, params):
+            counts[(period, incident_type_)] = counts.get((period, incident_type_), 0) + count
+    rows = [(period, incident_type_, count) for (period, incident_type_), count in sorted(counts.items()) if count > 0]
+
+    buckets = {}
+    by_type = {}
+    for period, incident_type_, count in rows:
+        entry = buckets.setdefault(period, {'period': period, 'total': 0, 'by_type': {}})
+        entry['total'] += count
+        entry['by_type'][incident_type_] = count
+        by_type[incident_type_] = by_type.get(incident_type_, 0) + count
+    return {
+        'bucket': bucket,
+        'total': sum(by_type.values()),
+        'by_type': by_type,
+        'buckets': list(buckets.values())
+    }
+
 # Gestión de Usuarios
 
 # Crear Nuevo Usuario
 # Cifra la contraseña antes de guardarla para mayor seguridad.
 def create_user(username, password):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        # Verificar si ya existe el usuario
-        c.execute('SELECT id FROM users WHERE username = ?', (username,))
-        if c.fetchone():
-            conn.close()
-            return False 
-            
-        hashed_pw = generate_password_hash(password)
-        c.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, hashed_pw))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            # Verificar si ya existe el usuario
+            if conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone():
+                return False
+
+            hashed_pw = generate_password_hash(password)
+            conn.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, hashed_pw))
+        user_cache.clear()
         print(f"Usuario '{username}' creado exitosamente.")
         return True
     except Exception as e:
@@ -118,12 +389,10 @@ def create_user(username, password):
 # Obtener Usuario por Nombre
 def get_user_by_username(username):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('SELECT id, username, password FROM users WHERE username = ?', (username,))
-        row = c.fetchone()
-        conn.close()
-        
+        row = get_connection().execute(
+            'SELECT id, username, password FROM users WHERE username = ?', (username,)
+        ).fetchone()
+
         if row:
             return User(id=row[0], username=row[1], password_hash=row[2])
         return None
@@ -134,15 +403,76 @@ def get_user_by_username(username):
 # Obtener Usuario por ID
 def get_user_by_id(user_id):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('SELECT id, username, password FROM users WHERE id = ?', (user_id,))
-        row = c.fetchone()
-        conn.close()
-        
+        row = get_connection().execute(
+            'SELECT id, username, password FROM users WHERE id = ?', (user_id,)
+        ).fetchone()
+
         if row:
             return User(id=row[0], username=row[1], password_hash=row[2])
         return None
     except Exception as e:
         print(f"Error al obtener usuario por id: {e}")
         return None
+
+# Caché de Usuarios en Memoria
+# Flask-Login carga el usuario en cada petición autenticada (cada conexión MJPEG, SSE o API).
+# Esta caché LRU con expiración evita tocar la base de datos en el camino crítico.
+# Se vacía cuando cambian los usuarios (create_user).
+class UserCache:
+    def __init__(self, max_size=256, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, loader):
+        """
+        Devuelve el usuario desde la caché o lo carga con 'loader(user_id)' si no está o expiró.
+        """
+        key = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and now - item[1] < self.ttl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+
+        user = loader(user_id)
+        if user is not None:
+            with self._lock:
+                self._items[key] = (user, now)
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+                    self.evictions += 1
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._items.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def get_stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0
+            }
+
+user_cache = UserCache()
+
+# Obtener Usuario por ID (con caché)
+def get_cached_user_by_id(user_id):
+    return user_cache.get(user_id, get_user_by_id)
@@ -0,0 +1,368 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from ppe import HELMET_THRESHOLD, VEST_THRESHOLD
+from zones import ZoneMap
+
+# Registro de Detecciones (columnar, de ancho fijo)
+# Opcionalmente el detector guarda todo lo que calcula por persona y cuadro, no solo la alerta
+# final: caja, puntaje del modelo, proporciones de color de casco y chaleco, veredictos y zonas.
+# Cada registro ocupa RECORD.itemsize bytes (48) con un formato fijo, así que un archivo de
+# registros se abre con np.memmap y se consulta con NumPy sin parsear nada.
+#
+# Los registros se escriben por trozos de tiempo (un archivo por hora por defecto,
+# <root>/detections-AAAAMMDD-HHMMSS.dlog) y meta.json guarda el formato, los nombres de las
+# cámaras (campo 'stream') y los nombres de sus zonas (bit i del campo 'zones'). Borrar los
+# archivos más antiguos es seguro.
+#
+# Escritura: append() copia las columnas en un búfer preasignado; cuando se llena (o cada
+# 'flush_interval' segundos) se entrega completo a un hilo que lo escribe con una sola llamada.
+# Si el disco no da abasto y hay 'max_pending' búferes esperando, los registros se descartan
+# y se cuentan: el bucle de video nunca espera al disco.
+RECORD = np.dtype([
+    ('time', '<f8'),            # reloj del detector (epoch)
+    ('stream', '<u2'),          # índice de la cámara en meta.json
+    ('flags', 'u1'),            # bits FLAG_*
+    ('_pad', 'u1'),
+    ('frame', '<u4'),           # número de cuadro analizado de la cámara
+    ('track', '<i4'),           # identificador de la persona rastreada
+    ('box', '<i2', (4,)),       # x1, y1, x2, y2 en píxeles
+    ('width', '<u2'),           # tamaño del cuadro (para reevaluar zonas normalizadas)
+    ('height', '<u2'),
+    ('score', '<f4'),           # confianza del modelo (NaN si el backend no la informa)
+    ('helmet_ratio', '<f4'),    # proporción de color de casco de la última evaluación de EPP
+    ('vest_ratio', '<f4'),
+    ('zones', '<u4'),           # bit i = dentro de la zona i
+])
+FORMAT_VERSION = 1
+
+FLAG_HELMET = 1        # veredicto (suavizado) de casco
+FLAG_VEST = 2          # veredicto (suavizado) de chaleco
+FLAG_MEASURED = 4      # EPP evaluado en este cuadro (si no, las proporciones son de un cuadro anterior)
+FLAG_INFERRED = 8      # cajas del modelo en este cuadro (si no, reutilizadas por la compuerta de movimiento)
+
+# Estados de persona en la reevaluación (mismo criterio que el detector)
+SAFE, WARNING, DANGER = 0, 1, 2
+STATUS_NAMES = ('safe', 'warning', 'danger')
+
+CHUNK_PREFIX = 'detections-'
+CHUNK_SUFFIX = '.dlog'
+
+
+class DetectionLog:
+    def __init__(self, root, chunk_seconds=3600, buffer_records=8192, flush_interval=1.0, max_pending=8):
+        """
+        root: carpeta del registro (se crea si no existe).
+        chunk_seconds: duración de cada archivo.
+        buffer_records: registros por búfer (8192 x 48 B = 384 KB por escritura).
+        flush_interval: segundos máximos que un registro espera en memoria.
+        max_pending: búferes llenos esperando al disco antes de descartar.
+        """
+        self.root = root
+        self.chunk_seconds = chunk_seconds
+        self.buffer_records = buffer_records
+        self.flush_interval = flush_interval
+        os.makedirs(root, exist_ok=True)
+        self._meta = _read_meta(root) or {'version': FORMAT_VERSION, 'record': _describe(RECORD),
+                                          'streams': [], 'zones': {}}
+        self._stream_index = {name: i for i, name in enumerate(self._meta['streams'])}
+        self._zone_names = {name: tuple(zones) for name, zones in self._meta['zones'].items()}
+        self._frames = {}
+        self._free = queue.Queue()
+        self._full = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._buffer = np.zeros(buffer_records, dtype=RECORD)
+        self._count = 0
+        self._last_flush = time.monotonic()
+        self._stopped = False
+
+        # Métricas
+        self.records = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.last_write_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Escritura (bucle de detección)
+
+    def append(self, stream_id, zone_names, timestamp, width, height, inferred, boxes, track_ids, scores,
+               helmet_ratios, vest_ratios, helmets, vests, measured, in_zones):
+        """
+        Agrega los registros de las personas de un cuadro (todas las columnas con una fila por persona).
+        scores: puntajes del modelo o None; in_zones: matriz booleana personas x zonas.
+        """
+        n = len(boxes)
+        frame_no = self._frames.get(stream_id, 0)
+        self._frames[stream_id] = frame_no + 1
+        if n == 0:
+            return
+        stream = self._stream(stream_id, zone_names)
+        flags = (np.asarray(helmets, dtype=np.uint8) * FLAG_HELMET | np.asarray(vests, dtype=np.uint8) * FLAG_VEST
+                 | np.asarray(measured, dtype=np.uint8) * FLAG_MEASURED | (FLAG_INFERRED if inferred else 0))
+        zone_bits = (in_zones.astype(np.uint32) << np.arange(in_zones.shape[1], dtype=np.uint32)).sum(
+            axis=1, dtype=np.uint32) if in_zones.shape[1] else 0
+        with self._lock:
+            if self._count + n > self.buffer_records:
+                self._hand_off()
+            if n > self.buffer_records:
+                self.dropped += n
+                return
+            rows = self._buffer[self._count:self._count + n]
+            rows['time'] = timestamp
+            rows['stream'] = stream
+            rows['flags'] = flags
+            rows['frame'] = frame_no
+            rows['track'] = track_ids
+            rows['box'] = boxes
+            rows['width'] = width
+            rows['height'] = height
+            rows['score'] = scores if scores is not None and len(scores) == n else np.nan
+            rows['helmet_ratio'] = helmet_ratios
+            rows['vest_ratio'] = vest_ratios
+            rows['zones'] = zone_bits
+            self._count += n
+            self.records += n
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._hand_off()
+
+    def _stream(self, stream_id, zone_names):
+        """
+        Índice de la cámara; registra en meta.json las cámaras nuevas y los cambios de zonas.
+        """
+        name = str(stream_id)
+        index = self._stream_index.get(name)
+        if index is not None and self._zone_names.get(name) == zone_names:
+            return index
+        with self._lock:
+            if index is None:
+                index = self._stream_index[name] = len(self._meta['streams'])
+                self._meta['streams'].append(name)
+            if self._zone_names.get(name) != zone_names:
+                # Los bits de zona de los registros ya escritos se refieren a los nombres anteriores
+                self._hand_off()
+                self._zone_names[name] = zone_names
+                self._meta['zones'][name] = list(zone_names)
+            _write_meta(self.root, self._meta)
+        return index
+
+    def _hand_off(self):
+        # Con el candado tomado: entrega el búfer actual al hilo escritor y toma uno libre
+        self._last_flush = time.monotonic()
+        if not self._count:
+            return
+        try:
+            self._full.put_nowait((self._buffer, self._count))
+        except queue.Full:
+            self.dropped += self._count
+            self._count = 0
+            return
+        try:
+            self._buffer = self._free.get_nowait()
+        except queue.Empty:
+            self._buffer = np.zeros(self.buffer_records, dtype=RECORD)
+        self._count = 0
+
+    # Hilo escritor
+
+    def _run(self):
+        while True:
+            try:
+                buffer, count = self._full.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Sin búferes llenos: entregar lo acumulado para que nada espere más de flush_interval
+                with self._lock:
+                    if time.monotonic() - self._last_flush >= self.flush_interval:
+                        self._hand_off()
+                if self._stopped and self._full.empty():
+                    return
+                continue
+            start = time.perf_counter()
+            try:
+                path = os.path.join(self.root, chunk_name(buffer['time'][0], self.chunk_seconds))
+                with open(path, 'ab') as f:
+                    f.write(memoryview(buffer[:count]).cast('B'))
+                self.bytes_written += count * RECORD.itemsize
+            except Exception as e:
+                self.dropped += count
+                print(f"❌ Error al escribir el registro de detecciones: {e}")
+            self.last_write_ms = (time.perf_counter() - start) * 1000
+            self._free.put(buffer)
+            self._full.task_done()
+
+    def flush(self, timeout=5.0):
+        """
+        Entrega el búfer actual y espera a que se escriba todo lo pendiente.
+        """
+        with self._lock:
+            self._hand_off()
+        deadline = time.time() + timeout
+        while self._full.unfinished_tasks:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self):
+        self.flush()
+        self._stopped = True
+
+    def get_stats(self):
+        return {
+            'root': self.root,
+            'records': self.records,
+            'dropped': self.dropped,
+            'written_mb': round(self.bytes_written / 1024 / 1024, 2),
+            'pending_buffers': self._full.qsize(),
+            'last_write_ms': round(self.last_write_ms, 2)
+        }
+
+
+def chunk_name(timestamp, chunk_seconds=3600):
+    start = datetime.fromtimestamp(int(timestamp // chunk_seconds * chunk_seconds))
+    return f"{CHUNK_PREFIX}{start:%Y%m%d-%H%M%S}{CHUNK_SUFFIX}"
+
+def _describe(dtype):
+    fields = []
+    for name in dtype.names:
+        field = dtype.fields[name][0]
+        base, shape = field.subdtype or (field, ())
+        fields.append([name, base.str, list(shape)])
+    return fields
+
+def _read_meta(root):
+    path = os.path.join(root, 'meta.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    if meta.get('version') != FORMAT_VERSION or meta.get('record') != _describe(RECORD):
+        raise ValueError(f"Formato de registro de detecciones no compatible en {root}")
+    return meta
+
+def _write_meta(root, meta):
+    path = os.path.join(root, 'meta.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+# Lectura y reevaluación (herramienta de repetición)
+
+def open_chunks(root, start=None, end=None):
+    """
+    Archivos del registro como arreglos np.memmap (sin copiar), en orden de tiempo. start/end
+    (datetime) descartan los archivos que quedan fuera del rango. Un registro final incompleto
+    (escritura interrumpida) se ignora.
+    """
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(root, f"{CHUNK_PREFIX}*{CHUNK_SUFFIX}"))):
+        stamp = os.path.basename(path)[len(CHUNK_PREFIX):-len(CHUNK_SUFFIX)]
+        chunk_start = datetime.strptime(stamp, '%Y%m%d-%H%M%S')
+        if end is not None and chunk_start > end:
+            continue
+        count = os.path.getsize(path) // RECORD.itemsize
+        if count:
+            chunks.append((chunk_start, np.memmap(path, dtype=RECORD, mode='r', shape=(count,))))
+    if start is not None:
+        # El archivo de un búfer se elige por su primer registro, así que el anterior al que
+        # contiene 'start' puede tener algunos registros posteriores: se conserva y se filtra por registro
+        first = max([i for i, (chunk_start, _) in enumerate(chunks) if chunk_start <= start], default=0)
+        chunks = chunks[max(first - 1, 0):]
+    return [records for _, records in chunks]
+
+def load(root, start=None, end=None, streams=None):
+    """
+    Registros (un solo arreglo) y meta.json del registro en 'root'. streams: nombres de cámara a conservar.
+    """
+    meta = _read_meta(root)
+    if meta is None:
+        raise FileNotFoundError(f"No hay un registro de detecciones en {root}")
+    chunks = open_chunks(root, start, end)
+    records = np.concatenate(chunks) if chunks else np.zeros(0, dtype=RECORD)
+    keep = np.ones(len(records), dtype=bool)
+    if start is not None:
+        keep &= records['time'] >= start.timestamp()
+    if end is not None:
+        keep &= records['time'] <= end.timestamp()
+    if streams:
+        indices = [meta['streams'].index(s) for s in streams if s in meta['streams']]
+        keep &= np.isin(records['stream'], indices)
+    return (records if keep.all() else records[keep]), meta
+
+def rescore(records, meta, helmet_threshold=HELMET_THRESHOLD, vest_threshold=VEST_THRESHOLD, zones=None):
+    """
+    Recalcula casco, chaleco, zona y estado de cada registro con otros umbrales o zonas.
+    zones: {nombre de cámara: lista de zonas} (formato de zones.py); las cámaras que no
+    aparecen conservan las zonas registradas. Los umbrales se aplican a la proporción de la
+    última evaluación de EPP, sin la histéresis de confirmación del detector.
+    Devuelve un diccionario de arreglos: helmet, vest, in_zone y status (SAFE/WARNING/DANGER).
+    """
+    helmet = records['helmet_ratio'] > helmet_threshold
+    vest = records['vest_ratio'] > vest_threshold
+    in_zone = records['zones'] != 0
+    for name, camera_zones in (zones or {}).items():
+        if name not in meta['streams']:
+            continue
+        zone_map = ZoneMap(camera_zones)
+        selected = np.flatnonzero(records['stream'] == meta['streams'].index(name))
+        if not len(selected):
+            continue
+        sizes = records['width'][selected].astype(np.int64) << 16 | records['height'][selected]
+        # Una consulta vectorizada por resolución (la máscara se rasteriza una vez por tamaño)
+        for size in np.unique(sizes):
+            rows = selected[sizes == size]
+            width, height = int(size >> 16), int(size & 0xFFFF)
+            in_zone[rows] = zone_map.lookup(records['box'][rows], width, height).any(axis=1)
+    status = np.where(helmet & vest, np.where(in_zone, WARNING, SAFE), DANGER).astype(np.uint8)
+    return {'helmet': helmet, 'vest': vest, 'in_zone': in_zone, 'status': status}
+
+def recorded(records):
+    """
+    Veredictos tal como los registró el detector, en el mismo formato que rescore().
+    """
+    helmet = (records['flags'] & FLAG_HELMET) != 0
+    vest = (records['flags'] & FLAG_VEST) != 0
+    in_zone = records['zones'] != 0
+    status = np.where(helmet & vest, np.where(in_zone, WARNING, SAFE), DANGER).astype(np.uint8)
+    return {'helmet': helmet, 'vest': vest, 'in_zone': in_zone, 'status': status}
+
+def summarize(records, verdicts):
+    """
+    Totales de una evaluación: personas-cuadro por estado, sin casco, sin chaleco, en zona
+    y número de personas rastreadas distintas con cada violación.
+    """
+    track_keys = records['stream'].astype(np.int64) << 32 | (records['track'].astype(np.int64) & 0xFFFFFFFF)
+
+    def tracks(mask):
+        return int(len(np.unique(track_keys[mask])))
+
+    counts = np.bincount(verdicts['status'], minlength=3)
+    return {
+        'records': int(len(records)),
+        **{name: int(counts[i]) for i, name in enumerate(STATUS_NAMES)},
+        'no_helmet': int((~verdicts['helmet']).sum()),
+        'no_vest': int((~verdicts['vest']).sum()),
+        'in_zone': int(verdicts['in_zone'].sum()),
+        'tracks_no_helmet': tracks(~verdicts['helmet']),
+        'tracks_no_vest': tracks(~verdicts['vest']),
+        'tracks_in_zone': tracks(verdicts['in_zone'])
+    }
+
+def sweep(records, column, thresholds):
+    """
+    Fracción de personas-cuadro bajo cada umbral (sin casco / sin chaleco) para una lista de
+    umbrales: un solo ordenamiento y una búsqueda binaria por umbral.
+    """
+    values = np.sort(records[column])
+    if not len(values):
+        return [0.0] * len(thresholds)
+    # ratio > t es presencia; ratio <= t, ausencia
+    return (np.searchsorted(values, np.asarray(thresholds, dtype=values.dtype), side='right') / len(values)).tolist()
@@ -1,29 +1,73 @@
-from ultralytics import YOLO
 import cv2
+import copy
 import numpy as np
 import time
-import os
 from datetime import datetime
-from database import log_incident
+from backends import create_backend
+from incident_writer import IncidentWriter
+from metrics import INFERENCE_FRAMES, INFERENCE_SKIPPED, STAGE_SECONDS
+from ppe import PPEClassifier
+from tracker import IoUTracker
+from tiling import InferencePlan
+from zones import ZoneMap
+
+_INFERENCE_SECONDS = STAGE_SECONDS.labels(stage='inference')
+_PPE_SECONDS = STAGE_SECONDS.labels(stage='ppe')
+_RENDER_SECONDS = STAGE_SECONDS.labels(stage='render')
+
+# Estado por Flujo de Video
+# Cada cámara tiene su propio rastreador, compuerta de movimiento, zonas, detecciones previas y FPS,
+# mientras que el modelo YOLO se comparte entre todas (inferencia por lotes).
+class StreamState:
+    def __init__(self, motion_gate=None, clock=time.time):
+        self.tracker = IoUTracker()
+        self.motion_gate = motion_gate
+        self.zones = ZoneMap()
+        self.inference_plan = InferencePlan()
+        self.last_person_boxes = []
+        self.last_person_scores = None
+        self.inferred = False
+        self.frames_since_inference = 0
+        self.last_frame_time = clock()
+        self.inference_calls = 0
+        self.inference_skipped = 0
 
 # Clase Detector de Objetos
 # Encapsula la lógica de detección con YOLO y el análisis de seguridad (EPP y zonas).
 class ObjectDetector:
-    def __init__(self, model_path='yolov8n.pt', imgsz=416, half=True):
+    def __init__(self, model_path='yolov8n.pt', imgsz=416, half=True, motion_gate=None, incident_writer=None,
+                 backend='auto', threads=None, warmup=True, clip_recorder=None, clock=time.time,
+                 detection_log=None):
         """
         Inicializa el detector con optimizaciones para Jetson.
+        motion_gate: MotionGate opcional; si la escena está estática se omite YOLO
+        y se reutilizan las detecciones anteriores.
+        incident_writer: IncidentWriter que guarda las alertas en segundo plano
+        (se crea uno propio si no se indica).
+        backend: backend de inferencia ('auto' prueba TensorRT -> CUDA -> CPU; ver backends.py).
+        threads: hilos de inferencia en CPU (None = valor por defecto).
+        warmup: ejecutar el modelo en vacío al iniciar para que el primer cuadro no pague la inicialización.
+        clip_recorder: ClipRecorder opcional; cada incidente guarda un clip de video antes y después del evento.
+        clock: reloj de los enfriamientos de alerta y de los FPS (el análisis de grabaciones usa la hora del cuadro en la grabación).
+        detection_log: DetectionLog opcional; guarda cajas, puntajes, proporciones de EPP y zonas de cada
+        persona y cuadro para reevaluar umbrales sin volver a ejecutar el modelo (ver detection_log.py).
         """
+        self.clock = clock
         print(f"Cargando modelo: {model_path}...")
         
-        # Detectar si es un modelo TensorRT (.engine)
-        self.is_tensorrt = model_path.endswith('.engine')
         self.imgsz = imgsz
         self.half = half
+        self.backend_choice = backend
+        self.threads = threads
         
-        # Inicializa el modelo YOLO
-        self.model = YOLO(model_path)
+        # Inicializa el backend de inferencia (YOLO)
+        self.backend = self._load_model(model_path)
         
-        print(f"Modelo cargado. TensorRT: {self.is_tensorrt}, Tamaño: {imgsz}, FP16: {half}")
+        if self.backend is not None:
+            info = self.backend.describe()
+            print(f"Modelo cargado. Backend: {info['backend']} ({info['device']}), Tamaño: {info['imgsz']}, FP16: {info['half']}")
+            if warmup:
+                self.warmup()
         
         # Clases de interés del modelo COCO (0 = Persona)
         self.classes_of_interest = [0] 
@@ -38,179 +82,372 @@ class ObjectDetector:
         }
         
         # Variables para control de frecuencia de alertas (evitar spam)
-        self.last_alert_time = 0
-        self.alert_cooldown = 30 # Segundos entre alertas del mismo tipo
-        self.last_frame_time = time.time()
+        self.alert_cooldown = 30 # Segundos entre alertas del mismo tipo para la misma persona
+        
+        # Clasificador de EPP vectorizado (tabla HSV precalculada, compartida por proceso)
+        self.ppe = PPEClassifier()
+        
+        # Parámetros del rastreo de personas: el veredicto de EPP se reutiliza entre cuadros
+        self.ppe_interval = 5       # Reevaluar EPP cada N cuadros por persona...
+        self.ppe_min_iou = 0.7      # ...o cuando su caja cambió sustancialmente
+        self.ppe_confirm_frames = 2 # Observaciones consecutivas necesarias para cambiar el veredicto
+        
+        # Inferencia cada N cuadros por cámara (los demás reutilizan las cajas); lo ajusta el
+        # planificador adaptativo (scheduler.py) junto con ppe_interval e imgsz
+        self.infer_every = 1
+        
+        # Compuerta de movimiento opcional (la instancia recibida es la del flujo por defecto;
+        # las demás cámaras reciben una copia limpia) y contadores de inferencia
+        self.motion_gate = motion_gate
+        self._motion_gate_template = copy.deepcopy(motion_gate)
+        self.streams = {}
+        self.inference_calls = 0
+        self.inference_skipped = 0
+        self.inference_crops = 0
+        self.batches = 0
+        
+        # Las capturas e inserciones en la base de datos se hacen fuera del bucle de video
+        self.incident_writer = incident_writer if incident_writer is not None else IncidentWriter()
+        self.clip_recorder = clip_recorder
+        self.detection_log = detection_log
+
+    def _load_model(self, model_path):
+        """
+        Crea el backend de inferencia (las bibliotecas del modelo se importan de forma diferida).
+        """
+        return create_backend(model_path, self.imgsz, self.half, self.backend_choice, self.threads)
+
+    def warmup(self, runs=2):
+        """
+        Ejecuta el modelo sobre cuadros vacíos (reserva de memoria, kernels, optimización del grafo).
+        """
+        elapsed_ms = self.backend.warmup(runs=runs)
+        print(f"✅ Calentamiento del modelo: {elapsed_ms:.0f} ms ({runs} ejecuciones)")
+
+    def set_imgsz(self, imgsz):
+        """
+        Cambia el tamaño de entrada del modelo. Devuelve False si el backend tiene entrada fija.
+        """
+        if self.backend is not None and not self.backend.set_imgsz(imgsz):
+            return False
+        self.imgsz = imgsz
+        return True
+
+    def _infer_batch(self, frames):
+        """
+        Ejecuta el modelo sobre una lista de cuadros en una sola llamada (lote) y devuelve,
+        para cada cuadro, la lista de cajas [x1, y1, x2, y2] de las personas detectadas.
+        """
+        return self.backend.infer(frames)
+
+    def _infer(self, frame):
+        """
+        Ejecuta el modelo sobre un solo cuadro.
+        """
+        return self._infer_batch([frame])[0]
+
+    def get_stream(self, stream_id='default'):
+        """
+        Devuelve (creándolo si hace falta) el estado del flujo de video 'stream_id'.
+        """
+        state = self.streams.get(stream_id)
+        if state is None:
+            gate = self.motion_gate if stream_id == 'default' else copy.deepcopy(self._motion_gate_template)
+            state = StreamState(gate, self.clock)
+            self.streams[stream_id] = state
+        return state
+
+    def set_zones(self, stream_id, zones):
+        """
+        Configura las zonas de peligro (polígonos) de una cámara; ver zones.py.
+        """
+        self.get_stream(stream_id).zones.configure(zones)
+
+    def set_inference_plan(self, stream_id, plan):
+        """
+        Configura dónde corre el modelo en una cámara: regiones de interés o mosaico (ver tiling.py).
+        """
+        self.get_stream(stream_id).inference_plan.configure(plan)
+
+    def _infer_plans(self, frames, states):
+        """
+        Inferencia de los cuadros según el plan de su cámara: los recortes de todos los cuadros
+        van en un solo lote y las cajas de cada cuadro se fusionan. Devuelve (cajas, puntajes)
+        por cuadro; los cuadros sin plan pasan enteros, como antes.
+        """
+        images, spans = [], []
+        for frame, st in zip(frames, states):
+            crops = st.inference_plan.split(frame) if st.inference_plan.tiled else [frame]
+            spans.append((len(images), len(crops)))
+            images.extend(crops)
+        batch_boxes = self._infer_batch(images)
+        self.inference_crops += len(images)
+        # Puntajes del modelo (solo para el registro de detecciones; None si el backend no los da)
+        batch_scores = getattr(self.backend, 'last_scores', None)
+        if batch_scores is None or len(batch_scores) != len(batch_boxes):
+            batch_scores = None
+        results = []
+        for frame, st, (first, count) in zip(frames, states, spans):
+            scores = batch_scores[first:first + count] if batch_scores is not None else None
+            if not st.inference_plan.tiled:
+                results.append((batch_boxes[first], scores[0] if scores is not None else None))
+                continue
+            height, width = frame.shape[:2]
+            results.append(st.inference_plan.merge(batch_boxes[first:first + count], scores, width, height))
+        return results
+
+    @property
+    def tracker(self):
+        return self.get_stream().tracker
 
     def check_ppe(self, frame, x1, y1, x2, y2):
         """
         Verifica el uso de Casco y Chaleco usando heurística de color en la región de la persona.
         """
-        person_roi = frame[y1:y2, x1:x2]
-        if person_roi.size == 0:
-            return False, False
-            
-        h, w, _ = person_roi.shape
-        
-        # --- ROI de Casco: RESTRINGIDA HORIZONTALMENTE ---
-        # Usamos solo el centro 60% del ancho para evitar paredes/fondos a los lados de la cabeza
-        w_offset = int(w * 0.2)
-        helmet_roi = person_roi[0:int(h*0.25), w_offset:w - w_offset]
-        
-        # ROI de Chaleco: 40% central (torso)
-        vest_roi = person_roi[int(h*0.2):int(h*0.6), :]
-        
-        if helmet_roi.size == 0 or vest_roi.size == 0:
-            return False, False
+        has_helmet, has_vest, _, _ = self.ppe.classify(frame, [[x1, y1, x2, y2]])
+        return bool(has_helmet[0]), bool(has_vest[0])
 
-        hsv_helmet = cv2.cvtColor(helmet_roi, cv2.COLOR_BGR2HSV)
-        hsv_vest = cv2.cvtColor(vest_roi, cv2.COLOR_BGR2HSV)
-        
-        # --- Detección de Casco (Refinada para evitar fondos claros) ---
-        # Blanco/Claro - Aumentamos 'Value' mínimo para ser más exigentes con el brillo (evitar paredes)
-        lower_white = np.array([0, 0, 180]); upper_white = np.array([180, 45, 255])
-        
-        # Amarillo/Verde Neon
-        lower_yellow = np.array([20, 50, 70]); upper_yellow = np.array([50, 255, 255])
-        
-        # Rojo (Dos rangos)
-        lower_red1 = np.array([0, 100, 100]); upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([160, 100, 100]); upper_red2 = np.array([180, 255, 255])
-        
-        # Azul
-        lower_blue = np.array([90, 80, 80]); upper_blue = np.array([130, 255, 255])
-        
-        # Naranja
-        lower_orange = np.array([10, 100, 100]); upper_orange = np.array([25, 255, 255])
-        
-        masks_helmet = [
-            cv2.inRange(hsv_helmet, lower_white, upper_white),
-            cv2.inRange(hsv_helmet, lower_yellow, upper_yellow),
-            cv2.inRange(hsv_helmet, lower_red1, upper_red1),
-            cv2.inRange(hsv_helmet, lower_red2, upper_red2),
-            cv2.inRange(hsv_helmet, lower_blue, upper_blue),
-            cv2.inRange(hsv_helmet, lower_orange, upper_orange)
-        ]
-        
-        helmet_pixels = sum([cv2.countNonZero(m) for m in masks_helmet])
-        total_helmet_area = hsv_helmet.shape[0] * hsv_helmet.shape[1]
-        
-        # Umbral aumentado a 15% para Casco para filtrar ruido del fondo
-        has_helmet = False
-        if total_helmet_area > 0 and (helmet_pixels / total_helmet_area) > 0.15:
-            has_helmet = True
-
-        # --- Detección de Chaleco (Aumentada a 15% de densidad) ---
-        mask_v_orange = cv2.inRange(hsv_vest, lower_orange, upper_orange)
-        mask_v_yellow = cv2.inRange(hsv_vest, np.array([20, 20, 50]), upper_yellow) 
-        mask_v_red = cv2.bitwise_or(cv2.inRange(hsv_vest, lower_red1, upper_red1), cv2.inRange(hsv_vest, lower_red2, upper_red2))
-        
-        vest_pixels = cv2.countNonZero(mask_v_orange) + cv2.countNonZero(mask_v_yellow) + cv2.countNonZero(mask_v_red)
-        total_vest_area = hsv_vest.shape[0] * hsv_vest.shape[1]
-        
-        # Umbral aumentado a 15% para Chaleco
-        has_vest = False
-        if total_vest_area > 0 and (vest_pixels / total_vest_area) > 0.15:
-            has_vest = True
-                
-        return has_helmet, has_vest
-
-    def detect(self, frame):
+    def detect(self, frame, stream_id='default'):
         if frame is None: return None, {}
-        results = self.model(frame, verbose=False, imgsz=self.imgsz, half=self.half, device=0)
-        annotated_frame = frame.copy()
+        return self.detect_batch([frame], [stream_id])[0]
+
+    def detect_batch(self, frames, stream_ids):
+        """
+        Procesa cuadros de varias cámaras y devuelve una lista de (annotated_frame, stats)
+        alineada con 'frames' (análisis + dibujo en el servidor).
+        """
+        results = []
+        for frame, sid, (detections, stats) in zip(frames, stream_ids, self.analyze_batch(frames, stream_ids)):
+            results.append((self.render(frame, detections, sid), stats))
+        return results
+
+    def analyze_batch(self, frames, stream_ids):
+        """
+        Una sola llamada al modelo para todos los cuadros que la necesitan y luego el análisis
+        (rastreo, EPP, zona, alertas) por cámara, sin dibujar. Devuelve una lista de
+        (detections, stats) alineada con 'frames'; 'detections' es serializable a JSON y
+        render() la dibuja sobre el cuadro.
+        """
+        states = [self.get_stream(sid) for sid in stream_ids]
+
+        # Ejecutar YOLO solo si le toca según infer_every y hay movimiento (o no hay compuerta);
+        # si no, reutilizar detecciones
+        to_infer = [i for i, st in enumerate(states)
+                    if (st.inference_calls == 0 or st.frames_since_inference + 1 >= self.infer_every)
+                    and (st.motion_gate is None or st.motion_gate.should_infer(frames[i]))]
+        if to_infer:
+            start = time.perf_counter()
+            inferred = self._infer_plans([frames[i] for i in to_infer], [states[i] for i in to_infer])
+            _INFERENCE_SECONDS.observe(time.perf_counter() - start)
+            self.batches += 1
+            for i, (boxes, scores) in zip(to_infer, inferred):
+                states[i].last_person_boxes = boxes
+                states[i].last_person_scores = scores
+                states[i].inference_calls += 1
+        for i, st in enumerate(states):
+            st.inferred = i in to_infer
+            st.frames_since_inference = 0 if st.inferred else st.frames_since_inference + 1
+            if not st.inferred:
+                st.inference_skipped += 1
+        self.inference_calls += len(to_infer)
+        self.inference_skipped += len(frames) - len(to_infer)
+        INFERENCE_FRAMES.inc(len(to_infer))
+        if len(frames) > len(to_infer):
+            INFERENCE_SKIPPED.inc(len(frames) - len(to_infer))
+
+        return [self._analyze(frame, st, st.last_person_boxes, sid)
+                for frame, st, sid in zip(frames, states, stream_ids)]
+
+    def _analyze(self, frame, state, person_boxes, stream_id):
+        """
+        Rastreo, verificación de EPP y zona y alertas de un cuadro de una cámara.
+        El cuadro solo se dibuja (para la captura) si hay una alerta nueva.
+        """
         stats = {'total_persons': 0, 'violations': 0, 'alerts': []}
-        current_violations = 0
-        violation_types = []
 
         h_img, w_img, _ = frame.shape
-        danger_zone_x = int(w_img * 0.7) 
-
-        for r in results:
-            for box in r.boxes:
-                if int(box.cls[0]) == 0: # Persona
-                    stats['total_persons'] += 1
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    
-                    # Verificación de Zona (Centro)
-                    x_mid = (x1 + x2) // 2
-                    is_in_danger_zone = x_mid > danger_zone_x
-                    
-                    has_helmet, has_vest = self.check_ppe(frame, x1, y1, x2, y2)
-                    
-                    # LOGICA CRÍTICA: Seguro SOLO si tiene AMBOS
-                    has_all_ppe = has_helmet and has_vest
-                    
-                    is_warning = False
-                    is_safe = False
-                    
-                    if not has_all_ppe:
-                        # Si falta cualquier cosa, es PELIGRO (Rojo)
-                        is_safe = False; is_warning = False
-                    elif is_in_danger_zone:
-                        # Si tiene todo pero está en zona, es AVISO (Amarillo)
-                        is_safe = False; is_warning = True
-                    else:
-                        # Solo si tiene todo Y está fuera de zona es SEGURO (Verde)
-                        is_safe = True; is_warning = False
-
-                    label_parts = []
-                    if not has_helmet: label_parts.append("SIN CASCO")
-                    if not has_vest: label_parts.append("SIN CHALECO")
-                    if is_in_danger_zone: label_parts.append("ZONA PELIGROSA")
-
-                    if is_safe:
-                        color = self.colors['safe']; label = "Seguro"
-                    elif is_warning:
-                        color = self.colors['warning']; reason = ", ".join(label_parts)
-                        label = f"AVISO: {reason}"
-                        stats['violations'] += 1; current_violations += 1
-                        stats['alerts'].append(f"Aviso: {reason}"); violation_types.append(reason)
-                    else:
-                        color = self.colors['danger']; reason = ", ".join(label_parts)
-                        label = f"PELIGRO: {reason}"
-                        stats['violations'] += 1; current_violations += 1
-                        stats['alerts'].append(f"Peligro: {reason}"); violation_types.append(reason)
-
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(annotated_frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+        # Zonas de todas las personas en una sola consulta a la máscara precalculada
+        in_zones = state.zones.lookup(person_boxes, w_img, h_img)
+
+        # Asociar detecciones con personas rastreadas
+        tracks = state.tracker.update(person_boxes)
+
+        # Análisis de EPP en una sola pasada, solo para las personas que lo necesitan
+        to_check = [i for i, t in enumerate(tracks) if t.needs_ppe_check(self.ppe_interval, self.ppe_min_iou)]
+        if to_check:
+            start = time.perf_counter()
+            helmets, vests, helmet_ratios, vest_ratios = self.ppe.classify(frame, [person_boxes[i] for i in to_check])
+            _PPE_SECONDS.observe(time.perf_counter() - start)
+            for j, i in enumerate(to_check):
+                tracks[i].update_ppe(bool(helmets[j]), bool(vests[j]), float(helmet_ratios[j]),
+                                     float(vest_ratios[j]), self.ppe_confirm_frames)
+
+        now = self.clock()
+        pending_alerts = []
+        persons = []
+
+        for i, (x1, y1, x2, y2) in enumerate(person_boxes):
+            stats['total_persons'] += 1
+            track = tracks[i]
+            
+            # Verificación de Zona (según el modo de cada zona: pies, centro o superposición)
+            is_in_danger_zone = bool(in_zones[i].any())
+            
+            has_helmet, has_vest = track.has_helmet, track.has_vest
+            
+            # LOGICA CRÍTICA: Seguro SOLO si tiene AMBOS
+            has_all_ppe = has_helmet and has_vest
+            
+            is_warning = False
+            is_safe = False
+            
+            if not has_all_ppe:
+                # Si falta cualquier cosa, es PELIGRO (Rojo)
+                is_safe = False; is_warning = False
+            elif is_in_danger_zone:
+                # Si tiene todo pero está en zona, es AVISO (Amarillo)
+                is_safe = False; is_warning = True
+            else:
+                # Solo si tiene todo Y está fuera de zona es SEGURO (Verde)
+                is_safe = True; is_warning = False
+
+            label_parts = []
+            if not has_helmet: label_parts.append("SIN CASCO")
+            if not has_vest: label_parts.append("SIN CHALECO")
+            if is_in_danger_zone: label_parts.append("ZONA PELIGROSA")
+
+            if is_safe:
+                status = 'safe'; label = f"#{track.track_id} Seguro"
+            elif is_warning:
+                status = 'warning'; reason = ", ".join(label_parts)
+                label = f"#{track.track_id} AVISO: {reason}"
+                stats['violations'] += 1
+                stats['alerts'].append(f"Aviso: {reason}")
+            else:
+                status = 'danger'; reason = ", ".join(label_parts)
+                label = f"#{track.track_id} PELIGRO: {reason}"
+                stats['violations'] += 1
+                stats['alerts'].append(f"Peligro: {reason}")
+
+            # Enfriamiento por persona y por tipo de violación: un registro por evento real
+            if not is_safe:
+                new_parts = [p for p in label_parts if track.should_alert(p, now, self.alert_cooldown)]
+                if new_parts:
+                    pending_alerts.append((track.track_id, ", ".join(new_parts)))
+
+            persons.append({
+                'id': track.track_id,
+                'box': [int(x1), int(y1), int(x2), int(y2)],
+                'helmet': bool(has_helmet),
+                'vest': bool(has_vest),
+                'in_zone': is_in_danger_zone,
+                'zones': [state.zones.zones[j]['name'] for j in np.flatnonzero(in_zones[i])],
+                'status': status,
+                'label': label
+            })
+
+        if self.detection_log is not None:
+            measured = np.zeros(len(tracks), dtype=bool)
+            measured[to_check] = True
+            self.detection_log.append(
+                stream_id, tuple(zone['name'] for zone in state.zones.zones), now, w_img, h_img, state.inferred,
+                person_boxes, [t.track_id for t in tracks], state.last_person_scores,
+                [t.helmet_ratio for t in tracks], [t.vest_ratio for t in tracks],
+                [bool(t.has_helmet) for t in tracks], [bool(t.has_vest) for t in tracks], measured, in_zones)
+
+        current_time = self.clock()
+        fps = 1 / max(current_time - state.last_frame_time, 1e-6)
+        state.last_frame_time = current_time
+
+        # Resumen compacto del cuadro (se envía tal cual al panel para dibujarlo en el navegador)
+        detections = {
+            'width': w_img,
+            'height': h_img,
+            'time': round(current_time, 3),
+            'fps': int(fps),
+            'zones': state.zones.describe(w_img, h_img),
+            'persons': persons
+        }
+
+        if pending_alerts:
+            annotated_frame = self.render(frame, detections, stream_id)
+            camera_note = f", cámara {stream_id}" if stream_id != 'default' else ""
+            # Un clip por cuadro con alertas (las alertas cercanas de la cámara lo comparten)
+            clip_path = self.clip_recorder.request(stream_id, current_time) if self.clip_recorder is not None else None
+            for track_id, v_type in pending_alerts:
+                self.save_alert(annotated_frame, v_type, f"Violación detectada: {v_type} (persona #{track_id}{camera_note})",
+                                clip_path=clip_path)
+
+        return detections, stats
+
+    def render(self, frame, detections, stream_id='default', out=None):
+        """
+        Dibuja sobre una copia del cuadro las personas, las zonas de la cámara, la hora y los
+        FPS descritos en 'detections'. Con 'out' (arreglo del mismo tamaño, p. ej. un búfer
+        reutilizable del llamador) la copia se hace ahí en lugar de asignar uno nuevo.
+        """
+        start = time.perf_counter()
+        if out is not None and out.shape == frame.shape and out.dtype == frame.dtype:
+            np.copyto(out, frame)
+            annotated_frame = out
+        else:
+            annotated_frame = frame.copy()
+        h_img = annotated_frame.shape[0]
+
+        for person in detections['persons']:
+            x1, y1, x2, y2 = person['box']
+            color = self.colors[person['status']]
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(annotated_frame, person['label'], (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
         
-        # Visualización Zona
-        overlay = annotated_frame.copy()
-        cv2.rectangle(overlay, (danger_zone_x, 0), (w_img, h_img), (0, 0, 255), -1)
-        cv2.addWeighted(overlay, 0.2, annotated_frame, 0.8, 0, annotated_frame)
-        cv2.line(annotated_frame, (danger_zone_x, 0), (danger_zone_x, h_img), (0, 0, 255), 2)
-        cv2.putText(annotated_frame, "ZONA DE PELIGRO", (danger_zone_x + 10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Visualización Zona (capas pre-dibujadas, mezcladas solo en la región de las zonas)
+        self.get_stream(stream_id).zones.draw(annotated_frame)
+
+        timestamp = datetime.fromtimestamp(detections['time']).strftime("%Y-%m-%d %H:%M:%S")
         cv2.putText(annotated_frame, timestamp, (10, h_img - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        
-        current_time = time.time()
-        fps = 1 / (current_time - self.last_frame_time) if hasattr(self, 'last_frame_time') else 0
-        self.last_frame_time = current_time
-        cv2.putText(annotated_frame, f"FPS: {int(fps)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-        if current_violations > 0 and (time.time() - self.last_alert_time > self.alert_cooldown):
-            v_type = violation_types[0] if violation_types else "Violación de Seguridad"
-            self.save_alert(annotated_frame, v_type)
-            self.last_alert_time = time.time()
-
-        return annotated_frame, stats
-
-    def save_alert(self, frame, incident_type):
-        """
-        Guarda una imagen del incidente en el disco y registra el evento en la base de datos.
-        """
-        try:
-            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"capture_{timestamp_str}.jpg"
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            save_dir = os.path.join(base_dir, 'static/captures')
-            filepath = os.path.join(save_dir, filename)
-            web_path = f"captures/{filename}" 
-            if not os.path.exists(save_dir): os.makedirs(save_dir, exist_ok=True)
-            if cv2.imwrite(filepath, frame):
-                print(f"✅ Imagen de alerta guardada: {filepath}")
-                log_incident(incident_type, web_path, f"Violación detectada: {incident_type}")
-        except Exception as e:
-            print(f"❌ Error en save_alert: {e}")
+        cv2.putText(annotated_frame, f"FPS: {detections['fps']}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        _RENDER_SECONDS.observe(time.perf_counter() - start)
+        return annotated_frame
+
+    def get_stats(self):
+        """
+        Contadores de inferencia (llamadas al modelo, cuadros omitidos por la compuerta de movimiento).
+        """
+        total = self.inference_calls + self.inference_skipped
+        return {
+            'inference_calls': self.inference_calls,
+            'inference_skipped': self.inference_skipped,
+            'skip_ratio': round(self.inference_skipped / total, 3) if total else 0.0,
+            'batches': self.batches,
+            'avg_batch_size': round(self.inference_calls / self.batches, 2) if self.batches else 0.0,
+            'avg_crops_per_frame': round(self.inference_crops / self.inference_calls, 2) if self.inference_calls else 0.0,
+            'active_tracks': sum(len(st.tracker.tracks) for st in self.streams.values()),
+            'backend': self.backend.describe() if self.backend is not None else None,
+            'incident_writer': self.incident_writer.get_stats(),
+            'clips': self.clip_recorder.get_stats() if self.clip_recorder is not None else None,
+            'detection_log': self.detection_log.get_stats() if self.detection_log is not None else None
+        }
+
+    def get_stream_stats(self, stream_id):
+        """
+        Contadores de inferencia de una cámara.
+        """
+        state = self.get_stream(stream_id)
+        total = state.inference_calls + state.inference_skipped
+        return {
+            'inference_calls': state.inference_calls,
+            'inference_skipped': state.inference_skipped,
+            'skip_ratio': round(state.inference_skipped / total, 3) if total else 0.0,
+            'active_tracks': len(state.tracker.tracks),
+            'inference_plan': state.inference_plan.describe() if state.inference_plan.tiled else None
+        }
+
+    def save_alert(self, frame, incident_type, details=None, clip_path=None):
+        """
+        Encola una copia del cuadro del incidente; la imagen se guarda en disco y el evento
+        se registra en la base de datos desde el hilo del IncidentWriter.
+        clip_path: ruta web del clip reservado con ClipRecorder.request (se escribe más tarde).
+        """
+        if not self.incident_writer.submit(frame, incident_type, details, clip_path=clip_path):
+            print(f"⚠️ Incidente descartado (cola de escritura llena): {incident_type}")
@@ -0,0 +1,61 @@
+import json
+import threading
+from collections import deque
+from metrics import STREAM_CLIENTS
+
+_SSE_CLIENTS = STREAM_CLIENTS.labels(kind='sse')
+
+# Bus de Eventos para Server-Sent Events (SSE)
+# El pipeline de detección y el escritor de incidentes publican eventos solo cuando algo cambia;
+# cada navegador conectado a /api/stats/stream los recibe por una conexión HTTP persistente.
+# El costo es proporcional al número de eventos, no a espectadores × segundos.
+class EventBus:
+    def __init__(self, history=256):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self.subscribers = 0
+        self.published = 0
+
+    def publish(self, event, data):
+        """
+        Publica un evento con nombre 'event' y contenido serializable a JSON.
+        """
+        payload = json.dumps(data)
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event, payload))
+            self.published += 1
+            self._cond.notify_all()
+
+    def _events_after(self, last_seq):
+        return [e for e in self._events if e[0] > last_seq]
+
+    def stream(self, initial=None, heartbeat=15.0):
+        """
+        Generador SSE por cliente. 'initial' es una lista opcional de (evento, datos) que se
+        envía primero (estado inicial). Si el cliente es demasiado lento y el historial se
+        desborda, los eventos más antiguos se pierden y el cliente recibe solo los recientes.
+        """
+        with self._cond:
+            self.subscribers += 1
+            last_seq = self._seq
+        _SSE_CLIENTS.inc()
+        try:
+            for event, data in initial or []:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > last_seq, heartbeat)
+                    pending = self._events_after(last_seq)
+                if not pending:
+                    # Comentario SSE para mantener viva la conexión (proxies, túnel ngrok)
+                    yield ": ping\n\n"
+                    continue
+                for seq, event, payload in pending:
+                    yield f"id: {seq}\nevent: {event}\ndata: {payload}\n\n"
+                last_seq = pending[-1][0]
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+            _SSE_CLIENTS.dec()
@@ -0,0 +1,229 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# Búfer Circular en Memoria Compartida
+# Intercambia cuadros entre procesos sin serializarlos: 'slots' ranuras preasignadas del
+# tamaño de un cuadro (por defecto 640x480x3) dentro de un bloque multiprocessing.shared_memory.
+# Un único escritor llena las ranuras en orden; cada ranura tiene en la cabecera su número de
+# secuencia, marca de tiempo y longitud. Los lectores piden "el último cuadro posterior a N"
+# y reciben una vista NumPy de la ranura (sin copia) o una copia.
+#
+# Protocolo (seqlock): el escritor marca la ranura con secuencia -1 mientras la llena y publica
+# la secuencia definitiva al terminar; el lector comprueba la secuencia antes y después de
+# leer. Una vista sin copia sigue siendo válida mientras el escritor no dé la vuelta al anillo
+# (slots - 1 cuadros); is_valid(seq) permite comprobarlo después de usarla.
+HEADER_DTYPE = np.dtype([('seq', '<i8'), ('time', '<f8'), ('nbytes', '<i8'), ('aux_nbytes', '<i8')])
+ALIGN = 64
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+class SharedFrameRing:
+    def __init__(self, shape=(480, 640, 3), dtype=np.uint8, slots=8, name=None, create=True):
+        """
+        shape, dtype: forma de cada ranura (también es la capacidad en bytes para write_bytes).
+        slots: número de ranuras del anillo.
+        name: nombre del bloque compartido; con create=False se adjunta a uno existente.
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.slot_bytes = _align(int(np.prod(self.shape)) * self.dtype.itemsize)
+        self._header_bytes = _align(8 + slots * HEADER_DTYPE.itemsize)
+        size = self._header_bytes + slots * self.slot_bytes
+
+        self._owner = create
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        if not create:
+            # Solo el creador debe liberar el bloque (Python < 3.13 lo registraría también aquí)
+            try:
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+            except Exception:
+                pass
+
+        buf = self._shm.buf
+        self._head = np.ndarray((1,), dtype='<i8', buffer=buf, offset=0)
+        self._header = np.ndarray((slots,), dtype=HEADER_DTYPE, buffer=buf, offset=8)
+        self._payload = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=buf, offset=self._header_bytes)
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._frames = [self._payload[i, :frame_bytes].view(self.dtype).reshape(self.shape) for i in range(slots)]
+        if create:
+            self._head[0] = 0
+            self._header['seq'] = 0
+
+        # Métricas locales del proceso
+        self.writes = 0
+        self.reads = 0
+        self.retries = 0
+
+    def __reduce__(self):
+        # Al pasar el anillo a un proceso iniciado con 'spawn' se adjunta por nombre
+        return (SharedFrameRing, (self.shape, self.dtype.str, self.slots, self.name, False))
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def spec(self):
+        """
+        Parámetros para adjuntarse al mismo anillo desde otro proceso: SharedFrameRing(**spec, create=False).
+        """
+        return {'shape': self.shape, 'dtype': self.dtype.str, 'slots': self.slots, 'name': self.name}
+
+    @property
+    def head(self):
+        """
+        Secuencia del último cuadro publicado (0 si aún no hay ninguno).
+        """
+        return int(self._head[0])
+
+    # Escritura (un solo proceso escritor)
+
+    def begin_write(self):
+        """
+        Reserva la siguiente ranura y devuelve (seq, vista) para llenarla en su lugar
+        (por ejemplo con cv2.resize(..., dst=vista)). Se publica con commit().
+        """
+        seq = self.head + 1
+        slot = seq % self.slots
+        self._header['seq'][slot] = -1
+        return seq, self._frames[slot]
+
+    def commit(self, seq, timestamp=None, nbytes=0, aux_nbytes=0):
+        slot = seq % self.slots
+        self._header['time'][slot] = time.time() if timestamp is None else timestamp
+        self._header['nbytes'][slot] = nbytes
+        self._header['aux_nbytes'][slot] = aux_nbytes
+        self._header['seq'][slot] = seq
+        self._head[0] = seq
+        self.writes += 1
+        return seq
+
+    def write(self, frame, timestamp=None):
+        """
+        Copia un cuadro (de la forma del anillo) a la siguiente ranura y lo publica.
+        """
+        seq, view = self.begin_write()
+        np.copyto(view, frame)
+        return self.commit(seq, timestamp)
+
+    def write_bytes(self, data, aux=b'', timestamp=None):
+        """
+        Publica un bloque de bytes de longitud variable (por ejemplo un JPEG) y datos auxiliares.
+        """
+        total = len(data) + len(aux)
+        if total > self.slot_bytes:
+            raise ValueError(f"El bloque ({total} bytes) no cabe en la ranura ({self.slot_bytes} bytes)")
+        seq = self.head + 1
+        slot = seq % self.slots
+        self._header['seq'][slot] = -1
+        payload = self._payload[slot]
+        payload[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        if aux:
+            payload[len(data):total] = np.frombuffer(aux, dtype=np.uint8)
+        return self.commit(seq, timestamp, len(data), len(aux))
+
+    # Lectura (cualquier número de lectores)
+
+    def is_valid(self, seq):
+        """
+        True si la ranura de 'seq' todavía contiene ese cuadro (no fue sobrescrita).
+        """
+        return int(self._header['seq'][seq % self.slots]) == seq
+
+    def _latest_slot(self, after_seq):
+        """
+        Devuelve (seq, slot) del último cuadro publicado posterior a 'after_seq', o (None, None).
+        """
+        seq = self.head
+        if seq <= after_seq:
+            return None, None
+        return seq, seq % self.slots
+
+    def read(self, after_seq=0, copy=True, out=None):
+        """
+        Devuelve (seq, cuadro, marca de tiempo) del último cuadro posterior a 'after_seq',
+        o (after_seq, None, None) si no hay uno nuevo. Con copy=False el cuadro es una vista
+        de la memoria compartida; con 'out' (arreglo de la forma del anillo) la copia se hace
+        ahí en lugar de asignar uno nuevo.
+        """
+        for _ in range(self.slots):
+            seq, slot = self._latest_slot(after_seq)
+            if seq is None:
+                return after_seq, None, None
+            if not self.is_valid(seq):
+                self.retries += 1
+                continue
+            timestamp = float(self._header['time'][slot])
+            if not copy:
+                frame = self._frames[slot]
+            elif out is not None:
+                frame = out
+                np.copyto(out, self._frames[slot])
+            else:
+                frame = self._frames[slot].copy()
+            if copy and not self.is_valid(seq):
+                # El escritor dio la vuelta mientras copiábamos: reintentar con el más reciente
+                self.retries += 1
+                continue
+            self.reads += 1
+            return seq, frame, timestamp
+        return after_seq, None, None
+
+    def read_bytes(self, after_seq=0):
+        """
+        Devuelve (seq, datos, auxiliares, marca de tiempo) del último bloque posterior a
+        'after_seq', o (after_seq, None, None, None) si no hay uno nuevo. Siempre copia.
+        """
+        for _ in range(self.slots):
+            seq, slot = self._latest_slot(after_seq)
+            if seq is None:
+                return after_seq, None, None, None
+            header = self._header[slot]
+            timestamp, nbytes, aux_nbytes = float(header['time']), int(header['nbytes']), int(header['aux_nbytes'])
+            payload = self._payload[slot]
+            data = payload[:nbytes].tobytes()
+            aux = payload[nbytes:nbytes + aux_nbytes].tobytes()
+            if not self.is_valid(seq):
+                self.retries += 1
+                continue
+            self.reads += 1
+            return seq, data, aux, timestamp
+        return after_seq, None, None, None
+
+    def wait(self, after_seq, timeout=1.0, poll_interval=0.001):
+        """
+        Espera (sondeando) hasta que haya un cuadro posterior a 'after_seq'. Devuelve True si lo hay.
+        """
+        deadline = time.monotonic() + timeout
+        while self.head <= after_seq:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    def get_stats(self):
+        return {
+            'head': self.head,
+            'slots': self.slots,
+            'writes': self.writes,
+            'reads': self.reads,
+            'retries': self.retries
+        }
+
+    def close(self):
+        # Soltar las vistas antes de cerrar el bloque (si no, BufferError)
+        self._head = self._header = self._payload = None
+        self._frames = []
+        try:
+            self._shm.close()
+        except BufferError:
+            pass
+
+    def unlink(self):
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
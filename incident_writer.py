@@ -0,0 +1,186 @@
+import os
+import time
+import queue
+import threading
+from datetime import datetime
+from database import log_incidents
+from metrics import ALERTS_DROPPED, ALERTS_WRITTEN, STAGE_SECONDS
+from storage import CaptureStore
+
+_DB_WRITE_SECONDS = STAGE_SECONDS.labels(stage='db_write')
+
+# Escritor Asíncrono de Incidentes
+# Saca del bucle de video la escritura de la imagen (cv2.imwrite) y el INSERT en SQLite.
+# El bucle de detección solo copia el cuadro y lo encola; un hilo en segundo plano codifica,
+# guarda la imagen (y su miniatura, ver storage.py) y registra los incidentes en lotes dentro
+# de una sola transacción.
+#
+# Política de contrapresión: como máximo 'max_pending_images' cuadros esperan en memoria.
+# Si el disco es lento y se alcanza el límite, el incidente se registra igual pero sin imagen;
+# si además la cola supera 'max_queue' elementos, el incidente se descarta y se cuenta.
+class IncidentWriter:
+    def __init__(self, save_dir=None, max_pending_images=8, max_queue=1000, batch_size=32, jpeg_quality=90,
+                 on_written=None, store=None):
+        """
+        on_written: función opcional llamada desde el hilo escritor con la lista de incidentes
+        (diccionarios con id, timestamp, type, image_path, details, clip_path) recién registrados.
+        store: CaptureStore donde se guardan las capturas (compartido con los clips); si no se
+        indica se crea uno en la carpeta que contiene 'save_dir' (por defecto 'static/').
+        """
+        self.store = store or CaptureStore(root=os.path.dirname(os.path.normpath(save_dir)) if save_dir else None)
+        self.max_pending_images = max_pending_images
+        self.batch_size = batch_size
+        self.jpeg_quality = jpeg_quality
+        self.on_written = on_written
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._pending_images = 0
+        self._stopped = False
+
+        # Métricas
+        self.submitted = 0
+        self.written = 0
+        self.images_written = 0
+        self.images_dropped = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self.last_write_ms = 0.0
+        self.max_write_ms = 0.0
+        self._total_write_ms = 0.0
+        self._batches = 0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, incident_type, details="", clip_path=None):
+        """
+        Encola un incidente. Toma una copia del cuadro para que el llamador pueda reutilizarlo.
+        Nunca bloquea: devuelve False si el incidente tuvo que descartarse.
+        clip_path: ruta web opcional del clip de video del incidente (ver clips.py).
+        """
+        timestamp = datetime.now()
+        snapshot = None
+        with self._lock:
+            self.submitted += 1
+            if frame is not None and self._pending_images < self.max_pending_images:
+                self._pending_images += 1
+                snapshot = frame.copy()
+            elif frame is not None:
+                self.images_dropped += 1
+        try:
+            self._queue.put_nowait((timestamp, incident_type, details, snapshot, clip_path))
+            return True
+        except queue.Full:
+            ALERTS_DROPPED.inc()
+            with self._lock:
+                self.dropped += 1
+                if snapshot is not None:
+                    self._pending_images -= 1
+            return False
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [item]
+            # Agrupar lo que ya esté esperando para registrarlo en una sola transacción
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        start = time.perf_counter()
+        rows = []
+        for timestamp, incident_type, details, snapshot, clip_path in batch:
+            web_path = None
+            if snapshot is not None:
+                web_path = self._write_image(timestamp, snapshot)
+                with self._lock:
+                    self._pending_images -= 1
+            rows.append((timestamp.isoformat(), incident_type, web_path, details or f"Violación detectada: {incident_type}",
+                         clip_path))
+
+        db_start = time.perf_counter()
+        ids = log_incidents(rows)
+        _DB_WRITE_SECONDS.observe(time.perf_counter() - db_start)
+        if ids is not None:
+            self.written += len(rows)
+            ALERTS_WRITTEN.inc(len(rows))
+            if self.on_written is not None:
+                self._notify(ids, rows)
+        else:
+            self.failed += len(rows)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.last_batch_size = len(batch)
+        self.last_write_ms = elapsed_ms
+        self.max_write_ms = max(self.max_write_ms, elapsed_ms)
+        self._total_write_ms += elapsed_ms
+        self._batches += 1
+
+    def _notify(self, ids, rows):
+        try:
+            self.on_written([{
+                'id': incident_id,
+                'timestamp': row[0],
+                'type': row[1],
+                'image_path': row[2],
+                'details': row[3],
+                'clip_path': row[4]
+            } for incident_id, row in zip(ids, rows)])
+        except Exception as e:
+            print(f"❌ Error al notificar incidentes: {e}")
+
+    def _write_image(self, timestamp, frame):
+        """
+        Codifica y guarda la captura. Devuelve la ruta web relativa a 'static/' o None si falló.
+        """
+        try:
+            web_path = self.store.save_image(timestamp, frame, self.jpeg_quality)
+            if web_path is not None:
+                self.images_written += 1
+                print(f"✅ Imagen de alerta guardada: {web_path}")
+                return web_path
+        except Exception as e:
+            print(f"❌ Error al guardar imagen de alerta: {e}")
+        return None
+
+    def flush(self, timeout=5.0):
+        """
+        Espera a que la cola se vacíe (útil al apagar y en benchmarks).
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                done = self.written + self.failed + self.dropped >= self.submitted
+            if done:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def stop(self):
+        self.flush()
+        self._stopped = True
+
+    def get_stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'pending_images': self._pending_images,
+            'submitted': self.submitted,
+            'written': self.written,
+            'images_written': self.images_written,
+            'images_dropped': self.images_dropped,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'last_batch_size': self.last_batch_size,
+            'last_write_ms': round(self.last_write_ms, 2),
+            'avg_write_ms': round(self._total_write_ms / self._batches, 2) if self._batches else 0.0,
+            'max_write_ms': round(self.max_write_ms, 2),
+            'storage': self.store.get_stats()
+        }
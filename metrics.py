@@ -0,0 +1,284 @@
+import math
+import threading
+
+# Métricas del Pipeline (formato de texto de Prometheus)
+# Temporizadores por etapa agregados en histogramas de cubetas logarítmicas al estilo HDR:
+# cada potencia de 2 se divide en SUB_BUCKETS cubetas lineales, así que el error relativo de
+# un percentil es menor que 1/SUB_BUCKETS en todo el rango (61 µs a 64 s). Registrar una
+# observación es O(1) y no asigna memoria: un frexp para elegir la cubeta y un incremento.
+# Además hay contadores (cuadros descartados, inferencias omitidas, alertas escritas) y
+# medidores (clientes conectados). /metrics los expone con render().
+#
+# En el modo de procesos separados cada proceso hijo envía periódicamente snapshot() al
+# proceso web, que lo registra con set_remote() y lo suma a sus propias métricas al exponerlas.
+MIN_EXPONENT = -14   # 2^-14 s ≈ 61 µs: límite de la primera cubeta
+MAX_EXPONENT = 6     # 2^6 s = 64 s: lo que lo supera cae en +Inf
+SUB_BUCKETS = 4
+BOUNDS = [2.0 ** MIN_EXPONENT] + [2.0 ** e * (1 + (k + 1) / SUB_BUCKETS)
+                                  for e in range(MIN_EXPONENT, MAX_EXPONENT) for k in range(SUB_BUCKETS)]
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def reset(self):
+        self.value = 0.0
+
+
+class Gauge(Counter):
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket(value):
+        """
+        Índice de la primera cubeta cuyo límite superior es >= value.
+        """
+        if value <= BOUNDS[0]:
+            return 0
+        if value > BOUNDS[-1]:
+            return len(BOUNDS)
+        mantissa, exponent = math.frexp(value)       # value = mantissa * 2^exponent, mantissa en [0.5, 1)
+        octave = exponent - 1 - MIN_EXPONENT
+        # Un valor justo en el límite pertenece a la cubeta anterior (semántica 'le')
+        return 1 + octave * SUB_BUCKETS + math.ceil((mantissa * 2 - 1) * SUB_BUCKETS) - 1
+
+    def observe(self, seconds):
+        index = self.bucket(seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        return (list(self.counts), self.sum, self.count)
+
+    def reset(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+def _quantile(counts, count, q):
+    """
+    Percentil aproximado (límite superior de la cubeta) a partir de los conteos por cubeta.
+    """
+    if not count:
+        return 0.0
+    rank = q * count
+    seen = 0
+    for index, n in enumerate(counts):
+        seen += n
+        if seen >= rank and n:
+            return BOUNDS[index] if index < len(BOUNDS) else math.inf
+    return math.inf
+
+
+class MetricFamily:
+    KINDS = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+
+    def __init__(self, name, kind, help_text, labelnames=()):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Una familia sin etiquetas tiene una sola serie: exponerla desde el inicio (en 0)
+            self.labels()
+
+    def labels(self, **values):
+        """
+        Serie con esos valores de etiqueta (se crea la primera vez). Conviene guardarla en una
+        variable fuera de los bucles calientes.
+        """
+        key = tuple(str(values[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self.KINDS[self.kind]())
+        return child
+
+    # Atajos para familias sin etiquetas
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def observe(self, seconds):
+        self.labels().observe(seconds)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def snapshot(self):
+        return {key: child.snapshot() for key, child in list(self._children.items())}
+
+    def reset(self):
+        for child in list(self._children.values()):
+            child.reset()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.families = {}
+        self._remote = {}
+        self._lock = threading.Lock()
+
+    def _family(self, name, kind, help_text, labelnames):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = MetricFamily(name, kind, help_text, labelnames)
+        return family
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._family(name, 'counter', help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._family(name, 'gauge', help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=()):
+        return self._family(name, 'histogram', help_text, labelnames)
+
+    def snapshot(self):
+        """
+        Valores de todas las series (serializable con pickle, para enviarlo entre procesos).
+        """
+        return {name: family.snapshot() for name, family in self.families.items()}
+
+    def set_remote(self, source, snapshot):
+        """
+        Registra el último snapshot de otro proceso; se suma a las métricas locales.
+        """
+        with self._lock:
+            self._remote[source] = snapshot
+
+    def reset(self):
+        """
+        Pone todo en cero (al iniciar un proceso hijo creado con fork).
+        """
+        for family in self.families.values():
+            family.reset()
+        with self._lock:
+            self._remote = {}
+
+    def merged(self, name):
+        """
+        Series de una familia sumando este proceso y los snapshots remotos: {etiquetas: valor}.
+        """
+        family = self.families[name]
+        with self._lock:
+            sources = [family.snapshot()] + [remote.get(name, {}) for remote in self._remote.values()]
+        merged = {}
+        for source in sources:
+            for key, value in source.items():
+                if family.kind != 'histogram':
+                    merged[key] = merged.get(key, 0.0) + value
+                    continue
+                counts, total, count = merged.get(key, ([0] * (len(BOUNDS) + 1), 0.0, 0))
+                merged[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1], count + value[2])
+        return merged
+
+    def summary(self, name, quantiles=(0.5, 0.95, 0.99)):
+        """
+        Resumen legible de un histograma: {etiqueta: {'count', 'p50_ms', ...}}.
+        """
+        result = {}
+        for key, (counts, total, count) in sorted(self.merged(name).items()):
+            entry = {'count': count, 'avg_ms': round(total / count * 1000, 3) if count else 0.0}
+            for q in quantiles:
+                entry[f"p{int(q * 100)}_ms"] = round(_quantile(counts, count, q) * 1000, 3)
+            result[','.join(key) or name] = entry
+        return result
+
+    def render(self):
+        """
+        Todas las métricas en el formato de texto de Prometheus (versión 0.0.4).
+        """
+        lines = []
+        for name, family in self.families.items():
+            lines.append(f"# HELP {name} {family.help}")
+            lines.append(f"# TYPE {name} {family.kind}")
+            for key, value in sorted(self.merged(name).items()):
+                labels = [f'{label}="{_escape(v)}"' for label, v in zip(family.labelnames, key)]
+                if family.kind != 'histogram':
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, n in zip(BOUNDS, counts):
+                    cumulative += n
+                    le = 'le="%.6g"' % bound
+                    lines.append(f"{name}_bucket{_labels(labels + [le])} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{_labels(labels + [le])} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# Registro del proceso y métricas del pipeline
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'safeguard_stage_seconds',
+    "Duración de cada etapa: capture (lectura de la cámara, incluye la espera del sensor), inference "
+    "(llamada al modelo por lote), ppe, render, encode (JPEG por perfil) y db_write (lote de incidentes)",
+    ['stage'])
+FRAME_LATENCY_SECONDS = REGISTRY.histogram(
+    'safeguard_frame_latency_seconds', "Tiempo desde la captura hasta que el cuadro quedó procesado y codificado")
+FRAMES_CAPTURED = REGISTRY.counter('safeguard_frames_captured_total', "Cuadros leídos de las cámaras")
+FRAMES_PROCESSED = REGISTRY.counter('safeguard_frames_processed_total', "Cuadros procesados por el pipeline")
+FRAMES_DROPPED = REGISTRY.counter(
+    'safeguard_frames_dropped_total',
+    "Cuadros descartados: pipeline (capturados y nunca procesados) o client (no enviados a un espectador lento o limitado en FPS)",
+    ['reason'])
+INFERENCE_FRAMES = REGISTRY.counter('safeguard_inference_frames_total', "Cuadros enviados al modelo")
+INFERENCE_SKIPPED = REGISTRY.counter(
+    'safeguard_inference_skipped_total', "Cuadros sin inferencia (compuerta de movimiento o planificador adaptativo)")
+ALERTS_WRITTEN = REGISTRY.counter('safeguard_alerts_written_total', "Incidentes registrados en la base de datos")
+ALERTS_DROPPED = REGISTRY.counter('safeguard_alerts_dropped_total', "Incidentes descartados (cola de escritura llena)")
+STREAM_CLIENTS = REGISTRY.gauge(
+    'safeguard_stream_clients', "Clientes conectados: mjpeg (video) o sse (estadísticas y detecciones)", ['kind'])
+QUALITY_LEVEL = REGISTRY.gauge(
+    'safeguard_quality_level', "Nivel de degradación del planificador adaptativo (0 = calidad completa; ver scheduler.py)")
+QUALITY_CHANGES = REGISTRY.counter(
+    'safeguard_quality_changes_total', "Cambios de nivel del planificador: degrade (fuera de presupuesto) o restore (con margen)",
+    ['direction'])
+SCHEDULER_LOAD = REGISTRY.gauge(
+    'safeguard_scheduler_load', "Fracción del presupuesto de latencia/FPS usada por los lotes recientes (> 1 = fuera de presupuesto)")
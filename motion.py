@@ -0,0 +1,67 @@
+import cv2
+import time
+
+# Compuerta de Movimiento
+# Decide si vale la pena ejecutar YOLO en el cuadro actual. Compara una versión reducida en
+# escala de grises del cuadro con la del último cuadro que pasó por el detector: si la escena
+# no cambió, se reutilizan las detecciones anteriores. Un temporizador fuerza la inferencia
+# cada 'max_interval' segundos para no depender indefinidamente de detecciones antiguas.
+class MotionGate:
+    def __init__(self, threshold=0.005, pixel_threshold=25, size=(160, 120), max_interval=1.0, clock=time.time):
+        """
+        threshold: fracción mínima de píxeles cambiados para considerar que hay movimiento.
+        pixel_threshold: diferencia mínima de intensidad (0-255) para marcar un píxel como cambiado.
+        size: resolución reducida (ancho, alto) en la que se compara.
+        max_interval: segundos máximos sin inferencia aunque la escena esté estática.
+        clock: función que devuelve el tiempo actual (reemplazable en benchmarks).
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.max_interval = max_interval
+        self.clock = clock
+        self._reference = None
+        self._last_infer_time = 0.0
+        self.last_motion = 0.0
+        self.frames = 0
+        self.skipped = 0
+
+    def _prepare(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, frame, now=None):
+        """
+        Devuelve True si se debe ejecutar el detector sobre este cuadro.
+        """
+        now = self.clock() if now is None else now
+        self.frames += 1
+        gray = self._prepare(frame)
+
+        if self._reference is None or self._reference.shape != gray.shape:
+            motion = 1.0
+        else:
+            diff = cv2.absdiff(gray, self._reference)
+            _, changed = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+            motion = cv2.countNonZero(changed) / float(changed.size)
+        self.last_motion = motion
+
+        if motion >= self.threshold or now - self._last_infer_time >= self.max_interval:
+            self._reference = gray
+            self._last_infer_time = now
+            return True
+        self.skipped += 1
+        return False
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'skip_ratio': round(self.skip_ratio, 3),
+            'last_motion': round(self.last_motion, 4)
+        }
@@ -22,7 +22,8 @@ import torch
 
 print(f"CUDA disponible: {torch.cuda.is_available()}")
 
-# Cargar y exportar a TensorRT
+# Cargar y exportar a TensorRT (lote fijo de 1: UltralyticsBackend ejecuta varias cámaras
+# o recortes en trozos de ese tamaño)
 model = YOLO('yolov8n.pt')
 print("Exportando a TensorRT (FP16, 416x416)...")
 model.export(
@@ -93,3 +94,5 @@ echo "===================================================="
 echo "¡Optimización completada!"
 echo "Para usar el modelo optimizado, actualiza app.py para usar:"
 echo "  detector = ObjectDetector('yolov8n.engine', imgsz=416, half=True)"
+echo "Para medir todas las etapas del sistema (también sin GPU):"
+echo "  python benchmarks/bench_suite.py --baseline benchmarks/baseline.json"
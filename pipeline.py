@@ -0,0 +1,527 @@
+import cv2
+import numpy as np
+import time
+import threading
+from clips import clip_overlay
+from events import EventBus
+from metrics import FRAMES_DROPPED, FRAMES_PROCESSED, FRAME_LATENCY_SECONDS, STAGE_SECONDS, STREAM_CLIENTS
+
+# Perfiles de Transmisión
+# Cada perfil define ancho máximo, calidad JPEG y FPS máximos. El pipeline codifica cada
+# perfil a lo sumo una vez por cuadro y solo mientras tenga espectadores: 'low' para el túnel
+# ngrok o celulares, 'high' para monitores en la red local.
+STREAM_PROFILES = {
+    'low': {'width': 320, 'quality': 50, 'max_fps': 10},
+    'medium': {'width': 480, 'quality': 70, 'max_fps': 15},
+    'high': {'width': 640, 'quality': 90, 'max_fps': None}
+}
+DEFAULT_PROFILE = 'high'
+
+_ENCODE_SECONDS = STAGE_SECONDS.labels(stage='encode')
+_CLIENT_DROPS = FRAMES_DROPPED.labels(reason='client')
+_MJPEG_CLIENTS = STREAM_CLIENTS.labels(kind='mjpeg')
+
+# Concentrador de Cuadros (Fan-out)
+# Guarda el último cuadro JPEG publicado junto con su número de secuencia y
+# despierta a todos los clientes que esperan un cuadro nuevo.
+class FrameHub:
+    def __init__(self, rate_window=2.0):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._jpeg = None
+        self.subscribers = 0
+        # Métricas de envío (todos los espectadores del hub)
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.send_rate = 0.0  # bytes/s en la última ventana completa
+        self._rate_window = rate_window
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+
+    def publish(self, jpeg_bytes):
+        """
+        Publica un nuevo cuadro codificado y notifica a los clientes en espera.
+        """
+        with self._cond:
+            self._seq += 1
+            self._jpeg = jpeg_bytes
+            self._cond.notify_all()
+
+    def wait_next(self, last_seq, timeout=1.0):
+        """
+        Espera hasta que haya un cuadro con secuencia mayor que 'last_seq'.
+        Devuelve (seq, jpeg) o (last_seq, None) si se agotó el tiempo.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq, timeout):
+                return last_seq, None
+            return self._seq, self._jpeg
+
+    def _account(self, sent_bytes, dropped):
+        if dropped:
+            _CLIENT_DROPS.inc(dropped)
+        with self._cond:
+            self.bytes_sent += sent_bytes
+            self.frames_sent += 1 if sent_bytes else 0
+            self.frames_dropped += dropped
+            self._window_bytes += sent_bytes
+            now = time.monotonic()
+            if now - self._window_start >= self._rate_window:
+                self.send_rate = self._window_bytes / (now - self._window_start)
+                self._window_start = now
+                self._window_bytes = 0
+
+    def stream(self, max_fps=None):
+        """
+        Generador MJPEG ligero por cliente: solo espera el siguiente cuadro publicado.
+        Si el cliente es lento, los cuadros intermedios se descartan (siempre recibe el último).
+        max_fps: límite opcional de cuadros por segundo para este cliente.
+        """
+        min_interval = 1.0 / max_fps if max_fps else 0.0
+        with self._cond:
+            self.subscribers += 1
+        _MJPEG_CLIENTS.inc()
+        try:
+            seq = 0
+            last_sent = 0.0
+            while True:
+                prev_seq = seq
+                seq, jpeg = self.wait_next(seq)
+                if jpeg is None:
+                    continue
+                # Cuadros publicados que este cliente no alcanzó a recibir
+                dropped = seq - prev_seq - 1 if prev_seq else 0
+                now = time.monotonic()
+                if now - last_sent < min_interval:
+                    self._account(0, dropped + 1)
+                    continue
+                last_sent = now
+                chunk = (b'--frame\r\n'
+                         b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n\r\n')
+                self._account(len(chunk), dropped)
+                yield chunk
+        finally:
+            # Se ejecuta cuando el navegador cierra la conexión (GeneratorExit)
+            with self._cond:
+                self.subscribers -= 1
+            _MJPEG_CLIENTS.dec()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                'viewers': self.subscribers,
+                'bytes_sent': self.bytes_sent,
+                'frames_sent': self.frames_sent,
+                'frames_dropped': self.frames_dropped,
+                'kbps': round(self.send_rate * 8 / 1000, 1),
+                'kbps_per_viewer': round(self.send_rate * 8 / 1000 / self.subscribers, 1) if self.subscribers else 0.0
+            }
+
+
+# Perfil de Transmisión
+# Codifica el cuadro anotado con su resolución y calidad, respetando sus FPS máximos, y lo
+# publica en su propio FrameHub. Mide el costo de codificación (tiempo real y CPU del hilo).
+# Si tiene un 'recorder' (ClipBuffer de clips.py) se codifica aunque nadie mire y cada JPEG
+# se guarda también en ese búfer, junto con las detecciones del cuadro para dibujarlas al
+# exportar el clip. Por eso el búfer se conecta a un perfil sin anotar: mantenerlo activo
+# cuesta una codificación, sin dibujar el cuadro en el servidor.
+class StreamProfile:
+    def __init__(self, name, width=None, quality=90, max_fps=None, hub=None):
+        self.name = name
+        self.width = width
+        self.quality = quality
+        self.max_fps = max_fps
+        self.hub = hub if hub is not None else FrameHub()
+        self.encoded = 0
+        self.bytes_encoded = 0
+        self._encode_ms = 0.0
+        self._encode_cpu_ms = 0.0
+        self._last_encode = 0.0
+        self.recorder = None
+        # Destino reutilizable del reescalado (se recrea si cambia el tamaño)
+        self._resized = None
+
+    def due(self, now):
+        """
+        True si hay espectadores (o un búfer de clips) y ya pasó el intervalo mínimo desde la
+        última codificación.
+        """
+        if self.hub.subscribers <= 0 and self.recorder is None:
+            return False
+        # Pequeña tolerancia para no perder un cuadro por la fluctuación de la cámara
+        return not self.max_fps or now - self._last_encode >= 0.9 / self.max_fps
+
+    def encode(self, frame, now=None, overlay=None):
+        """
+        overlay: detecciones del cuadro (clips.clip_overlay) que se guardan con el JPEG en el
+        búfer de clips, si hay uno.
+        """
+        start, start_cpu = time.perf_counter(), time.thread_time()
+        height, width = frame.shape[:2]
+        if self.width and self.width < width:
+            size = (self.width, height * self.width // width)
+            if self._resized is None or self._resized.shape != (size[1], size[0]) + frame.shape[2:]:
+                self._resized = np.empty((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+            frame = cv2.resize(frame, size, dst=self._resized, interpolation=cv2.INTER_AREA)
+        ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        elapsed = time.perf_counter() - start
+        _ENCODE_SECONDS.observe(elapsed)
+        self._encode_ms += elapsed * 1000
+        self._encode_cpu_ms += (time.thread_time() - start_cpu) * 1000
+        self._last_encode = time.monotonic() if now is None else now
+        if ret:
+            data = jpeg.tobytes()
+            self.encoded += 1
+            self.bytes_encoded += len(data)
+            self.hub.publish(data)
+            if self.recorder is not None:
+                self.recorder.append(time.time(), data, (frame.shape[1], frame.shape[0]), overlay)
+
+    def get_stats(self):
+        stats = {
+            'width': self.width,
+            'quality': self.quality,
+            'max_fps': self.max_fps,
+            'encoded': self.encoded,
+            'avg_jpeg_kb': round(self.bytes_encoded / self.encoded / 1024, 1) if self.encoded else 0.0,
+            'avg_encode_ms': round(self._encode_ms / self.encoded, 3) if self.encoded else 0.0,
+            'avg_encode_cpu_ms': round(self._encode_cpu_ms / self.encoded, 3) if self.encoded else 0.0,
+            'encode_cpu_ms_total': round(self._encode_cpu_ms, 1)
+        }
+        if hasattr(self.hub, 'get_stats'):
+            stats.update(self.hub.get_stats())
+        return stats
+
+
+# Canal de Cámara
+# Estado por cámara dentro del pipeline: sus perfiles de transmisión (video anotado en el
+# servidor y video sin anotar), el bus de detecciones por cuadro para que el navegador dibuje
+# las cajas, las estadísticas actuales, el último cuadro procesado y la latencia
+# captura -> publicación.
+class CameraChannel:
+    def __init__(self, cam_id, camera, name=None, hub=None, profiles=None):
+        """
+        hub: FrameHub opcional para el perfil por defecto.
+        profiles: diccionario {nombre: {width, quality, max_fps}}; por defecto STREAM_PROFILES.
+        """
+        self.cam_id = cam_id
+        self.camera = camera
+        self.name = name or cam_id
+        profiles = profiles or STREAM_PROFILES
+        self.default_profile = DEFAULT_PROFILE if DEFAULT_PROFILE in profiles else next(iter(profiles))
+        self.profiles = {
+            profile_name: StreamProfile(profile_name, hub=hub if profile_name == self.default_profile else None, **config)
+            for profile_name, config in profiles.items()
+        }
+        self.raw_profiles = {profile_name: StreamProfile(profile_name, **config) for profile_name, config in profiles.items()}
+        # Detecciones por cuadro (JSON) para los clientes que dibujan en el navegador;
+        # historial corto: un cliente lento salta directo a las más recientes
+        self.detections = EventBus(history=4)
+        self.current_stats = {
+            'total_persons': 0,
+            'violations': 0,
+            'alerts': []
+        }
+        self.last_frame_id = 0
+        self.frames_processed = 0
+        self.detect_calls = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+        self._published_stats = {}
+        # Búfer del cuadro anotado: se dibuja y se codifica dentro de publish_frame, así que
+        # uno por cámara basta
+        self._render_buffer = None
+
+    @property
+    def hub(self):
+        return self.profiles[self.default_profile].hub
+
+    @property
+    def viewers(self):
+        return sum(profile.hub.subscribers for profile in self.all_profiles())
+
+    def all_profiles(self):
+        return list(self.profiles.values()) + list(self.raw_profiles.values())
+
+    def get_profile(self, name=None, raw=False):
+        return (self.raw_profiles if raw else self.profiles).get(name or self.default_profile)
+
+    def render_buffer(self, frame):
+        """
+        Búfer reutilizable con la forma de 'frame' donde dibujar el cuadro anotado.
+        """
+        if self._render_buffer is None or self._render_buffer.shape != frame.shape:
+            self._render_buffer = np.empty_like(frame)
+        return self._render_buffer
+
+    def publish_frame(self, frame, render, overlay=None):
+        """
+        Codifica el cuadro una vez por cada perfil que tenga espectadores y le toque según sus FPS.
+        render() produce el cuadro anotado y solo se llama si algún perfil anotado lo necesita.
+        overlay: detecciones para el búfer de clips de los perfiles sin anotar (ver StreamProfile).
+        Devuelve el número de codificaciones.
+        """
+        now = time.monotonic()
+        annotated_due = [p for p in self.profiles.values() if p.due(now)]
+        raw_due = [p for p in self.raw_profiles.values() if p.due(now)]
+        if annotated_due:
+            annotated_frame = render()
+            for profile in annotated_due:
+                profile.encode(annotated_frame, now)
+        for profile in raw_due:
+            profile.encode(frame, now, overlay)
+        return len(annotated_due) + len(raw_due)
+
+    def publish_detections(self, frame_id, detections):
+        """
+        Envía las detecciones del cuadro a los clientes suscritos (si hay alguno).
+        """
+        if self.detections.subscribers > 0:
+            self.detections.publish('detections', dict(detections, camera=self.cam_id, frame_id=frame_id))
+
+    def record_latency(self, frame_time):
+        if frame_time is None:
+            return
+        latency_ms = (time.time() - frame_time) * 1000
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self._total_latency_ms += latency_ms
+
+    def get_status(self):
+        status = {
+            'name': self.name,
+            'viewers': self.viewers,
+            'frames_processed': self.frames_processed,
+            'detect_calls': self.detect_calls,
+            'last_latency_ms': round(self.last_latency_ms, 2),
+            'avg_latency_ms': round(self._total_latency_ms / self.frames_processed, 2) if self.frames_processed else 0.0,
+            'max_latency_ms': round(self.max_latency_ms, 2)
+        }
+        if hasattr(self.camera, 'get_stats'):
+            status['camera'] = self.camera.get_stats()
+        status['profiles'] = {name: profile.get_stats() for name, profile in self.profiles.items()}
+        status['raw_profiles'] = {name: profile.get_stats() for name, profile in self.raw_profiles.items()}
+        status['detection_subscribers'] = self.detections.subscribers
+        return status
+
+
+# Pipeline de Detección Compartido
+# Un único hilo en segundo plano ejecuta captura -> detección -> anotación -> codificación
+# y publica el resultado en el FrameHub de cada cámara. El cuadro se dibuja en el servidor
+# solo si alguien mira el video anotado; los clientes que dibujan en el navegador reciben el
+# video sin anotar y las detecciones en JSON. El costo de inferencia es el mismo
+# con 1 o 50 espectadores.
+#
+# Con varias cámaras, el planificador espera a que cualquiera tenga un cuadro nuevo, toma el
+# último cuadro de cada cámara lista (en orden rotativo para ser equitativo) y los pasa al
+# modelo como un solo lote: el rendimiento crece con el tamaño del lote y no con el número
+# de procesos.
+class DetectionPipeline:
+    def __init__(self, camera, detector, hub=None, events=None, max_batch=8, names=None, poll_interval=0.005,
+                 scheduler=None):
+        """
+        camera: una cámara o un diccionario {cam_id: cámara} (por ejemplo CameraRegistry.cameras).
+        hub: FrameHub opcional para la primera cámara.
+        max_batch: máximo de cuadros por llamada al modelo.
+        names: diccionario opcional {cam_id: nombre visible}.
+        poll_interval: segundos entre consultas para cámaras que no avisan de cuadros nuevos.
+        scheduler: AdaptiveScheduler opcional; recibe la latencia de cada lote y ajusta la calidad
+        del detector para mantenerse dentro del presupuesto (ver scheduler.py).
+        """
+        cameras = camera if isinstance(camera, dict) else {'default': camera}
+        names = names or {}
+        self.channels = {}
+        for i, (cam_id, cam) in enumerate(cameras.items()):
+            self.channels[cam_id] = CameraChannel(cam_id, cam, names.get(cam_id), hub if i == 0 else None)
+        self._order = list(self.channels.keys())
+        self.default_id = self._order[0]
+        self.detector = detector
+        # Clips de incidentes: el perfil elegido (sin anotar) de cada cámara alimenta su búfer
+        # de JPEG; las cajas se dibujan al exportar el clip
+        recorder = getattr(detector, 'clip_recorder', None)
+        self._clips = recorder is not None
+        if recorder is not None:
+            for cam_id, channel in self.channels.items():
+                profile = channel.get_profile(recorder.profile, raw=True) or channel.get_profile(raw=True)
+                profile.recorder = recorder.buffer(cam_id)
+        self.max_batch = max_batch
+        self.scheduler = scheduler
+        # Bus de eventos opcional: se publican solo los cambios de estadísticas (SSE)
+        self.events = events
+        self.monitoring_active = True
+        self.frames_processed = 0
+        self.detect_calls = 0
+        self.batches = 0
+        self._rr = 0
+
+        # Las cámaras activan este evento con cada cuadro nuevo; si alguna no lo admite,
+        # el planificador consulta periódicamente
+        self._frame_ready = threading.Event()
+        self._poll_interval = None
+        for channel in self.channels.values():
+            if hasattr(channel.camera, 'add_listener'):
+                channel.camera.add_listener(self._frame_ready)
+            else:
+                self._poll_interval = poll_interval
+        self._stopped = False
+        self._thread = None
+
+    # Accesos de compatibilidad a la cámara principal
+    @property
+    def camera(self):
+        return self.channels[self.default_id].camera
+
+    @property
+    def hub(self):
+        return self.channels[self.default_id].hub
+
+    @property
+    def current_stats(self):
+        return self.channels[self.default_id].current_stats
+
+    def get_channel(self, cam_id=None):
+        return self.channels.get(cam_id or self.default_id)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._frame_ready.set()
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.process_once()
+            except Exception as e:
+                print(f"❌ Error en el pipeline de detección: {e}")
+                time.sleep(0.1)
+
+    def _collect(self):
+        """
+        Toma el cuadro más reciente de cada cámara con un cuadro nuevo, empezando por una
+        cámara distinta en cada ronda para que ninguna acapare el lote.
+        """
+        ready = []
+        n = len(self._order)
+        for k in range(n):
+            channel = self.channels[self._order[(self._rr + k) % n]]
+            frame_id, frame, frame_time = channel.camera.wait_for_frame(channel.last_frame_id, timeout=0)
+            if frame is None:
+                continue
+            channel.last_frame_id = frame_id
+            ready.append((channel, frame_id, frame, frame_time))
+            if len(ready) >= self.max_batch:
+                break
+        self._rr = (self._rr + 1) % n
+        return ready
+
+    def process_once(self, timeout=1.0):
+        """
+        Procesa los cuadros nuevos disponibles (a lo sumo uno por cámara) y publica los JPEG.
+        Nunca se procesa dos veces el mismo cuadro.
+        """
+        wait = timeout if self._poll_interval is None else self._poll_interval
+        if not self._frame_ready.wait(wait):
+            if self._poll_interval is None:
+                return 0
+        # Limpiar antes de recolectar: un cuadro que llegue durante el lote vuelve a activarlo
+        self._frame_ready.clear()
+        ready = self._collect()
+        if not ready:
+            return 0
+        start = time.perf_counter()
+        worst_latency = 0.0
+
+        # Solo ejecutar la detección si el monitoreo está activo
+        if self.monitoring_active:
+            results = self.detector.analyze_batch([frame for _, _, frame, _ in ready],
+                                                  [channel.cam_id for channel, _, _, _ in ready])
+            self.batches += 1
+        else:
+            results = [(None, None)] * len(ready)
+
+        for (channel, frame_id, frame, frame_time), (detections, stats) in zip(ready, results):
+            if stats is not None:
+                channel.current_stats = stats
+                self._publish_stats(channel, stats)
+                channel.detect_calls += 1
+                self.detect_calls += 1
+                channel.publish_detections(frame_id, detections)
+                render = (lambda frame=frame, detections=detections, channel=channel:
+                          self.detector.render(frame, detections, channel.cam_id, out=channel.render_buffer(frame)))
+                overlay = clip_overlay(detections, self.detector.colors) if self._clips else None
+            else:
+                channel.publish_detections(frame_id, {'paused': True, 'persons': [], 'zones': []})
+                render = lambda frame=frame, channel=channel: self._render_paused(frame, channel.render_buffer(frame))
+                overlay = None
+            channel.frames_processed += 1
+            self.frames_processed += 1
+
+            # Codificar (y dibujar) solo para los perfiles con espectadores: la detección y las
+            # alertas siguen corriendo igual
+            channel.publish_frame(frame, render, overlay)
+            channel.record_latency(frame_time)
+            if frame_time is not None:
+                latency = max(time.time() - frame_time, 0.0)
+                FRAME_LATENCY_SECONDS.observe(latency)
+                worst_latency = max(worst_latency, latency)
+        FRAMES_PROCESSED.inc(len(ready))
+        if self.scheduler is not None and self.monitoring_active:
+            busy = time.perf_counter() - start
+            self.scheduler.observe(worst_latency or busy, busy)
+        return len(ready)
+
+    def _render_paused(self, frame, out=None):
+        # Si el monitoreo está pausado, mostramos el video normal con un mensaje de PAUSA.
+        if out is not None:
+            np.copyto(out, frame)
+            annotated_frame = out
+        else:
+            annotated_frame = frame.copy()
+        cv2.putText(annotated_frame, "SISTEMA PAUSADO", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
+        return annotated_frame
+
+    def _publish_stats(self, channel, stats):
+        """
+        Publica en el bus solo las claves de las estadísticas que cambiaron, con la cámara de origen.
+        """
+        if self.events is None:
+            return
+        delta = {k: v for k, v in stats.items() if channel._published_stats.get(k) != v}
+        if delta:
+            channel._published_stats = dict(stats)
+            delta['camera'] = channel.cam_id
+            self.events.publish('stats', delta)
+
+    def get_status(self):
+        """
+        Estado del pipeline para monitoreo (espectadores, cuadros procesados, detector y cámaras).
+        """
+        status = {
+            'monitoring_active': self.monitoring_active,
+            'viewers': sum(c.viewers for c in self.channels.values()),
+            'frames_processed': self.frames_processed,
+            'detect_calls': self.detect_calls,
+            'batches': self.batches
+        }
+        if self.events is not None:
+            status['event_subscribers'] = self.events.subscribers
+            status['events_published'] = self.events.published
+        if hasattr(self.detector, 'get_stats'):
+            status['detector'] = self.detector.get_stats()
+        if self.scheduler is not None:
+            status['scheduler'] = self.scheduler.get_stats()
+        if hasattr(self.camera, 'get_stats'):
+            status['camera'] = self.camera.get_stats()
+        status['cameras'] = {}
+        for cam_id, channel in self.channels.items():
+            status['cameras'][cam_id] = channel.get_status()
+            if hasattr(self.detector, 'get_stream_stats'):
+                status['cameras'][cam_id]['detector'] = self.detector.get_stream_stats(cam_id)
+        return status
@@ -0,0 +1,197 @@
+import cv2
+import numpy as np
+import threading
+
+# Clasificador de EPP (Casco y Chaleco) por Color
+# Convierte a HSV una sola vez por cuadro (solo la unión de las ROIs de personas) y
+# clasifica cada píxel con una tabla de búsqueda HSV precalculada, de modo que todos los
+# rangos de color se evalúan en una sola pasada. Los resultados son idénticos bit a bit
+# a la heurística original basada en cv2.inRange + cv2.countNonZero.
+
+# Rangos HSV inclusivos (mismos límites que cv2.inRange en la versión original)
+# Blanco/Claro - 'Value' mínimo alto para evitar paredes claras
+LOWER_WHITE, UPPER_WHITE = (0, 0, 180), (180, 45, 255)
+# Amarillo/Verde Neon
+LOWER_YELLOW, UPPER_YELLOW = (20, 50, 70), (50, 255, 255)
+# Rojo (Dos rangos)
+LOWER_RED1, UPPER_RED1 = (0, 100, 100), (10, 255, 255)
+LOWER_RED2, UPPER_RED2 = (160, 100, 100), (180, 255, 255)
+# Azul
+LOWER_BLUE, UPPER_BLUE = (90, 80, 80), (130, 255, 255)
+# Naranja
+LOWER_ORANGE, UPPER_ORANGE = (10, 100, 100), (25, 255, 255)
+# Amarillo del chaleco (saturación y brillo más permisivos)
+LOWER_VEST_YELLOW = (20, 20, 50)
+
+# Cada rango cuenta por separado (la versión original sumaba countNonZero de cada máscara,
+# por lo que un píxel en la intersección de dos rangos cuenta dos veces).
+HELMET_RANGES = [
+    (LOWER_WHITE, UPPER_WHITE),
+    (LOWER_YELLOW, UPPER_YELLOW),
+    (LOWER_RED1, UPPER_RED1),
+    (LOWER_RED2, UPPER_RED2),
+    (LOWER_BLUE, UPPER_BLUE),
+    (LOWER_ORANGE, UPPER_ORANGE),
+]
+VEST_RANGES = [
+    (LOWER_ORANGE, UPPER_ORANGE),
+    (LOWER_VEST_YELLOW, UPPER_YELLOW),
+    (LOWER_RED1, UPPER_RED1),
+    (LOWER_RED2, UPPER_RED2),
+]
+
+# Umbrales de densidad de color (15%) para considerar presente el casco / chaleco
+HELMET_THRESHOLD = 0.15
+VEST_THRESHOLD = 0.15
+
+_tables = None
+_tables_lock = threading.Lock()
+
+def build_tables():
+    """
+    Precalcula la tabla HSV -> clase.
+    Como cada rango es una caja en el espacio HSV, la tabla 3-D se factoriza sin pérdida
+    en tres tablas de 256 entradas (un bit por rango distinto en cada canal) más una tabla
+    bits -> peso de casco / peso de chaleco. El peso es el número de rangos que coinciden.
+    Devuelve (channel_lut, helmet_lut, vest_lut); channel_lut tiene forma (1, 256, 3).
+    """
+    unique_ranges = []
+    for lower, upper in HELMET_RANGES + VEST_RANGES:
+        if (lower, upper) not in unique_ranges:
+            unique_ranges.append((lower, upper))
+    assert len(unique_ranges) <= 8, "Se necesita un bit por rango HSV distinto"
+
+    values = np.arange(256)
+    channel_lut = np.zeros((1, 256, 3), dtype=np.uint8)
+    for bit, (lower, upper) in enumerate(unique_ranges):
+        for c in range(3):
+            inside = (values >= lower[c]) & (values <= upper[c])
+            channel_lut[0, inside, c] |= np.uint8(1 << bit)
+
+    helmet_bits = [1 << unique_ranges.index(r) for r in HELMET_RANGES]
+    vest_bits = [1 << unique_ranges.index(r) for r in VEST_RANGES]
+    helmet_lut = np.array([sum(1 for b in helmet_bits if v & b) for v in range(256)], dtype=np.uint8)
+    vest_lut = np.array([sum(1 for b in vest_bits if v & b) for v in range(256)], dtype=np.uint8)
+    return channel_lut, helmet_lut, vest_lut
+
+def get_tables():
+    """
+    Devuelve las tablas de búsqueda compartidas (se construyen una sola vez por proceso).
+    """
+    global _tables
+    if _tables is None:
+        with _tables_lock:
+            if _tables is None:
+                _tables = build_tables()
+    return _tables
+
+
+def build_lut():
+    """
+    Expande las tablas factorizadas a la tabla 3-D completa 180x256x256 (uint8):
+    4 bits bajos = peso de casco, 4 bits altos = peso de chaleco.
+    Solo se usa para verificación; la clasificación en caliente usa las tablas factorizadas.
+    """
+    channel_lut, helmet_lut, vest_lut = get_tables()
+    bits = (channel_lut[0, :180, 0][:, None, None]
+            & channel_lut[0, :, 1][None, :, None]
+            & channel_lut[0, :, 2][None, None, :])
+    return helmet_lut[bits] | (vest_lut[bits] << 4)
+
+
+class PPEClassifier:
+    def __init__(self, helmet_threshold=HELMET_THRESHOLD, vest_threshold=VEST_THRESHOLD):
+        self.helmet_threshold = helmet_threshold
+        self.vest_threshold = vest_threshold
+        channel_lut, self._helmet_lut, self._vest_lut = get_tables()
+        self._h_lut, self._s_lut, self._v_lut = (np.ascontiguousarray(channel_lut[0, :, c]) for c in range(3))
+
+    def ratios(self, frame, boxes):
+        """
+        Calcula en lote la proporción de píxeles de color de casco y de chaleco
+        para todas las personas. 'boxes' es un arreglo (N, 4) de x1, y1, x2, y2.
+        Devuelve (helmet_ratio, vest_ratio), ambos arreglos float64 de tamaño N.
+        Si alguna de las dos regiones queda vacía, ambas proporciones valen 0.
+        """
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        n = len(boxes)
+        helmet_ratio = np.zeros(n, dtype=np.float64)
+        vest_ratio = np.zeros(n, dtype=np.float64)
+        if n == 0 or frame is None:
+            return helmet_ratio, vest_ratio
+
+        H, W = frame.shape[:2]
+        # Mismo recorte que el slicing de NumPy frame[y1:y2, x1:x2] (cajas no negativas)
+        x1, y1, x2, y2 = np.minimum(np.maximum(boxes, 0), (W, H, W, H)).T
+        w = np.maximum(x2 - x1, 0)
+        h = np.maximum(y2 - y1, 0)
+
+        # ROI de Casco: 25% superior, restringida al 60% central del ancho
+        w_offset = (w * 0.2).astype(np.int64)
+        helmet_rects = np.stack([x1 + w_offset, y1, x1 + w - w_offset, y1 + (h * 0.25).astype(np.int64)])
+        # ROI de Chaleco: franja del 20% al 60% de la altura (torso)
+        vest_rects = np.stack([x1, y1 + (h * 0.2).astype(np.int64), x1 + w, y1 + (h * 0.6).astype(np.int64)])
+
+        helmet_area = (helmet_rects[2] - helmet_rects[0]) * (helmet_rects[3] - helmet_rects[1])
+        vest_area = w * (vest_rects[3] - vest_rects[1])
+        valid = (helmet_area > 0) & (vest_area > 0)
+        if not valid.any():
+            return helmet_ratio, vest_ratio
+
+        # Unión de las ROIs válidas (solo las filas de casco y torso): se convierte a HSV
+        # y se clasifica una sola vez, aunque las personas se superpongan
+        ux1 = int(x1[valid].min()); ux2 = int(x2[valid].max())
+        uy1 = int(y1[valid].min()); uy2 = int(vest_rects[3][valid].max())
+        hsv = cv2.cvtColor(frame[uy1:uy2, ux1:ux2], cv2.COLOR_BGR2HSV)
+        h_chan, s_chan, v_chan = cv2.split(hsv)
+        bits = cv2.bitwise_and(cv2.LUT(h_chan, self._h_lut), cv2.LUT(s_chan, self._s_lut))
+        bits = cv2.bitwise_and(bits, cv2.LUT(v_chan, self._v_lut))
+
+        # Imágenes integrales de los pesos: la suma de cualquier rectángulo es O(1)
+        helmet_int = cv2.integral(cv2.LUT(bits, self._helmet_lut))
+        vest_int = cv2.integral(cv2.LUT(bits, self._vest_lut))
+
+        def box_sums(integral, rects):
+            rx1, ry1, rx2, ry2 = rects - np.array([[ux1], [uy1], [ux1], [uy1]])
+            return (integral[ry2, rx2] - integral[ry1, rx2] - integral[ry2, rx1] + integral[ry1, rx1])
+
+        helmet_ratio[valid] = box_sums(helmet_int, helmet_rects[:, valid]) / helmet_area[valid]
+        vest_ratio[valid] = box_sums(vest_int, vest_rects[:, valid]) / vest_area[valid]
+        return helmet_ratio, vest_ratio
+
+    def classify(self, frame, boxes):
+        """
+        Verifica casco y chaleco para todas las personas en una sola pasada.
+        Devuelve (has_helmet, has_vest, helmet_ratio, vest_ratio) como arreglos.
+        """
+        helmet_ratio, vest_ratio = self.ratios(frame, boxes)
+        return (helmet_ratio > self.helmet_threshold, vest_ratio > self.vest_threshold,
+                helmet_ratio, vest_ratio)
+
+
+def reference_ratios(frame, x1, y1, x2, y2):
+    """
+    Implementación original por persona (cv2.inRange + cv2.countNonZero).
+    Se conserva como referencia para verificar y medir el clasificador vectorizado.
+    """
+    person_roi = frame[y1:y2, x1:x2]
+    if person_roi.size == 0:
+        return 0.0, 0.0
+    h, w, _ = person_roi.shape
+    w_offset = int(w * 0.2)
+    helmet_roi = person_roi[0:int(h*0.25), w_offset:w - w_offset]
+    vest_roi = person_roi[int(h*0.2):int(h*0.6), :]
+    if helmet_roi.size == 0 or vest_roi.size == 0:
+        return 0.0, 0.0
+
+    hsv_helmet = cv2.cvtColor(helmet_roi, cv2.COLOR_BGR2HSV)
+    hsv_vest = cv2.cvtColor(vest_roi, cv2.COLOR_BGR2HSV)
+    helmet_pixels = sum(cv2.countNonZero(cv2.inRange(hsv_helmet, np.array(lo), np.array(hi)))
+                        for lo, hi in HELMET_RANGES)
+    mask_v_red = cv2.bitwise_or(cv2.inRange(hsv_vest, np.array(LOWER_RED1), np.array(UPPER_RED1)),
+                                cv2.inRange(hsv_vest, np.array(LOWER_RED2), np.array(UPPER_RED2)))
+    vest_pixels = (cv2.countNonZero(cv2.inRange(hsv_vest, np.array(LOWER_ORANGE), np.array(UPPER_ORANGE)))
+                   + cv2.countNonZero(cv2.inRange(hsv_vest, np.array(LOWER_VEST_YELLOW), np.array(UPPER_YELLOW)))
+                   + cv2.countNonZero(mask_v_red))
+    return (helmet_pixels / (hsv_helmet.shape[0] * hsv_helmet.shape[1]),
+            vest_pixels / (hsv_vest.shape[0] * hsv_vest.shape[1]))
@@ -0,0 +1,444 @@
+import atexit
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+import multiprocessing as mp
+from frame_ring import SharedFrameRing
+from metrics import FRAMES_DROPPED, REGISTRY
+from pipeline import CameraChannel, DetectionPipeline, STREAM_PROFILES
+from scheduler import AdaptiveScheduler
+
+# Pipeline en Procesos Separados (modo opcional)
+# La captura, la detección y el servidor web compiten por el GIL cuando viven en un mismo
+# proceso: mucho tráfico HTTP baja los FPS. En este modo:
+#   - un proceso de captura por cámara escribe los cuadros en un SharedFrameRing,
+#   - un proceso de detección lee las vistas (sin copia) de todos los anillos, ejecuta el
+#     mismo DetectionPipeline (lotes multicámara, EPP, dibujo, JPEG) y escribe los JPEG en
+#     un anillo de resultados por cámara y perfil de transmisión (anotado y sin anotar),
+#   - el proceso de Flask solo reenvía los JPEG a los espectadores y las estadísticas al panel.
+# Los mensajes pequeños (cambios de estadísticas, incidentes, estado) viajan por una
+# multiprocessing.Queue; el número de espectadores y el estado de monitoreo, por memoria compartida.
+# Cada hijo envía además sus métricas (metrics.py) una vez por segundo; /metrics las suma.
+FRAME_SHAPE = (480, 640, 3)
+METRICS_INTERVAL = 1.0
+
+_PIPELINE_DROPS = FRAMES_DROPPED.labels(reason='pipeline')
+
+def _outputs(cam_ids):
+    """
+    Salidas de video en el orden común a ambos procesos: (cámara, perfil, sin anotar).
+    """
+    return [(cam_id, profile_name, raw) for cam_id in cam_ids
+            for raw in (False, True) for profile_name in STREAM_PROFILES]
+
+def _send_metrics(event_queue, source):
+    try:
+        event_queue.put_nowait(('metrics', (source, REGISTRY.snapshot())))
+    except queue.Full:
+        pass
+
+def _context():
+    # 'fork' en Linux: los hijos heredan los anillos sin volver a importar app.py
+    # (la detección se inicializa dentro del hijo, nunca en el proceso web)
+    methods = mp.get_all_start_methods()
+    return mp.get_context('fork' if 'fork' in methods else 'spawn')
+
+
+def build_detector(event_queue, model_path='yolov8n.engine', imgsz=416, half=True, max_interval=1.0, zones=None,
+                   backend='auto', threads=None, clips=None, storage=None, detection_log=None, inference=None):
+    """
+    Construye el detector dentro del proceso de detección. Los incidentes registrados se
+    envían al proceso web para notificarlos al panel.
+    zones: diccionario opcional {cam_id: zonas} (ver zones.py).
+    clips: opciones opcionales de ClipRecorder (clips de incidentes; ver clips.py).
+    storage: opciones del CaptureStore (cuota de disco de capturas y clips; ver storage.py).
+    detection_log: carpeta opcional del registro de detecciones (ver detection_log.py).
+    inference: diccionario opcional {cam_id: plan de inferencia} (regiones o mosaico; ver tiling.py).
+    """
+    from clips import ClipRecorder
+    from database import clear_incident_clip, clear_incident_media
+    from detection_log import DetectionLog
+    from detector import ObjectDetector
+    from incident_writer import IncidentWriter
+    from motion import MotionGate
+    from storage import CaptureStore
+
+    def forward_incidents(incidents):
+        for incident in incidents:
+            try:
+                event_queue.put_nowait(('incident', incident))
+            except queue.Full:
+                pass
+
+    store = CaptureStore(on_evicted=clear_incident_media, **(storage or {}))
+    detector = ObjectDetector(model_path=model_path, imgsz=imgsz, half=half, backend=backend, threads=threads,
+                              motion_gate=MotionGate(max_interval=max_interval),
+                              incident_writer=IncidentWriter(on_written=forward_incidents, store=store),
+                              clip_recorder=(ClipRecorder(store=store, on_failed=clear_incident_clip, **clips)
+                                             if clips is not None else None),
+                              detection_log=DetectionLog(detection_log) if detection_log else None)
+    for cam_id, camera_zones in (zones or {}).items():
+        detector.set_zones(cam_id, camera_zones)
+    for cam_id, plan in (inference or {}).items():
+        detector.set_inference_plan(cam_id, plan)
+    return detector
+
+
+# Adaptadores usados dentro del proceso de detección
+
+class RingCamera:
+    """
+    Lector de un SharedFrameRing con la interfaz de VideoCamera que usa DetectionPipeline.
+    Copia cada cuadro a un búfer propio reutilizable (validado contra el anillo): una vista de
+    la memoria compartida podría sobrescribirse durante una inferencia lenta. Como en
+    VideoCamera, el cuadro es válido hasta la siguiente llamada a wait_for_frame.
+    """
+    def __init__(self, ring):
+        self.ring = ring
+        self._frame = np.empty(ring.shape, dtype=ring.dtype)
+        self.last_frame_time = None
+        self.frames_consumed = 0
+
+    def wait_for_frame(self, after_id=0, timeout=1.0):
+        if timeout and not self.ring.wait(after_id, timeout):
+            return after_id, None, None
+        seq, frame, frame_time = self.ring.read(after_id, out=self._frame)
+        if frame is None:
+            return after_id, None, None
+        if after_id and seq > after_id + 1:
+            # Cuadros que la captura escribió y la detección nunca leyó
+            _PIPELINE_DROPS.inc(seq - after_id - 1)
+        self.last_frame_time = frame_time
+        self.frames_consumed += 1
+        return seq, frame, frame_time
+
+    def get_stats(self):
+        head = self.ring.head
+        return {
+            'frame_id': head,
+            'captured': head,
+            'consumed': self.frames_consumed,
+            'dropped': max(head - self.frames_consumed, 0),
+            'ring_retries': self.ring.retries,
+            'shared_memory': True
+        }
+
+
+class RingHub:
+    """
+    Sustituto de FrameHub en el proceso de detección: publica los JPEG en el anillo de
+    resultados con la marca de tiempo de captura, y lee el número de espectadores del
+    proceso web para codificar solo cuando alguien mira.
+    """
+    def __init__(self, ring, viewers, index, camera):
+        self.ring = ring
+        self._viewers = viewers
+        self._index = index
+        self._camera = camera
+
+    @property
+    def subscribers(self):
+        return self._viewers[self._index]
+
+    def publish(self, jpeg_bytes):
+        self.ring.write_bytes(jpeg_bytes, timestamp=self._camera.last_frame_time)
+
+    def get_stats(self):
+        # El envío a los espectadores se mide en el proceso web
+        return {}
+
+
+class ForwardedDetections:
+    """
+    Sustituto del bus de detecciones de una cámara en el proceso de detección: reenvía las
+    detecciones al proceso web solo mientras allí haya clientes suscritos.
+    """
+    def __init__(self, event_queue, subscribers, index):
+        self._queue = event_queue
+        self._subscribers = subscribers
+        self._index = index
+
+    @property
+    def subscribers(self):
+        return self._subscribers[self._index]
+
+    def publish(self, event, data):
+        try:
+            self._queue.put_nowait((event, data))
+        except queue.Full:
+            pass
+
+
+class QueueEvents:
+    """
+    Sustituto de EventBus en el proceso de detección: reenvía los eventos al proceso web.
+    """
+    def __init__(self, event_queue):
+        self._queue = event_queue
+        self.subscribers = 0
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event, data):
+        try:
+            self._queue.put_nowait((event, data))
+            self.published += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+# Procesos hijos
+
+def _capture_main(entry, ring, event_queue, stop_event):
+    """
+    Proceso de captura: abre la cámara y copia cada cuadro nuevo a su ranura del anillo.
+    """
+    from cameras import CameraRegistry
+    # Con fork el hijo hereda los contadores del proceso web: empezar de cero
+    REGISTRY.reset()
+    source = f"captura-{entry['id']}"
+    last_metrics = 0.0
+    camera = CameraRegistry(config=[entry])._build(entry)
+    height, width = ring.shape[:2]
+    last_id = 0
+    try:
+        while not stop_event.is_set():
+            frame_id, frame, frame_time = camera.wait_for_frame(last_id, timeout=0.5)
+            if frame is None:
+                if camera.stopped:
+                    break
+                continue
+            last_id = frame_id
+            seq, slot = ring.begin_write()
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                cv2.resize(frame, (width, height), dst=slot)
+            ring.commit(seq, frame_time)
+            if frame_time - last_metrics >= METRICS_INTERVAL:
+                _send_metrics(event_queue, source)
+                last_metrics = frame_time
+    finally:
+        camera.stop()
+
+
+def _detection_main(cam_ids, names, frame_rings, result_rings, viewers, detection_viewers, active, event_queue,
+                    stop_event, detector_factory, detector_options, max_batch, scheduler_options=None):
+    """
+    Proceso de detección: DetectionPipeline sobre los anillos de cuadros.
+    """
+    REGISTRY.reset()
+    detector = detector_factory(event_queue, **detector_options)
+    cameras = {cam_id: RingCamera(ring) for cam_id, ring in zip(cam_ids, frame_rings)}
+    events = QueueEvents(event_queue)
+    scheduler = AdaptiveScheduler(detector, **scheduler_options) if scheduler_options is not None else None
+    pipeline = DetectionPipeline(cameras, detector, events=events, max_batch=max_batch, names=names,
+                                 poll_interval=0.001, scheduler=scheduler)
+    # Cada perfil publica en su anillo de resultados (mismo orden que en el proceso web)
+    for k, (cam_id, profile_name, raw) in enumerate(_outputs(cam_ids)):
+        profile = pipeline.channels[cam_id].get_profile(profile_name, raw)
+        profile.hub = RingHub(result_rings[k], viewers, k, cameras[cam_id])
+    for i, cam_id in enumerate(cam_ids):
+        pipeline.channels[cam_id].detections = ForwardedDetections(event_queue, detection_viewers, i)
+
+    last_status = 0.0
+    while not stop_event.is_set():
+        pipeline.monitoring_active = bool(active.value)
+        try:
+            pipeline.process_once(timeout=0.5)
+        except Exception as e:
+            print(f"❌ Error en el proceso de detección: {e}")
+            time.sleep(0.1)
+        now = time.time()
+        if now - last_status >= 1.0:
+            events.publish('status', pipeline.get_status())
+            _send_metrics(event_queue, 'deteccion')
+            last_status = now
+
+
+# Pipeline visto desde el proceso web (misma interfaz que DetectionPipeline)
+
+class ProcessPipeline:
+    def __init__(self, camera_config, detector_factory=build_detector, detector_options=None, events=None,
+                 max_batch=8, slots=8, frame_shape=FRAME_SHAPE, scheduler_options=None):
+        """
+        camera_config: lista de cámaras {id, name, source} (ver cameras.py).
+        detector_factory: función de nivel de módulo que recibe la cola de eventos y
+            detector_options y devuelve el detector (se ejecuta en el proceso de detección).
+        slots: ranuras por anillo; una vista sin copia es válida durante slots - 1 cuadros.
+        scheduler_options: opciones de AdaptiveScheduler (presupuesto de latencia/FPS) o None.
+        """
+        ctx = _context()
+        self._ctx = ctx
+        self.config = list(camera_config)
+        self.cam_ids = [entry['id'] for entry in self.config]
+        self.channels = {entry['id']: CameraChannel(entry['id'], None, entry.get('name')) for entry in self.config}
+        self.default_id = self.cam_ids[0]
+        self.events = events
+        self.detector_factory = detector_factory
+        self.detector_options = detector_options or {}
+        self.max_batch = max_batch
+        self.scheduler_options = scheduler_options
+
+        # Anillos de cuadros (captura -> detección), uno por cámara, y de JPEG (detección -> web),
+        # uno por cámara y perfil; los JPEG se copian al leerlos, así que bastan pocas ranuras
+        self._outputs = _outputs(self.cam_ids)
+        self.frame_rings = [SharedFrameRing(frame_shape, slots=slots) for _ in self.cam_ids]
+        self.result_rings = [SharedFrameRing(frame_shape, slots=4) for _ in self._outputs]
+        self._viewers = ctx.Array('i', len(self._outputs), lock=False)
+        self._detection_viewers = ctx.Array('i', len(self.cam_ids), lock=False)
+        self._active = ctx.Value('b', 1, lock=False)
+        self._queue = ctx.Queue(maxsize=1000)
+        self._stop = ctx.Event()
+        self._processes = []
+        self._last_seq = [0] * len(self._outputs)
+        self._child_status = {}
+        self.frames_processed = 0
+        self._relay_thread = None
+        self._closed = False
+
+    @property
+    def monitoring_active(self):
+        return bool(self._active.value)
+
+    @monitoring_active.setter
+    def monitoring_active(self, value):
+        self._active.value = 1 if value else 0
+
+    @property
+    def camera(self):
+        return None
+
+    @property
+    def hub(self):
+        return self.channels[self.default_id].hub
+
+    @property
+    def current_stats(self):
+        return self.channels[self.default_id].current_stats
+
+    def get_channel(self, cam_id=None):
+        return self.channels.get(cam_id or self.default_id)
+
+    def start(self):
+        if self._processes:
+            return self
+        for entry, ring in zip(self.config, self.frame_rings):
+            p = self._ctx.Process(target=_capture_main, args=(entry, ring, self._queue, self._stop),
+                                  name=f"captura-{entry['id']}", daemon=True)
+            p.start()
+            self._processes.append(p)
+        names = {entry['id']: entry.get('name') for entry in self.config}
+        p = self._ctx.Process(target=_detection_main,
+                              args=(self.cam_ids, names, self.frame_rings, self.result_rings, self._viewers,
+                                    self._detection_viewers, self._active, self._queue, self._stop,
+                                    self.detector_factory, self.detector_options, self.max_batch,
+                                    self.scheduler_options),
+                              name="deteccion", daemon=True)
+        p.start()
+        self._processes.append(p)
+
+        self._relay_thread = threading.Thread(target=self._relay, daemon=True)
+        self._relay_thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def _relay(self):
+        """
+        Hilo del proceso web: reenvía los JPEG nuevos a los espectadores y los eventos al panel.
+        """
+        while not self._stop.is_set():
+            idle = True
+            for i, cam_id in enumerate(self.cam_ids):
+                self._detection_viewers[i] = self.channels[cam_id].detections.subscribers
+            for k, (cam_id, profile_name, raw) in enumerate(self._outputs):
+                channel = self.channels[cam_id]
+                hub = channel.get_profile(profile_name, raw).hub
+                self._viewers[k] = hub.subscribers
+                seq, jpeg, _, frame_time = self.result_rings[k].read_bytes(self._last_seq[k])
+                if jpeg is None:
+                    continue
+                idle = False
+                self._last_seq[k] = seq
+                hub.publish(jpeg)
+                channel.frames_processed += 1
+                self.frames_processed += 1
+                channel.record_latency(frame_time)
+            if self._drain_events():
+                idle = False
+            if idle:
+                time.sleep(0.002)
+
+    def _drain_events(self, limit=100):
+        handled = 0
+        while handled < limit:
+            try:
+                event, data = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            handled += 1
+            if event == 'status':
+                self._child_status = data
+                continue
+            if event == 'metrics':
+                REGISTRY.set_remote(*data)
+                continue
+            if event == 'detections':
+                channel = self.channels.get(data.get('camera'))
+                if channel is not None:
+                    channel.detections.publish(event, data)
+                continue
+            if event == 'stats':
+                channel = self.channels.get(data.get('camera'))
+                if channel is not None:
+                    channel.current_stats = dict(channel.current_stats,
+                                                 **{k: v for k, v in data.items() if k != 'camera'})
+            if self.events is not None:
+                self.events.publish(event, data)
+        return handled > 0
+
+    def get_status(self):
+        """
+        Estado del proceso de detección (último informe) más la entrega en el proceso web.
+        """
+        status = dict(self._child_status)
+        status['mode'] = 'process'
+        status['monitoring_active'] = self.monitoring_active
+        status['viewers'] = sum(c.viewers for c in self.channels.values())
+        status['processes'] = {p.name: p.is_alive() for p in self._processes}
+        if self.events is not None:
+            status['event_subscribers'] = self.events.subscribers
+            status['events_published'] = self.events.published
+        cameras = status.get('cameras', {})
+        for cam_id, channel in self.channels.items():
+            delivery = channel.get_status()
+            cameras[cam_id] = dict(cameras.get(cam_id, {}), name=delivery['name'], viewers=delivery['viewers'],
+                                   delivered=delivery['frames_processed'],
+                                   end_to_end_latency_ms=delivery['avg_latency_ms'],
+                                   max_end_to_end_latency_ms=delivery['max_latency_ms'])
+            # Costo de codificación medido en el proceso de detección + envío medido aquí
+            for key, channel_profiles in (('profiles', channel.profiles), ('raw_profiles', channel.raw_profiles)):
+                profiles = cameras[cam_id].get(key, {})
+                for profile_name, profile in channel_profiles.items():
+                    profiles[profile_name] = dict(profiles.get(profile_name, {}), **profile.hub.get_stats())
+                cameras[cam_id][key] = profiles
+            cameras[cam_id]['detection_subscribers'] = channel.detections.subscribers
+        status['cameras'] = cameras
+        return status
+
+    def stop(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        for p in self._processes:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        if self._relay_thread is not None:
+            self._relay_thread.join(timeout=1.0)
+        for ring in self.frame_rings + self.result_rings:
+            ring.close()
+            ring.unlink()
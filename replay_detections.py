@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Reevalúa el registro de detecciones (SAFEGUARD_DETECTION_LOG) con otros umbrales de EPP o
+zonas, sin volver a ejecutar el modelo, y compara con lo que decidió el detector.
+
+Uso:
+    python replay_detections.py registro/ --helmet 0.12 --vest 0.20
+    python replay_detections.py registro/ --zones cameras.json --camera cam1 --since 2026-10-18T06:00
+    python replay_detections.py registro/ --sweep helmet
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+import detection_log
+from ppe import HELMET_THRESHOLD, VEST_THRESHOLD
+
+ROWS = [('records', "Personas-cuadro"), ('safe', "Seguro"), ('warning', "Aviso"), ('danger', "Peligro"),
+        ('no_helmet', "Sin casco"), ('no_vest', "Sin chaleco"), ('in_zone', "En zona"),
+        ('tracks_no_helmet', "Personas sin casco"), ('tracks_no_vest', "Personas sin chaleco"),
+        ('tracks_in_zone', "Personas en zona")]
+
+def load_zones(path):
+    """
+    Zonas por cámara desde cameras.json (lista de cámaras con 'id' y 'zones') o desde un
+    diccionario {cámara: zonas}.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    if isinstance(config, dict):
+        return config
+    return {entry['id']: entry['zones'] for entry in config if entry.get('zones') is not None}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', help="carpeta del registro de detecciones")
+    parser.add_argument('--helmet', type=float, default=HELMET_THRESHOLD, help="umbral de color de casco")
+    parser.add_argument('--vest', type=float, default=VEST_THRESHOLD, help="umbral de color de chaleco")
+    parser.add_argument('--zones', default=None, help="cameras.json o {cámara: zonas} con las zonas a probar")
+    parser.add_argument('--camera', action='append', default=None, help="limitar a estas cámaras (repetible)")
+    parser.add_argument('--since', default=None, help="desde (ISO)")
+    parser.add_argument('--until', default=None, help="hasta (ISO)")
+    parser.add_argument('--sweep', choices=['helmet', 'vest'], default=None,
+                        help="tabla de personas-cuadro sin casco/chaleco para umbrales de 0.01 a 0.50")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    records, meta = detection_log.load(args.root, datetime.fromisoformat(args.since) if args.since else None,
+                                       datetime.fromisoformat(args.until) if args.until else None, args.camera)
+    loaded = time.perf_counter()
+    if not len(records):
+        print("⚠️ No hay registros en el rango indicado")
+        return
+
+    if args.sweep:
+        thresholds = np.round(np.arange(0.01, 0.51, 0.01), 2)
+        rates = detection_log.sweep(records, f"{args.sweep}_ratio", thresholds)
+        print(f"{'umbral':>6} | {'sin ' + ('casco' if args.sweep == 'helmet' else 'chaleco'):>12}")
+        for threshold, rate in zip(thresholds, rates):
+            print(f"{threshold:>6.2f} | {rate * 100:>11.1f}%")
+    else:
+        before = detection_log.summarize(records, detection_log.recorded(records))
+        verdicts = detection_log.rescore(records, meta, args.helmet, args.vest,
+                                         load_zones(args.zones) if args.zones else None)
+        after = detection_log.summarize(records, verdicts)
+        changed = int((verdicts['status'] != detection_log.recorded(records)['status']).sum())
+        print(f"{'':<22} | {'registrado':>11} | {'reevaluado':>11}")
+        for key, title in ROWS:
+            print(f"{title:<22} | {before[key]:>11} | {after[key]:>11}")
+        print(f"Cambiaron de estado: {changed} personas-cuadro ({changed / len(records) * 100:.1f}%)")
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {len(records)} registros de {len(meta['streams'])} cámaras: carga {(loaded - start) * 1000:.0f} ms, "
+          f"total {elapsed:.2f} s ({len(records) / elapsed / 1e6:.1f} M registros/s)")
+
+
+if __name__ == '__main__':
+    main()
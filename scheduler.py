@@ -0,0 +1,133 @@
+import time
+from collections import deque
+from metrics import QUALITY_CHANGES, QUALITY_LEVEL, SCHEDULER_LOAD
+
+_DEGRADES = QUALITY_CHANGES.labels(direction='degrade')
+_RESTORES = QUALITY_CHANGES.labels(direction='restore')
+
+# Planificador Adaptativo de Calidad
+# Mantiene la latencia captura -> publicación (y opcionalmente los FPS) dentro de un presupuesto.
+# Después de cada lote el pipeline le informa la latencia y el tiempo de trabajo; la carga es la
+# fracción del presupuesto usada (> 1 = fuera de presupuesto). Si el percentil 90 de la carga en
+# una ventana de lotes recientes supera 1 (así cuentan los cuadros con inferencia aunque se
+# alternen con cuadros sin ella), baja un nivel de calidad; si se mantiene por debajo de
+# 'headroom' durante 'restore_after' segundos, sube un nivel. Tras cada cambio espera a que la
+# ventana se llene con lotes del nivel nuevo antes de volver a decidir.
+#
+# Niveles, de menor a mayor impacto en la calidad:
+#   ppe_scale:   multiplica el intervalo de reevaluación del EPP (el veredicto se arrastra con el rastreo)
+#   infer_every: el modelo corre cada N cuadros por cámara; en los demás se reutilizan las cajas
+#   imgsz_scale: reduce el tamaño de entrada del modelo (si el backend lo admite)
+LEVELS = [
+    {'ppe_scale': 1, 'infer_every': 1, 'imgsz_scale': 1.0},
+    {'ppe_scale': 2, 'infer_every': 1, 'imgsz_scale': 1.0},
+    {'ppe_scale': 2, 'infer_every': 2, 'imgsz_scale': 1.0},
+    {'ppe_scale': 3, 'infer_every': 2, 'imgsz_scale': 0.75},
+    {'ppe_scale': 4, 'infer_every': 3, 'imgsz_scale': 0.75},
+    {'ppe_scale': 6, 'infer_every': 4, 'imgsz_scale': 0.625},
+]
+WINDOW = 12
+WINDOW_QUANTILE = 0.9
+MIN_IMGSZ = 160
+
+class AdaptiveScheduler:
+    def __init__(self, detector, target_latency=0.2, target_fps=None, levels=None, headroom=0.6,
+                 restore_after=3.0, clock=time.monotonic):
+        """
+        detector: ObjectDetector cuyos parámetros se ajustan (infer_every, ppe_interval, set_imgsz).
+        target_latency: segundos máximos entre la captura y la publicación del cuadro.
+        target_fps: cuadros por segundo mínimos (opcional): el trabajo por lote no debe superar 1/target_fps.
+        headroom: carga por debajo de la cual se recupera calidad.
+        restore_after: segundos seguidos con margen antes de subir un nivel.
+        """
+        self.detector = detector
+        self.target_latency = target_latency
+        self.target_fps = target_fps
+        self.levels = levels or LEVELS
+        self.headroom = headroom
+        self.restore_after = restore_after
+        self.clock = clock
+        self.base_imgsz = detector.imgsz
+        self.base_ppe_interval = detector.ppe_interval
+        self.imgsz_supported = True
+        self.level = 0
+        self._window = deque(maxlen=WINDOW)
+        self._calm_since = None
+
+        # Métricas
+        self.load = 0.0
+        self.degrades = 0
+        self.restores = 0
+        self.over_budget = 0
+        self.observed = 0
+        self._apply()
+
+    def observe(self, latency, busy=None):
+        """
+        Registra un lote procesado: latencia captura -> publicación (s, la peor del lote) y
+        tiempo de trabajo del lote (s). Puede cambiar el nivel de calidad.
+        """
+        load = latency / self.target_latency
+        if self.target_fps and busy is not None:
+            load = max(load, busy * self.target_fps)
+        self.observed += 1
+        if load > 1.0:
+            self.over_budget += 1
+        self._window.append(load)
+        if len(self._window) < self._window.maxlen:
+            return self.level
+        ordered = sorted(self._window)
+        self.load = ordered[int(WINDOW_QUANTILE * (len(ordered) - 1))]
+        SCHEDULER_LOAD.set(self.load)
+
+        now = self.clock()
+        if self.load > 1.0:
+            self._calm_since = None
+            if self.level < len(self.levels) - 1:
+                self._change(self.level + 1)
+        elif self.load < self.headroom and self.level > 0:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.restore_after:
+                self._change(self.level - 1)
+        else:
+            self._calm_since = None
+        return self.level
+
+    def _change(self, level):
+        if level > self.level:
+            self.degrades += 1
+            _DEGRADES.inc()
+        else:
+            self.restores += 1
+            _RESTORES.inc()
+        self.level = level
+        self._window.clear()
+        self._calm_since = None
+        self._apply()
+
+    def _apply(self):
+        settings = self.levels[self.level]
+        self.detector.ppe_interval = self.base_ppe_interval * settings['ppe_scale']
+        self.detector.infer_every = settings['infer_every']
+        imgsz = max(MIN_IMGSZ, int(round(self.base_imgsz * settings['imgsz_scale'] / 32)) * 32)
+        if self.imgsz_supported and imgsz != self.detector.imgsz:
+            # Los backends con entrada fija (TensorRT, ONNX exportado con tamaño fijo) no cambian
+            self.imgsz_supported = self.detector.set_imgsz(imgsz)
+        QUALITY_LEVEL.set(self.level)
+
+    def get_stats(self):
+        return {
+            'level': self.level,
+            'max_level': len(self.levels) - 1,
+            'load': round(self.load, 3),
+            'target_latency_ms': round(self.target_latency * 1000, 1),
+            'target_fps': self.target_fps,
+            'imgsz': self.detector.imgsz,
+            'infer_every': self.detector.infer_every,
+            'ppe_interval': self.detector.ppe_interval,
+            'imgsz_supported': self.imgsz_supported,
+            'degrades': self.degrades,
+            'restores': self.restores,
+            'over_budget_ratio': round(self.over_budget / self.observed, 3) if self.observed else 0.0
+        }
@@ -0,0 +1,256 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+from werkzeug.security import safe_join
+
+# Almacenamiento de Capturas y Clips
+# Todos los archivos de incidentes viven bajo 'static/' en carpetas por fecha
+# (captures/2026/10/18/capture_091701_040123_7.jpg, clips/2026/10/18/...), con nombres únicos
+# aunque varias alertas ocurran en el mismo segundo. Cada captura tiene una miniatura en
+# thumbs/<misma ruta> para la lista del panel, generada en el hilo del escritor de incidentes.
+#
+# Cuota: el almacén lleva la cuenta de los bytes en disco (índice ordenado del archivo más
+# antiguo al más reciente, reconstruido al iniciar) y, si se supera 'max_bytes' o un archivo
+# es más viejo que 'max_age_days', borra los más antiguos primero. Las rutas borradas se
+# entregan a 'on_evicted' para quitarlas de la tabla incidents (el incidente se conserva).
+KINDS = ('captures', 'clips')
+THUMBS = 'thumbs'
+THUMB_WIDTH = 160
+THUMB_QUALITY = 70
+ENFORCE_INTERVAL = 60.0   # segundos entre revisiones de antigüedad
+
+def thumbnail_path(relpath):
+    return f"{THUMBS}/{relpath}"
+
+def ensure_thumbnail(root, relpath, width=THUMB_WIDTH, store=None):
+    """
+    Crea la miniatura de una captura si no existe (capturas anteriores al almacén o cuya
+    miniatura no pudo generarse). Devuelve la ruta relativa de la miniatura o None.
+    store: CaptureStore opcional donde se registra una miniatura nueva (cuenta para la cuota).
+    """
+    source = safe_join(root, relpath)
+    target = safe_join(root, thumbnail_path(relpath))
+    if source is None or target is None or not os.path.isfile(source):
+        return None
+    if os.path.exists(target):
+        return thumbnail_path(relpath)
+    frame = cv2.imread(source)
+    if frame is None or not _write_thumbnail(target, frame, width):
+        return None
+    if store is not None:
+        store.add_thumbnail(relpath)
+    return thumbnail_path(relpath)
+
+def _write_thumbnail(path, frame, width):
+    height = max(1, frame.shape[0] * width // frame.shape[1])
+    thumb = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return cv2.imwrite(path, thumb, [cv2.IMWRITE_JPEG_QUALITY, THUMB_QUALITY])
+
+
+class CaptureStore:
+    def __init__(self, root=None, max_bytes=1024 * 1024 * 1024, max_age_days=30, thumb_width=THUMB_WIDTH,
+                 on_evicted=None):
+        """
+        root: carpeta servida (por defecto 'static/'); las rutas devueltas son relativas a ella.
+        max_bytes: espacio máximo de capturas, miniaturas y clips juntos.
+        max_age_days: antigüedad máxima de un archivo (None = sin límite).
+        on_evicted: función opcional llamada desde el hilo del almacén con la lista de rutas
+            relativas borradas (por ejemplo database.clear_incident_media).
+        """
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.root = root or os.path.join(base_dir, 'static')
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.thumb_width = thumb_width
+        self.on_evicted = on_evicted
+        self._files = OrderedDict()   # ruta relativa -> [creado, bytes], del más antiguo al más reciente
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._seq = itertools.count()
+        self._stopped = False
+        self.bytes = 0
+
+        # Métricas
+        self.files_written = 0
+        self.thumbs_written = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.scanned = False
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Escritura
+
+    def new_path(self, kind, timestamp, prefix, ext):
+        """
+        Ruta relativa única y agrupada por fecha para un archivo nuevo (datetime 'timestamp').
+        """
+        return f"{kind}/{timestamp:%Y/%m/%d}/{prefix}_{timestamp:%H%M%S_%f}_{next(self._seq)}{ext}"
+
+    def abspath(self, relpath):
+        path = os.path.join(self.root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def save_image(self, timestamp, frame, quality=90):
+        """
+        Guarda una captura y su miniatura. Devuelve la ruta relativa a 'root' o None si falló.
+        """
+        relpath = self.new_path('captures', timestamp, 'capture', '.jpg')
+        if not cv2.imwrite(self.abspath(relpath), frame, [cv2.IMWRITE_JPEG_QUALITY, quality]):
+            return None
+        extra = 0
+        try:
+            thumb = os.path.join(self.root, thumbnail_path(relpath))
+            if _write_thumbnail(thumb, frame, self.thumb_width):
+                self.thumbs_written += 1
+                extra = os.path.getsize(thumb)
+        except Exception as e:
+            print(f"⚠️ No se pudo crear la miniatura: {e}")
+        self.add(relpath, extra)
+        return relpath
+
+    def add(self, relpath, extra_bytes=0):
+        """
+        Registra un archivo recién escrito (y los bytes de sus archivos asociados) en la cuota.
+        """
+        size = os.path.getsize(os.path.join(self.root, relpath)) + extra_bytes
+        with self._lock:
+            self._files[relpath] = [time.time(), size]
+            self.bytes += size
+            self.files_written += 1
+            over = self.bytes > self.max_bytes
+        if over:
+            self._wake.set()
+
+    def add_thumbnail(self, relpath):
+        """
+        Suma a la cuota una miniatura creada después de su captura (ensure_thumbnail); se
+        cuenta y se borra junto con la captura. Si la captura aún no está en el índice, el
+        recorrido inicial la encuentra en disco.
+        """
+        size = os.path.getsize(os.path.join(self.root, thumbnail_path(relpath)))
+        with self._lock:
+            entry = self._files.get(relpath)
+            if entry is None:
+                return
+            entry[1] += size
+            self.bytes += size
+            self.thumbs_written += 1
+            over = self.bytes > self.max_bytes
+        if over:
+            self._wake.set()
+
+    # Cuota
+
+    def _run(self):
+        self._scan()
+        while not self._stopped:
+            self.enforce()
+            self._wake.wait(ENFORCE_INTERVAL)
+            self._wake.clear()
+
+    def _scan(self):
+        """
+        Reconstruye el índice con los archivos que ya había en disco (por fecha de modificación).
+        """
+        found = {}
+        thumbs = {}
+        for kind in KINDS + (THUMBS,):
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, kind)):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    relpath = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if kind == THUMBS:
+                        thumbs[relpath[len(THUMBS) + 1:]] = stat.st_size
+                    else:
+                        found[relpath] = [stat.st_mtime, stat.st_size]
+        for relpath, size in thumbs.items():
+            if relpath in found:
+                found[relpath][1] += size
+        with self._lock:
+            # Lo escrito durante el recorrido es más reciente: va al final
+            merged = OrderedDict(sorted(((k, v) for k, v in found.items() if k not in self._files),
+                                        key=lambda item: item[1][0]))
+            merged.update(self._files)
+            self._files = merged
+            self.bytes = sum(size for _, size in merged.values())
+            self.scanned = True
+        print(f"✅ Almacenamiento: {len(merged)} archivos, {self.bytes / 1024 / 1024:.1f} MB en {self.root}")
+
+    def enforce(self, now=None):
+        """
+        Borra los archivos más antiguos hasta cumplir la cuota de espacio y de antigüedad.
+        Devuelve la lista de rutas borradas.
+        """
+        now = time.time() if now is None else now
+        oldest_allowed = now - self.max_age_days * 86400 if self.max_age_days else None
+        victims = []
+        with self._lock:
+            while self._files:
+                relpath, (created, size) = next(iter(self._files.items()))
+                if self.bytes <= self.max_bytes and (oldest_allowed is None or created >= oldest_allowed):
+                    break
+                del self._files[relpath]
+                self.bytes -= size
+                self.evicted_files += 1
+                self.evicted_bytes += size
+                victims.append(relpath)
+        for relpath in victims:
+            for path in (relpath, thumbnail_path(relpath)):
+                self._remove(path)
+        if victims and self.on_evicted is not None:
+            try:
+                self.on_evicted(victims)
+            except Exception as e:
+                print(f"❌ Error al desvincular archivos borrados: {e}")
+        return victims
+
+    def _remove(self, relpath):
+        path = os.path.join(self.root, relpath)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"⚠️ No se pudo borrar {relpath}: {e}")
+            return
+        # Quitar las carpetas de fecha que quedaron vacías (sin tocar las de primer nivel)
+        top = os.path.join(self.root, relpath.split('/', 1)[0])
+        parent = os.path.dirname(path)
+        while parent != top and parent.startswith(top):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def get_stats(self):
+        with self._lock:
+            oldest = next(iter(self._files.values()))[0] if self._files else None
+            return {
+                'files': len(self._files),
+                'used_mb': round(self.bytes / 1024 / 1024, 1),
+                'max_mb': round(self.max_bytes / 1024 / 1024, 1),
+                'max_age_days': self.max_age_days,
+                'oldest_age_h': round((time.time() - oldest) / 3600, 1) if oldest else None,
+                'files_written': self.files_written,
+                'thumbs_written': self.thumbs_written,
+                'evicted_files': self.evicted_files,
+                'evicted_mb': round(self.evicted_bytes / 1024 / 1024, 1),
+                'scanned': self.scanned
+            }
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import os
+import time
+import tempfile
+import database
+
+# Prueba de consultas de incidentes con volumen real
+# Siembra un millón de incidentes (configurable con SAFEGUARD_TEST_ROWS) en una base de datos
+# temporal y verifica la paginación por cursor, los filtros y el resumen agregado.
+ROWS = int(os.environ.get('SAFEGUARD_TEST_ROWS', 1000000))
+TYPES = ['SIN CASCO', 'SIN CHALECO', 'ZONA PELIGROSA']
+
+def seed_database(rows):
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='safeguard_test_'), 'test.db')
+    database.init_db()
+    conn = database.get_connection()
+    # Un incidente cada 20 segundos a partir del 1 de enero, tipos rotando
+    with conn:
+        conn.execute('''
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO incidents (timestamp, type, image_path, details)
+            SELECT strftime('%Y-%m-%dT%H:%M:%S', '2026-01-01', '+' || (i * 20) || ' seconds'),
+                   CASE i % 3 WHEN 0 THEN 'SIN CASCO' WHEN 1 THEN 'SIN CHALECO' ELSE 'ZONA PELIGROSA' END,
+                   NULL, ''
+            FROM n
+        ''', (rows - 1,))
+
+def test_incident_queries():
+    start = time.time()
+    seed_database(ROWS)
+    print(f"✅ {ROWS} incidentes sembrados en {time.time() - start:.1f} s")
+
+    # Paginación por cursor: páginas consecutivas, sin repetidos y en orden descendente
+    start = time.perf_counter()
+    seen = []
+    cursor = None
+    for _ in range(20):
+        page, cursor = database.query_incidents(limit=100, cursor=cursor)
+        seen.extend((i['timestamp'], i['id']) for i in page)
+    elapsed = time.perf_counter() - start
+    assert len(seen) == len(set(seen)) == min(2000, ROWS)
+    assert seen == sorted(seen, reverse=True)
+    assert elapsed < 2.0, f"Paginación demasiado lenta: {elapsed:.3f} s"
+    print(f"✅ 20 páginas de 100 en {elapsed * 1000:.1f} ms")
+
+    # Filtro por tipo y rango de tiempo: página profunda sin OFFSET
+    cursor = None
+    start = time.perf_counter()
+    for _ in range(50):
+        page, cursor = database.query_incidents(limit=100, cursor=cursor, incident_type='SIN CASCO',
+                                                since='2026-02-01T00:00:00', until='2026-03-01T00:00:00')
+        assert all(i['type'] == 'SIN CASCO' and '2026-02-01' <= i['timestamp'] < '2026-03-01' for i in page)
+        if cursor is None:
+            break
+    elapsed = time.perf_counter() - start
+    assert elapsed < 2.0, f"Consulta filtrada demasiado lenta: {elapsed:.3f} s"
+    print(f"✅ Consulta filtrada por tipo y mes en {elapsed * 1000:.1f} ms")
+
+    # Resumen agregado: debe coincidir con el conteo directo
+    start = time.perf_counter()
+    summary = database.summarize_incidents(bucket='day')
+    elapsed = time.perf_counter() - start
+    assert summary['total'] == ROWS
+    assert set(summary['by_type']) <= set(TYPES)
+    january = database.summarize_incidents(bucket='hour', since='2026-01-01T00:00:00', until='2026-01-02T00:00:00')
+    assert january['total'] == 24 * 180 or ROWS < 24 * 180
+    # until exclusivo también a mitad de hora: las partes de hora se cuentan fila por fila
+    partial = database.summarize_incidents(bucket='hour', since='2026-01-01T10:30:00', until='2026-01-01T12:15:00')
+    assert partial['total'] == 105 * 3 or ROWS < 13 * 180
+    assert [b['total'] for b in partial['buckets']] == [90, 180, 45] or ROWS < 13 * 180
+    assert elapsed < 2.0, f"Resumen demasiado lento: {elapsed:.3f} s"
+    print(f"✅ Resumen por día ({len(summary['buckets'])} días) en {elapsed * 1000:.1f} ms")
+
+    # El disparador mantiene el resumen al registrar nuevos incidentes
+    database.log_incidents([('2030-01-01T10:00:00', 'SIN CASCO', None, '')])
+    assert database.summarize_incidents(since='2030-01-01T10:00:00')['total'] == 1
+    print("✅ Resumen actualizado incrementalmente")
+    database.close_all_connections()
+
+if __name__ == "__main__":
+    test_incident_queries()
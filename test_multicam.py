@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import os
+import time
+import numpy as np
+from camera import VideoCamera
+from detector import ObjectDetector
+from motion import MotionGate
+from pipeline import DetectionPipeline
+
+# Prueba del planificador multicámara (solo CPU)
+# Varias cámaras sintéticas alimentan un mismo pipeline; el modelo se reemplaza por uno
+# simulado cuyo costo es fijo por llamada más un pequeño costo por cuadro, como en una GPU.
+# Verifica equidad entre cámaras, latencia captura -> publicación y que el lote aumente el
+# rendimiento (cuadros-cámara por segundo) respecto a procesar un cuadro por llamada.
+CAMERAS = int(os.environ.get('SAFEGUARD_TEST_CAMERAS', 4))
+DURATION = float(os.environ.get('SAFEGUARD_TEST_SECONDS', 2.0))
+CALL_LATENCY = 0.020   # Costo fijo por llamada al modelo (s)
+FRAME_LATENCY = 0.002  # Costo adicional por cuadro del lote (s)
+
+class SlowBatchDetector(ObjectDetector):
+    """
+    ObjectDetector con un modelo simulado: latencia por llamada + latencia por cuadro.
+    """
+    def __init__(self, **kwargs):
+        self.batch_sizes = []
+        super().__init__(**kwargs)
+
+    def _load_model(self, model_path):
+        return None
+
+    def _infer_batch(self, frames):
+        self.batch_sizes.append(len(frames))
+        time.sleep(CALL_LATENCY + FRAME_LATENCY * len(frames))
+        return [[[280, 160, 360, 400]] for _ in frames]
+
+    def save_alert(self, frame, incident_type, details=None, clip_path=None):
+        pass
+
+def run_pipeline(max_batch):
+    """
+    Ejecuta el pipeline durante DURATION segundos y devuelve (pipeline, detector, segundos).
+    """
+    cameras = {f"cam{i}": VideoCamera(sources=['synthetic']) for i in range(CAMERAS)}
+    detector = SlowBatchDetector()
+    pipeline = DetectionPipeline(cameras, detector, max_batch=max_batch)
+    start = time.perf_counter()
+    deadline = start + DURATION
+    try:
+        while time.perf_counter() < deadline:
+            pipeline.process_once(timeout=0.5)
+    finally:
+        elapsed = time.perf_counter() - start
+        for camera in cameras.values():
+            camera.stop()
+    return pipeline, detector, elapsed
+
+def test_multicamera_batching():
+    pipeline, detector, elapsed = run_pipeline(max_batch=CAMERAS)
+    processed = [c.frames_processed for c in pipeline.channels.values()]
+    throughput = sum(processed) / elapsed
+    avg_batch = sum(detector.batch_sizes) / len(detector.batch_sizes)
+    print(f"✅ Con lotes: {throughput:.1f} cuadros-cámara/s, lote promedio {avg_batch:.2f}, por cámara {processed}")
+
+    # Equidad: ninguna cámara queda rezagada respecto a las demás
+    assert min(processed) > 0
+    assert min(processed) >= 0.8 * max(processed), f"Reparto desigual entre cámaras: {processed}"
+    print("✅ Reparto equitativo entre cámaras")
+
+    # Latencia: un cuadro espera como mucho un lote en curso más el suyo
+    batch_time_ms = (CALL_LATENCY + FRAME_LATENCY * CAMERAS) * 1000
+    for cam_id, channel in pipeline.channels.items():
+        status = channel.get_status()
+        assert status['avg_latency_ms'] < 3 * batch_time_ms, f"{cam_id}: latencia {status['avg_latency_ms']} ms"
+    print(f"✅ Latencia promedio por cámara < {3 * batch_time_ms:.0f} ms")
+
+    # Cada cámara conserva su propio rastreo y contadores
+    assert set(detector.streams) == set(pipeline.channels)
+    assert avg_batch > 1.5, f"El planificador no agrupa cuadros: lote promedio {avg_batch:.2f}"
+
+    # Comparación con un cuadro por llamada al modelo
+    sequential, _, seq_elapsed = run_pipeline(max_batch=1)
+    seq_throughput = sequential.frames_processed / seq_elapsed
+    print(f"✅ Sin lotes: {seq_throughput:.1f} cuadros-cámara/s ({throughput / seq_throughput:.1f}x con lotes)")
+    assert throughput > 1.5 * seq_throughput
+
+def test_per_camera_skip_counters():
+    # Dos cámaras con compuerta de movimiento en el mismo lote: una estática (solo el primer
+    # cuadro llega al modelo) y otra que cambia en cada cuadro (ninguno se omite)
+    detector = SlowBatchDetector(motion_gate=MotionGate(clock=lambda: 0.0))
+    still = np.full((480, 640, 3), 90, dtype=np.uint8)
+    frames = 10
+    for k in range(frames):
+        moving = np.full((480, 640, 3), 0 if k % 2 else 255, dtype=np.uint8)
+        detector.analyze_batch([still, moving], ['static', 'moving'])
+
+    static, moving = detector.get_stream_stats('static'), detector.get_stream_stats('moving')
+    assert (static['inference_calls'], static['inference_skipped']) == (1, frames - 1), static
+    assert static['skip_ratio'] == round((frames - 1) / frames, 3)
+    assert (moving['inference_calls'], moving['inference_skipped'], moving['skip_ratio']) == (frames, 0, 0.0), moving
+    assert detector.get_stats()['inference_skipped'] == frames - 1
+    print(f"✅ Omisiones por cámara: estática {static['skip_ratio']}, en movimiento {moving['skip_ratio']}")
+
+if __name__ == "__main__":
+    test_multicamera_batching()
+    test_per_camera_skip_counters()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import os
+import time
+from camera import VideoCamera
+from detector import ObjectDetector
+from pipeline import DetectionPipeline
+from scheduler import AdaptiveScheduler
+
+# Prueba del planificador adaptativo (solo CPU)
+# Una cámara sintética alimenta el pipeline con un modelo simulado cuyo costo crece con el
+# cuadrado de imgsz y que, a tamaño completo, no cabe en el presupuesto de latencia. Sin
+# planificador la latencia queda fuera de presupuesto; con él debe volver a entrar bajando la
+# calidad y, cuando el modelo se vuelve rápido, recuperar la calidad completa.
+DURATION = float(os.environ.get('SAFEGUARD_TEST_SECONDS', 4.0))
+TARGET_LATENCY = 0.100   # Presupuesto captura -> publicación (s)
+MODEL_SECONDS = 0.120    # Costo del modelo a imgsz=416 (s)
+FAST_MODEL_SECONDS = 0.005
+
+class SlowModelDetector(ObjectDetector):
+    """
+    ObjectDetector con un modelo simulado: latencia proporcional al área de entrada.
+    """
+    def __init__(self, **kwargs):
+        self.model_seconds = MODEL_SECONDS
+        self.sizes = []
+        super().__init__(**kwargs)
+
+    def _load_model(self, model_path):
+        return None
+
+    def _infer_batch(self, frames):
+        self.sizes.append(self.imgsz)
+        time.sleep(self.model_seconds * (self.imgsz / 416) ** 2)
+        return [[[280, 160, 360, 400]] for _ in frames]
+
+    def save_alert(self, frame, incident_type, details=None, clip_path=None):
+        pass
+
+class RecordingScheduler(AdaptiveScheduler):
+    """
+    Planificador que además guarda la latencia de cada lote.
+    """
+    def __init__(self, detector, **kwargs):
+        self.samples = []
+        super().__init__(detector, **kwargs)
+
+    def observe(self, latency, busy=None):
+        self.samples.append(latency)
+        return super().observe(latency, busy)
+
+def run(pipeline, seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pipeline.process_once(timeout=0.5)
+
+def p90(samples):
+    ordered = sorted(samples)
+    return ordered[int(0.9 * (len(ordered) - 1))]
+
+def test_scheduler_holds_latency_budget():
+    camera = VideoCamera(sources=['synthetic'])
+    try:
+        # Referencia: un solo nivel (calidad completa siempre)
+        detector = SlowModelDetector()
+        fixed = RecordingScheduler(detector, target_latency=TARGET_LATENCY, levels=[{'ppe_scale': 1, 'infer_every': 1,
+                                                                                     'imgsz_scale': 1.0}])
+        run(DetectionPipeline(camera, detector, scheduler=fixed), DURATION / 2)
+        baseline = p90(fixed.samples[len(fixed.samples) // 2:])
+        print(f"✅ Sin adaptación: latencia p90 {baseline * 1000:.0f} ms (presupuesto {TARGET_LATENCY * 1000:.0f} ms)")
+        assert baseline > TARGET_LATENCY
+
+        # Con el planificador: baja la calidad hasta entrar en el presupuesto
+        detector = SlowModelDetector()
+        scheduler = RecordingScheduler(detector, target_latency=TARGET_LATENCY, restore_after=0.3)
+        pipeline = DetectionPipeline(camera, detector, scheduler=scheduler)
+        run(pipeline, DURATION)
+        # Latencia ya estabilizado el nivel
+        del scheduler.samples[:]
+        run(pipeline, DURATION / 2)
+        stats = scheduler.get_stats()
+        held = p90(scheduler.samples)
+        print(f"✅ Con adaptación: latencia p90 {held * 1000:.0f} ms, {stats}")
+        assert stats['level'] > 0 and stats['degrades'] > 0
+        assert held <= TARGET_LATENCY * 1.1
+        assert 'scheduler' in pipeline.get_status()
+
+        # El modelo se vuelve rápido: recupera la calidad completa
+        detector.model_seconds = FAST_MODEL_SECONDS
+        run(pipeline, DURATION)
+        stats = scheduler.get_stats()
+        print(f"✅ Con margen: {stats}")
+        assert stats['level'] == 0 and stats['restores'] > 0
+        assert detector.imgsz == 416 and detector.infer_every == 1 and detector.ppe_interval == 5
+    finally:
+        camera.stop()
+
+if __name__ == "__main__":
+    test_scheduler_holds_latency_budget()
@@ -0,0 +1,190 @@
+import numpy as np
+from backends import IOU_THRESHOLD, MAX_CANDIDATES
+
+# Inferencia por Regiones y Mosaicos
+# El modelo ve el cuadro entero reducido a imgsz, así que una persona lejana puede quedar con
+# pocos píxeles. Con un plan de inferencia por cámara el modelo corre sobre recortes del
+# cuadro (regiones de interés o un mosaico con solapamiento), cada uno reducido a imgsz por
+# separado: más resolución efectiva donde importa con el mismo tamaño de entrada. Todos los
+# recortes del lote van en una sola llamada al modelo; las cajas se trasladan al cuadro y
+# se fusionan entre recortes (merge_detections).
+#
+# Formato (por ejemplo en cameras.json, clave 'inference' de la cámara):
+#   {"tiles": [3, 2], "overlap": 0.2, "full_frame": true}
+#   {"regions": [[0, 0.2, 0.5, 0.6], [0.5, 0.2, 1, 0.6]], "full_frame": false}
+# - tiles: columnas y filas del mosaico; overlap: fracción de cada mosaico compartida con el
+#   vecino (conviene que supere el ancho de una persona lejana).
+# - regions: rectángulos [x1, y1, x2, y2] normalizados (0-1) o en píxeles si algún valor es
+#   mayor que 1.
+# - full_frame: agregar también el cuadro completo (las personas cercanas, más grandes que
+#   un recorte, se siguen detectando enteras). Por defecto True con 'tiles' y False con 'regions'.
+# Sin configuración (None) el modelo ve solo el cuadro completo, como siempre.
+MAX_CROPS = 16
+MERGE_IOU = IOU_THRESHOLD  # Misma persona vista por dos recortes: solapamiento sobre la unión (como la NMS)...
+MERGE_IOS = 0.8     # ...o sobre la caja más chica, si está cortada (un trozo dentro de la caja completa)
+CUT_MARGIN = 2      # Píxeles al borde interior de un recorte para considerar la caja cortada
+CUT_ALIGN = 0.8     # Dos cajas cortadas que se tocan son la misma persona si coinciden en el otro eje
+
+def merge_detections(boxes, scores, cut, iou_threshold=MERGE_IOU, ios_threshold=MERGE_IOS):
+    """
+    Fusión voraz de las cajas de todos los recortes (en coordenadas del cuadro). Las cajas
+    completas van antes que las cortadas por el borde de su recorte y, entre iguales, por
+    puntaje. Cada caja suprime a las que solapan con ella por IoU o, si la más chica está
+    cortada, por intersección sobre la más chica (dos personas que se tapan no se suprimen
+    más que en la NMS del modelo). Dos cajas cortadas se unen además si se solapan y
+    coinciden en el eje perpendicular al corte (dos mitades de la misma persona en mosaicos
+    vecinos); la que queda se extiende con las que suprime. Devuelve (cajas, puntajes).
+    """
+    if len(boxes) == 0:
+        return boxes, scores
+    order = np.lexsort((-scores, cut))[:MAX_CANDIDATES]
+    b = boxes[order].astype(np.float64)
+    x1, y1, x2, y2 = b.T
+    areas = (x2 - x1) * (y2 - y1)
+    inter = (np.clip(np.minimum(x2[:, None], x2) - np.maximum(x1[:, None], x1), 0, None) *
+             np.clip(np.minimum(y2[:, None], y2) - np.maximum(y1[:, None], y1), 0, None))
+    is_cut = cut[order]
+    smaller_cut = np.where(areas[:, None] <= areas, is_cut[:, None], is_cut)
+    overlaps = ((inter > iou_threshold * (areas[:, None] + areas - inter)) |
+                (smaller_cut & (inter > ios_threshold * np.minimum(areas[:, None], areas))))
+    if is_cut.sum() > 1:
+        # Coincidencia de los intervalos en x y en y (IoU de una dimensión)
+        align = [(np.minimum(hi[:, None], hi) - np.maximum(lo[:, None], lo)) /
+                 np.maximum(np.maximum(hi[:, None], hi) - np.minimum(lo[:, None], lo), 1e-9)
+                 for lo, hi in ((x1, x2), (y1, y2))]
+        overlaps |= (is_cut[:, None] & is_cut & (inter > 0) &
+                     (np.maximum(align[0], align[1]) >= CUT_ALIGN))
+    suppressed = np.zeros(len(order), dtype=bool)
+    merged, kept = [], []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        group = overlaps[i] & ~suppressed
+        suppressed |= group
+        box = b[i]
+        if is_cut[i]:
+            members = b[group & is_cut]
+            box = np.concatenate([members[:, :2].min(axis=0), members[:, 2:].max(axis=0)])
+        merged.append(box)
+        kept.append(order[i])
+    return np.round(merged).astype(int), scores[kept]
+
+
+class InferencePlan:
+    def __init__(self, config=None):
+        """
+        config: plan de inferencia (ver formato arriba); None = solo el cuadro completo.
+        """
+        self.configure(config)
+
+    def configure(self, config):
+        """
+        Reemplaza la configuración; los recortes se recalculan en la siguiente consulta.
+        """
+        config = config or {}
+        tiles = config.get('tiles')
+        regions = config.get('regions')
+        if tiles is not None and regions is not None:
+            raise ValueError("El plan de inferencia admite 'tiles' o 'regions', no ambos")
+        self.tiles = None
+        self.regions = None
+        if tiles is not None:
+            cols, rows = (int(tiles[0]), int(tiles[1])) if isinstance(tiles, (list, tuple)) else (int(tiles),) * 2
+            if cols < 1 or rows < 1:
+                raise ValueError(f"Mosaico no válido: {tiles}")
+            self.tiles = (cols, rows)
+        if regions is not None:
+            points = np.asarray(regions, dtype=np.float64)
+            if points.ndim != 2 or points.shape[1] != 4 or not len(points):
+                raise ValueError("Cada región necesita [x1, y1, x2, y2]")
+            self.regions = points
+        self.overlap = float(config.get('overlap', 0.2))
+        if not 0 <= self.overlap < 1:
+            raise ValueError(f"Solapamiento no válido: {self.overlap}")
+        self.full_frame = bool(config.get('full_frame', tiles is not None))
+        if len(self._rects(640, 480)) > MAX_CROPS:
+            raise ValueError(f"Se admiten como máximo {MAX_CROPS} recortes por cuadro")
+        self._size = None
+        self._crops = None
+
+    @property
+    def tiled(self):
+        """
+        True si el modelo corre sobre recortes (False = solo el cuadro completo).
+        """
+        return self.tiles is not None or self.regions is not None
+
+    def _rects(self, width, height):
+        rects = [(0, 0, width, height)] if self.full_frame or not self.tiled else []
+        if self.tiles is not None:
+            cols, rows = self.tiles
+            # Cada mosaico mide 1/(n - (n - 1) * overlap) del cuadro: vecinos solapados en 'overlap'
+            tile_w = width / (cols - (cols - 1) * self.overlap)
+            tile_h = height / (rows - (rows - 1) * self.overlap)
+            for r in range(rows):
+                for c in range(cols):
+                    x1, y1 = c * tile_w * (1 - self.overlap), r * tile_h * (1 - self.overlap)
+                    rects.append((int(round(x1)), int(round(y1)),
+                                  min(width, int(round(x1 + tile_w))), min(height, int(round(y1 + tile_h)))))
+        if self.regions is not None:
+            scale = (width, height, width, height) if self.regions.max() <= 1.0 else (1, 1, 1, 1)
+            for region in self.regions * scale:
+                x1, y1 = max(0, int(round(min(region[0], region[2])))), max(0, int(round(min(region[1], region[3]))))
+                x2 = min(width, int(round(max(region[0], region[2]))))
+                y2 = min(height, int(round(max(region[1], region[3]))))
+                if x2 > x1 and y2 > y1:
+                    rects.append((x1, y1, x2, y2))
+        return rects
+
+    def crops(self, width, height):
+        """
+        Rectángulos (x1, y1, x2, y2) en píxeles donde corre el modelo (se calculan una vez por resolución).
+        """
+        if self._size != (width, height):
+            self._crops = self._rects(width, height)
+            self._size = (width, height)
+        return self._crops
+
+    def split(self, frame):
+        """
+        Vistas del cuadro (sin copia) para cada recorte, en el orden de crops().
+        """
+        height, width = frame.shape[:2]
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self.crops(width, height)]
+
+    def merge(self, crop_boxes, crop_scores, width, height):
+        """
+        Traslada las cajas de cada recorte al cuadro y las fusiona (merge_detections).
+        crop_scores puede ser None (o contener None) si el backend no da puntajes: se
+        ordena entonces por área. Devuelve (cajas, puntajes o None).
+        """
+        crops = self.crops(width, height)
+        boxes, scores, cut = [], [], []
+        known_scores = crop_scores is not None and all(s is not None for s in crop_scores)
+        for k, ((cx1, cy1, cx2, cy2), found) in enumerate(zip(crops, crop_boxes)):
+            if not len(found):
+                continue
+            b = np.asarray(found, dtype=np.float64).reshape(-1, 4) + (cx1, cy1, cx1, cy1)
+            np.clip(b[:, 0::2], cx1, cx2, out=b[:, 0::2])
+            np.clip(b[:, 1::2], cy1, cy2, out=b[:, 1::2])
+            boxes.append(b)
+            if known_scores:
+                scores.append(np.asarray(crop_scores[k], dtype=np.float64))
+            else:
+                scores.append((b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]))
+            # Cortada: toca un borde del recorte que no es borde del cuadro
+            cut.append(((b[:, 0] <= cx1 + CUT_MARGIN) & (cx1 > 0)) | ((b[:, 2] >= cx2 - CUT_MARGIN) & (cx2 < width)) |
+                       ((b[:, 1] <= cy1 + CUT_MARGIN) & (cy1 > 0)) | ((b[:, 3] >= cy2 - CUT_MARGIN) & (cy2 < height)))
+        if not boxes:
+            return [], ([] if known_scores else None)
+        merged, merged_scores = merge_detections(np.concatenate(boxes), np.concatenate(scores), np.concatenate(cut))
+        return merged.tolist(), (merged_scores.tolist() if known_scores else None)
+
+    def describe(self):
+        return {
+            'tiles': list(self.tiles) if self.tiles is not None else None,
+            'regions': len(self.regions) if self.regions is not None else 0,
+            'overlap': self.overlap,
+            'full_frame': self.full_frame,
+            'crops': len(self._crops) if self._crops is not None else None
+        }
@@ -0,0 +1,168 @@
+import numpy as np
+
+# Rastreador Multi-Objeto Ligero (IoU / Centroide)
+# Implementado solo con NumPy (sin GPU). Asigna identificadores estables a las personas entre
+# cuadros para poder reutilizar el veredicto de EPP y aplicar enfriamientos de alerta por persona.
+
+def iou_matrix(a, b):
+    """
+    Matriz IoU (intersección sobre unión) entre las cajas 'a' (N, 4) y 'b' (M, 4) en formato x1, y1, x2, y2.
+    """
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.int64)
+        self.hits = 1
+        self.misses = 0
+
+        # Estado de EPP suavizado con histéresis
+        self.has_helmet = None
+        self.has_vest = None
+        self._helmet_flips = 0
+        self._vest_flips = 0
+        self.helmet_ratio = 0.0
+        self.vest_ratio = 0.0
+        self.ppe_box = None             # Caja usada en la última evaluación de EPP
+        self.frames_since_ppe = 0
+
+        # Última alerta por tipo de violación (enfriamiento por persona)
+        self.last_alert = {}
+
+    def needs_ppe_check(self, interval, min_iou):
+        """
+        Indica si el EPP debe reevaluarse: nunca evaluado, cada 'interval' cuadros
+        o cuando la caja cambió sustancialmente (IoU < min_iou con la última evaluada).
+        """
+        if self.ppe_box is None or self.frames_since_ppe >= interval:
+            return True
+        return iou_matrix(self.box, self.ppe_box)[0, 0] < min_iou
+
+    def update_ppe(self, has_helmet, has_vest, helmet_ratio, vest_ratio, confirm_frames):
+        """
+        Aplica una nueva observación de EPP. El veredicto solo cambia tras 'confirm_frames'
+        observaciones consecutivas que contradicen el estado actual (histéresis).
+        """
+        self.helmet_ratio = helmet_ratio
+        self.vest_ratio = vest_ratio
+        self.ppe_box = self.box.copy()
+        self.frames_since_ppe = 0
+        self.has_helmet, self._helmet_flips = self._smooth(self.has_helmet, self._helmet_flips, has_helmet, confirm_frames)
+        self.has_vest, self._vest_flips = self._smooth(self.has_vest, self._vest_flips, has_vest, confirm_frames)
+
+    @staticmethod
+    def _smooth(state, flips, observed, confirm_frames):
+        if state is None or observed == state:
+            return observed, 0
+        flips += 1
+        if flips >= confirm_frames:
+            return observed, 0
+        return state, flips
+
+    def should_alert(self, violation, now, cooldown):
+        """
+        Devuelve True (y registra el momento) si esta persona no generó una alerta
+        del mismo tipo en los últimos 'cooldown' segundos.
+        """
+        last = self.last_alert.get(violation)
+        if last is not None and now - last < cooldown:
+            return False
+        self.last_alert[violation] = now
+        return True
+
+
+class IoUTracker:
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_misses=15):
+        """
+        iou_threshold: IoU mínimo para asociar una detección con un rastro existente.
+        max_centroid_distance: distancia máxima de centroides (relativa al tamaño de la caja)
+            para asociar lo que no se pudo asociar por IoU (movimientos rápidos).
+        max_misses: cuadros consecutivos sin detección antes de eliminar un rastro.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_misses = max_misses
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, boxes):
+        """
+        Asocia las detecciones del cuadro actual con los rastros existentes.
+        Devuelve la lista de objetos Track alineada con 'boxes'.
+        """
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        assigned = [None] * len(boxes)
+        unmatched_tracks = list(range(len(self.tracks)))
+        unmatched_dets = list(range(len(boxes)))
+
+        if self.tracks and len(boxes):
+            track_boxes = np.array([t.box for t in self.tracks])
+
+            # 1) Asociación voraz por IoU (mayor IoU primero)
+            ious = iou_matrix(track_boxes, boxes)
+            self._greedy_match(-ious, -self.iou_threshold, unmatched_tracks, unmatched_dets, assigned, boxes)
+
+            # 2) Asociación por centroide para lo que quedó sin emparejar
+            if unmatched_tracks and unmatched_dets:
+                tb = track_boxes[unmatched_tracks]
+                db = boxes[unmatched_dets]
+                tc = (tb[:, :2] + tb[:, 2:]) / 2.0
+                dc = (db[:, :2] + db[:, 2:]) / 2.0
+                scale = np.maximum(np.maximum(tb[:, 2] - tb[:, 0], tb[:, 3] - tb[:, 1]), 1)
+                dist = np.linalg.norm(tc[:, None, :] - dc[None, :, :], axis=2) / scale[:, None]
+                full = np.full((len(self.tracks), len(boxes)), np.inf)
+                full[np.ix_(unmatched_tracks, unmatched_dets)] = dist
+                self._greedy_match(full, self.max_centroid_distance, unmatched_tracks, unmatched_dets, assigned, boxes)
+
+        # Rastros sin detección: envejecen y se eliminan tras 'max_misses'
+        for ti in unmatched_tracks:
+            self.tracks[ti].misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        # Detecciones sin rastro: nuevos rastros
+        for di in unmatched_dets:
+            track = Track(self._next_id, boxes[di])
+            self._next_id += 1
+            self.tracks.append(track)
+            assigned[di] = track
+
+        for track in assigned:
+            track.frames_since_ppe += 1
+        return assigned
+
+    def _greedy_match(self, cost, max_cost, unmatched_tracks, unmatched_dets, assigned, boxes):
+        """
+        Empareja pares (rastro, detección) de menor costo mientras el costo no supere 'max_cost'.
+        """
+        order = np.argsort(cost, axis=None)
+        rows, cols = np.unravel_index(order, cost.shape)
+        free_tracks = set(unmatched_tracks)
+        free_dets = set(unmatched_dets)
+        for ti, di in zip(rows, cols):
+            if cost[ti, di] > max_cost:
+                break
+            if ti not in free_tracks or di not in free_dets:
+                continue
+            track = self.tracks[ti]
+            track.box = boxes[di].copy()
+            track.hits += 1
+            track.misses = 0
+            assigned[di] = track
+            free_tracks.discard(ti)
+            free_dets.discard(di)
+            if not free_tracks or not free_dets:
+                break
+        unmatched_tracks[:] = [t for t in unmatched_tracks if t in free_tracks]
+        unmatched_dets[:] = [d for d in unmatched_dets if d in free_dets]
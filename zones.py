@@ -0,0 +1,172 @@
+import cv2
+import numpy as np
+
+# Zonas de Peligro Poligonales
+# Cada cámara puede tener varias zonas (polígonos). Los polígonos se rasterizan una sola vez
+# en una máscara de etiquetas (un bit por zona) que se recalcula solo si cambia la
+# configuración o la resolución; a partir de ahí, saber en qué zonas está cada persona es una
+# consulta vectorizada a la máscara (o a su imagen integral), con un costo independiente del
+# número de vértices de los polígonos.
+#
+# Formato de una zona (por ejemplo en cameras.json):
+#   {"name": "ZONA DE PELIGRO", "points": [[0.7, 0], [1, 0], [1, 1], [0.7, 1]], "mode": "foot"}
+# - points: vértices normalizados (0-1, relativos al ancho y alto) o en píxeles si algún
+#   valor es mayor que 1.
+# - mode: 'foot' (punto de apoyo: centro del borde inferior de la caja), 'center' (centro
+#   de la caja) u 'overlap' (fracción de la caja dentro de la zona >= 'min_overlap').
+# - color: BGR opcional para el dibujo.
+MAX_ZONES = 32
+ZONE_ALPHA = 0.2
+
+# Zona por defecto: el 30% derecho del cuadro, evaluado con el centro de la caja
+DEFAULT_ZONES = [
+    {'name': "ZONA DE PELIGRO", 'points': [[0.7, 0], [1, 0], [1, 1], [0.7, 1]], 'mode': 'center'}
+]
+
+class ZoneMap:
+    def __init__(self, zones=None):
+        """
+        zones: lista de zonas (ver formato arriba); None usa DEFAULT_ZONES y [] desactiva las zonas.
+        """
+        self.configure(DEFAULT_ZONES if zones is None else zones)
+
+    def configure(self, zones):
+        """
+        Reemplaza la configuración; la máscara se reconstruye en la siguiente consulta.
+        """
+        if len(zones) > MAX_ZONES:
+            raise ValueError(f"Se admiten como máximo {MAX_ZONES} zonas por cámara")
+        self.zones = []
+        for zone in zones:
+            mode = zone.get('mode', 'foot')
+            if mode not in ('foot', 'center', 'overlap'):
+                raise ValueError(f"Modo de zona no válido: {mode}")
+            points = np.asarray(zone['points'], dtype=np.float64)
+            if points.ndim != 2 or points.shape[0] < 3 or points.shape[1] != 2:
+                raise ValueError(f"La zona '{zone.get('name')}' necesita al menos 3 puntos [x, y]")
+            self.zones.append({
+                'name': zone.get('name', "ZONA DE PELIGRO"),
+                'points': points,
+                'normalized': bool(points.max() <= 1.0),
+                'mode': mode,
+                'min_overlap': float(zone.get('min_overlap', 0.3)),
+                'color': tuple(zone.get('color', (0, 0, 255)))
+            })
+        self._size = None
+
+    # Rasterización (una vez por configuración y resolución)
+
+    def _pixel_points(self, zone, width, height):
+        points = zone['points']
+        if zone['normalized']:
+            points = points * (width, height)
+        return np.round(points).astype(np.int32)
+
+    def _build(self, width, height):
+        self._size = (width, height)
+        dtype = np.uint8 if len(self.zones) <= 8 else np.uint32
+        self.mask = np.zeros((height, width), dtype=dtype)
+        self._integrals = {}
+        self._pixel_zones = []
+
+        fill = np.zeros((height, width, 3), dtype=np.uint8)
+        solid = np.zeros((height, width, 3), dtype=np.uint8)
+        solid_mask = np.zeros((height, width), dtype=np.uint8)
+        for i, zone in enumerate(self.zones):
+            points = self._pixel_points(zone, width, height)
+            self._pixel_zones.append({'name': zone['name'], 'points': points.tolist()})
+            zone_mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(zone_mask, [points], 1)
+            self.mask |= (zone_mask.astype(dtype) << i)
+            if zone['mode'] == 'overlap':
+                self._integrals[i] = cv2.integral(zone_mask)
+            # Capas pre-dibujadas: relleno semitransparente y borde + nombre opacos
+            cv2.fillPoly(fill, [points], zone['color'])
+            cv2.polylines(solid, [points], True, zone['color'], 2)
+            cv2.polylines(solid_mask, [points], True, 255, 2)
+            x, y = points.min(axis=0)
+            cv2.putText(solid, zone['name'], (int(x) + 10, int(y) + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, zone['color'], 2)
+            cv2.putText(solid_mask, zone['name'], (int(x) + 10, int(y) + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, 255, 2)
+
+        # Recortar las capas al rectángulo que contiene todas las zonas: el mezclado por cuadro
+        # solo toca esa región
+        covered = (self.mask > 0).astype(np.uint8) | (solid_mask > 0)
+        ys, xs = np.nonzero(covered)
+        if len(xs) == 0:
+            self._roi = None
+            return
+        x0, x1, y0, y1 = xs.min(), xs.max() + 1, ys.min(), ys.max() + 1
+        self._roi = (slice(y0, y1), slice(x0, x1))
+        self._fill = fill[self._roi]
+        self._fill_mask = (self.mask[self._roi] > 0).astype(np.uint8)
+        self._fill_full = bool(self._fill_mask.all())
+        # Destino reutilizable de la mezcla (si la zona cubre todo el rectángulo se mezcla en el cuadro)
+        self._blended = None if self._fill_full else np.empty_like(self._fill)
+        # Bordes y nombres ocupan pocos píxeles: se guardan como índices, colores y opacidad
+        # (el texto puede venir suavizado, con opacidad parcial en los bordes)
+        self._solid_idx = np.nonzero(solid_mask[self._roi])
+        self._solid_values = solid[self._roi][self._solid_idx].astype(np.uint16) * 255
+        self._solid_keep = (255 - solid_mask[self._roi][self._solid_idx]).astype(np.uint16)[:, None]
+
+    def ensure(self, width, height):
+        if self._size != (width, height):
+            self._build(width, height)
+
+    # Consultas por cuadro
+
+    def lookup(self, boxes, width, height):
+        """
+        Devuelve una matriz booleana (personas x zonas): True si la persona está en la zona.
+        """
+        self.ensure(width, height)
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        result = np.zeros((len(boxes), len(self.zones)), dtype=bool)
+        if len(boxes) == 0 or not self.zones:
+            return result
+        x1 = np.clip(boxes[:, 0], 0, width - 1)
+        y1 = np.clip(boxes[:, 1], 0, height - 1)
+        x2 = np.clip(boxes[:, 2], 0, width - 1)
+        y2 = np.clip(boxes[:, 3], 0, height - 1)
+        x_mid = (x1 + x2) // 2
+
+        # Una lectura de la máscara por persona y modo de punto; los bits dicen en qué zonas cae
+        labels = {
+            'foot': self.mask[y2, x_mid],
+            'center': self.mask[(y1 + y2) // 2, x_mid]
+        }
+        for i, zone in enumerate(self.zones):
+            if zone['mode'] == 'overlap':
+                ii = self._integrals[i]
+                xa, ya = np.minimum(x1, x2), np.minimum(y1, y2)
+                xb, yb = np.maximum(x1, x2) + 1, np.maximum(y1, y2) + 1
+                inside = ii[yb, xb] - ii[ya, xb] - ii[yb, xa] + ii[ya, xa]
+                area = (xb - xa) * (yb - ya)
+                result[:, i] = inside >= zone['min_overlap'] * area
+            else:
+                result[:, i] = (labels[zone['mode']] >> i) & 1
+        return result
+
+    def describe(self, width, height):
+        """
+        Zonas en píxeles para el resumen de detecciones (dibujo en el navegador).
+        """
+        self.ensure(width, height)
+        return self._pixel_zones
+
+    def draw(self, frame):
+        """
+        Mezcla las capas pre-dibujadas de las zonas sobre el cuadro (en su lugar).
+        """
+        height, width = frame.shape[:2]
+        self.ensure(width, height)
+        if self._roi is None:
+            return frame
+        roi = frame[self._roi]
+        if self._fill_full:
+            cv2.addWeighted(self._fill, ZONE_ALPHA, roi, 1 - ZONE_ALPHA, 0, dst=roi)
+        else:
+            cv2.addWeighted(self._fill, ZONE_ALPHA, roi, 1 - ZONE_ALPHA, 0, dst=self._blended)
+            cv2.copyTo(self._blended, self._fill_mask, roi)
+        under = roi[self._solid_idx].astype(np.uint16)
+        roi[self._solid_idx] = ((under * self._solid_keep + self._solid_values) // 255).astype(np.uint8)
+        return frame